@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""HTTP 客户端对比：tushare 自带 DataApi（每次调用新建连接）与 http_client 的 keep-alive 连接池。
+
+用法：
+    python benchmarks/bench_http_client.py [--calls 200] [--threads 8] [--rows 500]
+        [--latency 50] [--connect-latency 50] [--connections 8]
+
+在本地启动一个模拟 Tushare 的 HTTP 服务：每个请求延迟 --latency 毫秒返回 --rows 行数据，
+每条新连接额外延迟 --connect-latency 毫秒（模拟到远端服务器的建连与握手往返）。
+分别统计多线程同步调用与单事件循环异步调用的总耗时和新建连接数。默认 8 个线程，
+与服务器默认的工作线程数（TUSHARE_MAX_WORKERS）一致。
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from tushare_mcp_server.http_client import AsyncDataApi, SyncDataApi  # noqa: E402
+
+
+def serve_fake(rows: int, latency: float, connect_latency: float, ports: Any) -> None:
+    """模拟服务进程：POST 返回固定数据，GET /stats 返回累计新建连接数。"""
+    fields = ["ts_code", "trade_date", "close", "pct_chg", "vol", "amount"]
+    items = [
+        ["000001.SZ", f"2024{(i % 12) + 1:02d}{(i % 28) + 1:02d}", 10.5 + i, 0.5, 1e5 + i, 2e6 + i]
+        for i in range(rows)
+    ]
+    body = json.dumps(
+        {"code": 0, "msg": "", "data": {"fields": fields, "items": items, "has_more": False}}
+    ).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 支持 keep-alive
+        # 响应头与响应体分两次写出，keep-alive 连接上需关闭 Nagle 算法，否则会叠加约 40ms 的延迟确认
+        disable_nagle_algorithm = True
+
+        def setup(self) -> None:
+            with lock:
+                server.connections += 1
+            time.sleep(connect_latency)
+            super().setup()
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            payload = json.dumps({"connections": server.connections}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024  # 监听队列需在创建时设置，避免大量并发建连被拒绝
+        connections = 0
+
+    lock = threading.Lock()
+    server = Server(("127.0.0.1", 0), Handler)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def connections(port: int) -> int:
+    """模拟服务累计接受的连接数（不含本次查询自身）。"""
+    with urlopen(f"http://127.0.0.1:{port}/stats") as res:
+        return json.loads(res.read())["connections"] - 1
+
+
+def run_threads(call: Callable[[], Any], calls: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for df in pool.map(lambda _: call(), range(calls)):
+            assert len(df) > 0
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=50, help="每个请求的服务端延迟（毫秒）")
+    parser.add_argument("--connect-latency", type=float, default=50, help="每条新连接的延迟（毫秒）")
+    parser.add_argument("--connections", type=int, default=8, help="连接池大小")
+    args = parser.parse_args()
+
+    # 模拟服务在独立进程中运行，不与客户端争用 GIL
+    ports: Any = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve_fake,
+        args=(args.rows, args.latency / 1e3, args.connect_latency / 1e3, ports),
+        daemon=True,
+    )
+    server.start()
+    port = ports.get()
+    url = f"http://127.0.0.1:{port}/dataapi"
+    print(
+        f"calls={args.calls} threads={args.threads} rows={args.rows} "
+        f"latency={args.latency:g}ms connect={args.connect_latency:g}ms pool={args.connections}"
+    )
+
+    def report(name: str, elapsed: float, opened: int) -> None:
+        print(
+            f"{name:>22}: {elapsed * 1e3:8.1f} ms  {args.calls / elapsed:7.1f} calls/s  "
+            f"{opened:4d} connections"
+        )
+
+    try:
+        from tushare.pro.client import DataApi
+    except ImportError:
+        DataApi = None
+    if DataApi is not None:
+        stock = DataApi("benchmark")
+        stock._DataApi__http_url = url  # 指向本地模拟服务
+        before = connections(port) + 1
+        elapsed = run_threads(lambda: stock.daily(ts_code="000001.SZ"), args.calls, args.threads)
+        report("tushare DataApi", elapsed, connections(port) - before)
+
+    pooled = SyncDataApi(AsyncDataApi("benchmark", url=url, max_connections=args.connections))
+    before = connections(port) + 1
+    elapsed = run_threads(lambda: pooled.daily(ts_code="000001.SZ"), args.calls, args.threads)
+    report("httpx pool (threads)", elapsed, connections(port) - before)
+    pooled.close()
+
+    async def gather() -> float:
+        api = AsyncDataApi("benchmark", url=url, max_connections=args.connections)
+        start = time.perf_counter()
+        frames = await asyncio.gather(*(api.daily(ts_code="000001.SZ") for _ in range(args.calls)))
+        elapsed = time.perf_counter() - start
+        await api.aclose()
+        assert all(len(df) > 0 for df in frames)
+        return elapsed
+
+    before = connections(port) + 1
+    elapsed = asyncio.run(gather())
+    report("httpx pool (asyncio)", elapsed, connections(port) - before)
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""工具结果序列化：原 records 输出与紧凑格式的体积、耗时对比。
+
+用法：
+    python benchmarks/bench_serialize.py [--years 5] [--precision 4] [--repeat 5]
+
+数据为形状接近 stk_factor_pro 的单只股票日线因子（字段名取自 docs/interface.md），
+默认约 5 年（1250 行）。
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from tushare_mcp_server.serialize import dump_frame  # noqa: E402
+
+DOCS = os.path.join(os.path.dirname(__file__), "..", "docs", "interface.md")
+
+
+def factor_columns() -> List[str]:
+    """从接口文档中解析 stk_factor_pro 的返回字段。"""
+    with open(DOCS, encoding="utf-8") as f:
+        text = f.read()
+    section = text.split("### 1.", 1)[1].split("### 2.", 1)[0]
+    names = re.findall(r"^- `(\w+)`", section.split("**返回字段**", 1)[1], flags=re.M)
+    return [n for n in dict.fromkeys(names) if n not in ("ts_code", "trade_date")]
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    columns = factor_columns()
+    data = {name: 10 * np.exp(rng.normal(0, 1, rows)) for name in columns}
+    df = pd.DataFrame({
+        "ts_code": "000001.SZ",
+        "trade_date": pd.bdate_range("2019-01-02", periods=rows).strftime("%Y%m%d"),
+        **data,
+    })
+    # 部分因子对个股整列为空（如停牌期间、新股上市初期的长周期指标）
+    for name in columns[::25]:
+        df[name] = np.nan
+    return df
+
+
+def best_of(fn: Callable[[], str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--precision", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_frame(args.years * 250)
+    print(f"rows={len(df)} columns={df.shape[1]}")
+    cases = [
+        ("legacy records", lambda: df.to_json(orient="records", force_ascii=False)),
+        ("records", lambda: dump_frame(df, "records", args.precision)),
+        ("split", lambda: dump_frame(df, "split", args.precision)),
+        ("values", lambda: dump_frame(df, "values", args.precision)),
+    ]
+    base_size = base_time = None
+    for name, fn in cases:
+        size = len(fn().encode("utf-8"))
+        elapsed = best_of(fn, args.repeat)
+        if base_size is None:
+            base_size, base_time = size, elapsed
+        print(
+            f"{name:>15}: {size / 1e6:7.2f} MB ({base_size / size:4.1f}x smaller)  "
+            f"{elapsed * 1e3:8.1f} ms ({base_time / elapsed:4.1f}x faster)"
+        )
+
+
+if __name__ == "__main__":
+    main()
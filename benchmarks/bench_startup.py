@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""服务器冷启动耗时：从启动 stdio 子进程到 list_tools 返回的时间。
+
+用法：
+    python benchmarks/bench_startup.py [--repeat 5] [--script src/tushare_mcp_server/server.py]
+
+每次都重新拉起一个服务器进程（与客户端按会话启动服务器的方式相同），
+分别统计 initialize 握手完成与 list_tools 返回的耗时，并列出启动后已加载的重量级模块。
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HEAVY_MODULES = ("tushare", "pandas", "numpy", "pyarrow")
+
+
+async def measure(script: str) -> Tuple[float, float, int]:
+    env = dict(os.environ)
+    env.setdefault("TUSHARE_TOKEN", "benchmark")
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in (os.path.join(ROOT, "src"), env.get("PYTHONPATH")) if p
+    )
+    params = StdioServerParameters(command=sys.executable, args=[script], env=env)
+    start = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter() - start
+            tools = await session.list_tools()
+            listed = time.perf_counter() - start
+    return initialized, listed, len(tools.tools)
+
+
+def heavy_imports(script: str) -> List[str]:
+    """在子进程中导入服务器模块，返回被加载的重量级依赖。"""
+    import subprocess
+
+    code = (
+        "import runpy, sys\n"
+        f"runpy.run_path({script!r}, run_name='bench')\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    env = dict(os.environ)
+    env.setdefault("TUSHARE_TOKEN", "benchmark")
+    env["PYTHONPATH"] = os.path.join(ROOT, "src")
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    return [m for m in out.stdout.strip().split(",") if m]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--script", default=os.path.join(ROOT, "src", "tushare_mcp_server", "server.py")
+    )
+    args = parser.parse_args()
+
+    inits, lists = [], []
+    count = 0
+    for _ in range(args.repeat):
+        initialized, listed, count = asyncio.run(measure(args.script))
+        inits.append(initialized)
+        lists.append(listed)
+    print(f"script: {os.path.relpath(args.script, ROOT)}  tools: {count}")
+    print(f"initialize: median {statistics.median(inits) * 1e3:7.1f} ms  min {min(inits) * 1e3:7.1f} ms")
+    print(f"list_tools: median {statistics.median(lists) * 1e3:7.1f} ms  min {min(lists) * 1e3:7.1f} ms")
+    print(f"heavy modules loaded at startup: {', '.join(heavy_imports(args.script)) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
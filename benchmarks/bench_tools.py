@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""逐个工具的端到端基准：用本地 Tushare 替身（fake_tushare.py）代替真实接口，不需要 token 和网络。
+
+用法：
+    python benchmarks/bench_tools.py [--market 1000] [--latency 0] [--repeat 5]
+        [--filter trend] [--json result.json] [--baseline base.json --tolerance 1.5]
+
+每个场景先在空的本地存储上调用一次（cold），再重复调用 --repeat 次取中位数（warm），
+耗时拆分为：
+- fetch: 经由 TushareClient 调用接口（含限速排队、分页）的墙钟时间
+- serialize: dump_frame / dumps 编码结果的时间
+- compute: 其余时间（信号计算、本地存储读写等）
+另外统计一次 warm 调用的内存峰值（tracemalloc）、返回的 JSON 字节数与接口调用次数。
+
+--json 把结果写入文件；--baseline 与之前保存的结果对比，cold 或 warm 耗时超过基线 --tolerance 倍
+（且差值超过 --min-ms 毫秒）或工具返回错误时以非零状态退出，可在 CI 中用于发现性能回退。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 导入服务器前设置：token 只需非空；本地存储与日历缓存放在临时目录；限速放开，只测本地开销
+_WORKDIR = tempfile.mkdtemp(prefix="bench_tools_")
+os.environ["TUSHARE_TOKEN"] = "benchmark"
+os.environ["TUSHARE_STORE_DIR"] = os.path.join(_WORKDIR, "store")
+os.environ["TUSHARE_CACHE_DIR"] = os.path.join(_WORKDIR, "cache")
+os.environ["TUSHARE_RATE_LIMIT"] = "1000000"
+
+from fake_tushare import FakeProApi, stock_codes  # noqa: E402
+from tushare_mcp_server import app, server, tech_ext  # noqa: E402
+from tushare_mcp_server.industry import IndustryRanks  # noqa: E402
+
+TODAY = "20241231"
+DAY = "20241220"
+
+
+class Span:
+    """累计若干（可能并发的）调用占用的墙钟时间：有任意调用在途时计时。"""
+
+    def __init__(self) -> None:
+        self.total = 0.0
+        self._active = 0
+        self._since = 0.0
+        self._lock = threading.Lock()
+
+    def wrap(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            with self._lock:
+                if self._active == 0:
+                    self._since = time.perf_counter()
+                self._active += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    if self._active == 0:
+                        self.total += time.perf_counter() - self._since
+
+        return timed
+
+    def reset(self) -> None:
+        self.total = 0.0
+
+
+fetch_span = Span()
+serialize_span = Span()
+
+
+def instrument(fake: FakeProApi) -> None:
+    """接入替身并在取数、序列化的入口处计时。"""
+    app.pro._pro = fake
+    app.pro._call = fetch_span.wrap(app.pro._call)
+    server.dump_frame = serialize_span.wrap(server.dump_frame)
+    tech_ext.dumps = serialize_span.wrap(tech_ext.dumps)
+
+
+def scenarios(market: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(场景名, 工具名, 参数)。"""
+    codes50 = stock_codes(min(50, market))
+    one = stock_codes(1)[0]
+    year = {"start_date": "20240101", "end_date": DAY}
+    return [
+        # 原始数据工具
+        ("stk_factor_pro/1y", "stk_factor_pro", {"ts_code": one, **year}),
+        ("stk_factor_pro/1y_split", "stk_factor_pro", {"ts_code": one, **year, "output_format": "split", "precision": 4}),
+        ("stk_factor_pro/market_day", "stk_factor_pro", {"trade_date": DAY}),
+        ("moneyflow/1y", "moneyflow", {"ts_code": one, **year}),
+        ("moneyflow_cnt_ths/day", "moneyflow_cnt_ths", {"trade_date": DAY}),
+        ("moneyflow_ind_ths/day", "moneyflow_ind_ths", {"trade_date": DAY}),
+        ("cyq_perf/1y", "cyq_perf", {"ts_code": one, **year}),
+        ("stock_basic/all", "stock_basic", {}),
+        ("index_classify/all", "index_classify", {}),
+        ("fina_indicator/5y", "fina_indicator", {"ts_code": one, "start_date": "20200101", "end_date": DAY}),
+        ("stk_holdernumber/5y", "stk_holdernumber", {"ts_code": one, "start_date": "20200101", "end_date": DAY}),
+        ("ths_daily/day", "ths_daily", {"trade_date": DAY}),
+        ("index_weekly/5y", "index_weekly", {"ts_code": "000300.SH", "start_date": "20200101", "end_date": DAY}),
+        ("trade_cal/1y", "trade_cal", {**year}),
+        ("trade_date_offset", "trade_date_offset", {"date": DAY, "offsets": [-250, -20, -1, 1]}),
+        ("stk_auction_o/day", "stk_auction_o", {"trade_date": DAY}),
+        ("income/5y", "income", {"ts_code": one, "start_date": "20200101", "end_date": DAY}),
+        ("balancesheet/5y", "balancesheet", {"ts_code": one, "start_date": "20200101", "end_date": DAY}),
+        ("cashflow/5y", "cashflow", {"ts_code": one, "start_date": "20200101", "end_date": DAY}),
+        ("top10_floatholders/period", "top10_floatholders", {"ts_code": one, "period": "20240930"}),
+        ("index_monthly/10y", "index_monthly", {"ts_code": "000300.SH", "start_date": "20150101", "end_date": DAY}),
+        ("idx_factor_pro/1y", "idx_factor_pro", {"ts_code": "000300.SH", **year}),
+        ("moneyflow_mkt_dc/1y", "moneyflow_mkt_dc", {**year}),
+        ("moneyflow_hsgt/2y", "moneyflow_hsgt", {"start_date": "20230101", "end_date": DAY}),
+        ("index_weight/1m", "index_weight", {"index_code": "000300.SH", "start_date": "20241201", "end_date": DAY}),
+        ("index_dailybasic/1y", "index_dailybasic", {**year}),
+        ("daily_basic/market_day", "daily_basic", {"trade_date": DAY}),
+        ("index_member_all/all", "index_member_all", {}),
+        # 分析工具
+        ("get_trend_signals/single", "get_trend_signals", {"ts_code": one, "trade_date": DAY}),
+        ("get_trend_signals/1y", "get_trend_signals", {"ts_code": one, **year}),
+        ("get_trend_signals/batch50", "get_trend_signals", {"ts_code": codes50, "trade_date": DAY}),
+        ("get_sentiment_volume/batch50", "get_sentiment_volume", {"ts_code": codes50, "trade_date": DAY}),
+        ("get_valuation_metrics/single", "get_valuation_metrics", {"ts_code": one, "trade_date": DAY}),
+        ("get_valuation_metrics/batch50", "get_valuation_metrics", {"ts_code": codes50, "trade_date": DAY}),
+        ("get_valuation_percentiles/batch50", "get_valuation_percentiles", {"ts_code": codes50, "trade_date": DAY}),
+        ("get_valuation_metrics/history_batch50", "get_valuation_metrics", {"ts_code": codes50, "trade_date": "20230630"}),
+        ("get_oscillator_signals/batch50", "get_oscillator_signals", {"ts_code": codes50, "trade_date": DAY}),
+        ("get_volatility_profile/batch50", "get_volatility_profile", {"ts_code": codes50, "date": DAY}),
+        ("get_technical_profile/single", "get_technical_profile", {"ts_code": one, "trade_date": DAY}),
+        ("get_technical_profile/batch50", "get_technical_profile", {"ts_code": codes50, "trade_date": DAY}),
+        ("get_stock_dossier", "get_stock_dossier", {"ts_code": one, "trade_date": DAY}),
+        ("scan_market", "scan_market", {"trade_date": DAY, "conditions": {"trend_direction": "up"}}),
+        ("get_industry_valuation/l1", "get_industry_valuation", {"trade_date": DAY}),
+        ("get_industry_valuation/stock", "get_industry_valuation", {"trade_date": DAY, "ts_code": one}),
+    ]
+
+
+def call_tool(name: str, kwargs: Dict[str, Any]) -> Tuple[str, float, float, float, int]:
+    """调用一次工具（绕过工作线程池，直接执行同步实现），返回 (结果, 总耗时, fetch, serialize, 接口调用数)。"""
+    tool = getattr(server, name)
+    func = getattr(tool, "__wrapped__", tool)
+    fake: FakeProApi = app.pro._pro
+    calls_before = sum(fake.calls.values())
+    fetch_span.reset()
+    serialize_span.reset()
+    start = time.perf_counter()
+    result = func(**kwargs)
+    elapsed = time.perf_counter() - start
+    return result, elapsed, fetch_span.total, serialize_span.total, sum(fake.calls.values()) - calls_before
+
+
+def error_of(result: str) -> Optional[str]:
+    if not result.startswith('{"error"'):
+        return None
+    try:
+        return str(json.loads(result)["error"])
+    except (ValueError, KeyError):
+        return None
+
+
+def run_scenario(name: str, kwargs: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    # 每个场景使用空的本地存储、行业排名缓存和接口结果缓存，cold 一次反映首次调用（含补拉历史）的开销
+    tech_ext.factor_store.root = tempfile.mkdtemp(dir=_WORKDIR)
+    app.pro.cache.clear()
+    tech_ext.industry_ranks = IndustryRanks(
+        fetch_basic=app.pro.daily_basic,
+        fetch_members=app.pro.index_member_all,
+        cache_dir=tempfile.mkdtemp(dir=_WORKDIR),
+    )
+    result, cold, cold_fetch, _, cold_calls = call_tool(name, kwargs)
+    error = error_of(result)
+
+    runs = [call_tool(name, kwargs) for _ in range(max(1, repeat))]
+    warm = statistics.median(r[1] for r in runs)
+    fetch = statistics.median(r[2] for r in runs)
+    serialize = statistics.median(r[3] for r in runs)
+
+    tracemalloc.start()
+    call_tool(name, kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "cold_ms": cold * 1e3,
+        "cold_fetch_ms": cold_fetch * 1e3,
+        "cold_calls": cold_calls,
+        "warm_ms": warm * 1e3,
+        "fetch_ms": fetch * 1e3,
+        "compute_ms": max(0.0, warm - fetch - serialize) * 1e3,
+        "serialize_ms": serialize * 1e3,
+        "warm_calls": runs[-1][4],
+        "peak_kb": peak / 1024,
+        "payload_bytes": len(result.encode("utf-8")),
+        "error": error,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    min_ms: float,
+) -> List[str]:
+    """与基线对比，返回回退的场景说明。"""
+    regressions = []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ("cold_ms", "warm_ms"):
+            if row[key] > base[key] * tolerance and row[key] - base[key] > min_ms:
+                regressions.append(f"{name}: {key} {base[key]:.1f} -> {row[key]:.1f} ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--market", type=int, default=1000, help="全市场截面的股票数量")
+    parser.add_argument("--latency", type=float, default=0, help="每次接口调用的模拟延迟（毫秒）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的场景")
+    parser.add_argument("--json", help="把结果写入该文件")
+    parser.add_argument("--baseline", help="与该文件中保存的结果对比")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="相对基线允许的耗时倍数")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="低于该差值（毫秒）的变化不视为回退")
+    args = parser.parse_args()
+
+    fake = FakeProApi(market_size=args.market, latency=args.latency / 1e3, today=TODAY)
+    instrument(fake)
+    app.trade_calendar.window_start(DAY, 1)  # 先载入交易日历，不计入各场景
+
+    print(f"market={args.market} latency={args.latency:g}ms repeat={args.repeat}")
+    header = (
+        f"{'scenario':<32}{'cold':>9}{'warm':>9}{'fetch':>9}{'compute':>9}{'serial':>9}"
+        f"{'calls':>7}{'peak KB':>10}{'bytes':>11}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, tool, kwargs in scenarios(args.market):
+        if args.filter and args.filter not in name:
+            continue
+        row = run_scenario(tool, kwargs, args.repeat)
+        results[name] = row
+        print(
+            f"{name:<32}{row['cold_ms']:9.1f}{row['warm_ms']:9.1f}{row['fetch_ms']:9.1f}"
+            f"{row['compute_ms']:9.1f}{row['serialize_ms']:9.1f}"
+            f"{row['cold_calls']:>3d}/{row['warm_calls']:<3d}{row['peak_kb']:10.0f}{row['payload_bytes']:11d}"
+            + (f"  ERROR: {row['error']}" if row["error"] else "")
+        )
+    print("times in ms; calls = upstream calls cold/warm")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"market": args.market, "latency": args.latency, "results": results},
+                f, ensure_ascii=False, indent=2,
+            )
+
+    failed = [name for name, row in results.items() if row["error"]]
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        failed += regressions
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""get_trend_signals 向量化实现与原逐行实现的吞吐对比。
+
+用法：
+    python benchmarks/bench_trend_signals.py [--rows 1250 5000] [--repeat 5]
+
+脚本会先校验两种实现的输出完全一致，再分别计时。
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault("TUSHARE_TOKEN", "benchmark")
+
+from tushare_mcp_server.tech_ext import _trend_signal_records  # noqa: E402
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """生成形状接近 stk_factor_pro 的单只股票日线因子数据。"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, rows)))
+    close_s = pd.Series(close)
+    ema12 = close_s.ewm(span=12).mean()
+    ema26 = close_s.ewm(span=26).mean()
+    dif = ema12 - ema26
+    dea = dif.ewm(span=9).mean()
+    df = pd.DataFrame({
+        "ts_code": "000001.SZ",
+        "trade_date": pd.bdate_range("2000-01-03", periods=rows).strftime("%Y%m%d"),
+        "close_qfq": close,
+        "ma_qfq_5": close_s.rolling(5, min_periods=1).mean(),
+        "ma_qfq_20": close_s.rolling(20, min_periods=1).mean(),
+        "macd_dif_qfq": dif,
+        "macd_dea_qfq": dea,
+        "macd_qfq": (dif - dea) * 2,
+        "mtm_qfq": close_s.diff(12),
+    })
+    # 随机挖掉少量数据，覆盖缺失值分支
+    for col in ["ma_qfq_20", "macd_qfq", "mtm_qfq"]:
+        df.loc[rng.random(rows) < 0.01, col] = np.nan
+    return df
+
+
+def legacy_trend_signals(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """原 get_trend_signals 中的逐行实现（保留用于对比）。"""
+    results = []
+    
+    for i in range(len(df)):
+        current_data = df.iloc[i]
+        result = {
+            "ts_code": current_data['ts_code'],
+            "trade_date": current_data['trade_date']
+        }
+        
+        # 字段1: price_vs_ma5 - 价格与5日均线关系
+        if pd.notna(current_data.get('close_qfq')) and pd.notna(current_data.get('ma_qfq_5')):
+            close = current_data['close_qfq']
+            ma5 = current_data['ma_qfq_5']
+            
+            # 检查是否有前一日数据进行穿越判断
+            if i > 0:
+                prev_close = df.iloc[i-1]['close_qfq']
+                prev_ma5 = df.iloc[i-1]['ma_qfq_5']
+                
+                # 向上穿越：前一日close ≤ ma5，当日close > ma5
+                if prev_close <= prev_ma5 and close > ma5:
+                    result["price_vs_ma5"] = "crossing_up"
+                # 向下穿越：前一日close ≥ ma5，当日close < ma5  
+                elif prev_close >= prev_ma5 and close < ma5:
+                    result["price_vs_ma5"] = "crossing_down"
+                else:
+                    # 静态位置
+                    result["price_vs_ma5"] = "above" if close > ma5 else "below"
+            else:
+                # 第一天数据，只能判断静态位置
+                result["price_vs_ma5"] = "above" if close > ma5 else "below"
+        else:
+            result["price_vs_ma5"] = None
+        
+        # 字段2: ma5_vs_ma20 - 均线排列状态
+        if pd.notna(current_data.get('ma_qfq_5')) and pd.notna(current_data.get('ma_qfq_20')):
+            ma5 = current_data['ma_qfq_5']
+            ma20 = current_data['ma_qfq_20']
+            result["ma5_vs_ma20"] = "bullish_alignment" if ma5 > ma20 else "bearish_alignment"
+        else:
+            result["ma5_vs_ma20"] = None
+        
+        # 字段3: macd_status - MACD信号
+        if (pd.notna(current_data.get('macd_dif_qfq')) and 
+            pd.notna(current_data.get('macd_dea_qfq'))):
+            
+            dif = current_data['macd_dif_qfq']
+            dea = current_data['macd_dea_qfq']
+            
+            # 检查是否有前一日数据进行交叉判断
+            if i > 0:
+                prev_dif = df.iloc[i-1]['macd_dif_qfq']
+                prev_dea = df.iloc[i-1]['macd_dea_qfq']
+                
+                # 金叉：前一日dif ≤ dea，当日dif > dea
+                if prev_dif <= prev_dea and dif > dea:
+                    result["macd_status"] = "golden_cross"
+                # 死叉：前一日dif ≥ dea，当日dif < dea
+                elif prev_dif >= prev_dea and dif < dea:
+                    result["macd_status"] = "death_cross"
+                else:
+                    # 非交叉日
+                    if dif > dea and dif > 0:
+                        result["macd_status"] = "positive_momentum"
+                    elif dif < dea and dif < 0:
+                        result["macd_status"] = "negative_momentum"
+                    else:
+                        result["macd_status"] = "recovering"
+            else:
+                # 第一天数据，只能判断静态状态
+                if dif > dea and dif > 0:
+                    result["macd_status"] = "positive_momentum"
+                elif dif < dea and dif < 0:
+                    result["macd_status"] = "negative_momentum"
+                else:
+                    result["macd_status"] = "recovering"
+        else:
+            result["macd_status"] = None
+        
+        # 字段4: trend_direction - 综合趋势方向
+        # 重新获取原始值（避免依赖 result 字段）
+        close = current_data.get('close_qfq')
+        ma5 = current_data.get('ma_qfq_5')
+        ma20 = current_data.get('ma_qfq_20')
+        dif = current_data.get('macd_dif_qfq')
+        dea = current_data.get('macd_dea_qfq')
+        
+        valid_for_trend = all(pd.notna(x) for x in [close, ma5, ma20, dif, dea])
+        
+        if valid_for_trend:
+            # 上涨：ma5 > ma20, price > ma5, 且 dif >= dea（允许金叉或正动量）
+            if ma5 > ma20 and close > ma5 and dif >= dea:
+                result["trend_direction"] = "up"
+            # 下跌：ma5 < ma20, price < ma5, 且 dif <= dea
+            elif ma5 < ma20 and close < ma5 and dif <= dea:
+                result["trend_direction"] = "down"
+            else:
+                result["trend_direction"] = "sideways"
+        else:
+            result["trend_direction"] = None
+        
+        # 字段5: trend_strength - 趋势强度
+        # 使用相对MACD值（MACD/收盘价）避免股价绝对值影响
+        if (pd.notna(current_data.get('macd_qfq')) and 
+            pd.notna(current_data.get('close_qfq')) and 
+            current_data.get('close_qfq', 0) != 0):
+            
+            macd_hist = current_data['macd_qfq']
+            close = current_data['close_qfq']
+            relative_macd = abs(macd_hist) / close  # 相对强度
+            
+            # 计算20日窗口内的强度（如果数据足够）
+            start_idx = max(0, i-19)
+            window_data = df.iloc[start_idx:i+1]
+            
+            if len(window_data) >= 10:  # 至少需要10天数据
+                # 计算相对MACD的历史分位数
+                valid_window = window_data[
+                    (window_data['macd_qfq'].notna()) & 
+                    (window_data['close_qfq'].notna()) & 
+                    (window_data['close_qfq'] != 0)
+                ]
+                
+                if len(valid_window) > 0:
+                    window_relative_macd = (valid_window['macd_qfq'].abs() / 
+                                          valid_window['close_qfq'])
+                    current_relative = relative_macd
+                    
+                    if len(window_relative_macd) > 0:
+                        percentile = (window_relative_macd < current_relative).mean() * 100
+                        
+                        if percentile >= 75:
+                            result["trend_strength"] = "strong"
+                        elif percentile <= 25:
+                            result["trend_strength"] = "weak"
+                        else:
+                            result["trend_strength"] = "moderate"
+                    else:
+                        result["trend_strength"] = "moderate"
+                else:
+                    result["trend_strength"] = "moderate"
+            else:
+                # 数据不足，使用相对阈值判断
+                # 基于经验：相对MACD > 1% 视为强趋势，< 0.1% 视为弱趋势
+                if relative_macd > 0.01:  # 1%
+                    result["trend_strength"] = "strong"
+                elif relative_macd < 0.001:  # 0.1%
+                    result["trend_strength"] = "weak"
+                else:
+                    result["trend_strength"] = "moderate"
+        else:
+            result["trend_strength"] = None
+        
+        # 字段6: momentum_change - 动量变化
+        if pd.notna(current_data.get('mtm_qfq')):
+            current_mtm = current_data['mtm_qfq']
+            
+            if i > 0:
+                prev_mtm = df.iloc[i-1]['mtm_qfq']
+                
+                # 先判断动量方向是否反转（优先级最高）
+                if (prev_mtm <= 0 and current_mtm > 0) or (prev_mtm >= 0 and current_mtm < 0):
+                    result["momentum_change"] = "reversing"
+                elif current_mtm > 0:  # 上涨动量
+                    result["momentum_change"] = "accelerating" if current_mtm > prev_mtm else "decelerating"
+                else:  # 下跌动量
+                    result["momentum_change"] = "accelerating_down" if current_mtm < prev_mtm else "decelerating_down"
+            else:
+                # 第一天数据，只能判断当前状态
+                result["momentum_change"] = "accelerating" if current_mtm > 0 else "accelerating_down"
+        else:
+            result["momentum_change"] = None
+        
+        results.append(result)
+    return results
+
+
+def best_of(func, df: pd.DataFrame, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[250, 1250, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'loop (ms)':>12} {'vectorized (ms)':>16} {'speedup':>9}")
+    for rows in args.rows:
+        df = make_frame(rows)
+        if legacy_trend_signals(df) != _trend_signal_records(df):
+            raise SystemExit(f"输出不一致：rows={rows}")
+        loop = best_of(legacy_trend_signals, df, args.repeat)
+        vectorized = best_of(_trend_signal_records, df, args.repeat)
+        print(f"{rows:>8} {loop * 1000:>12.1f} {vectorized * 1000:>16.2f} {loop / vectorized:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
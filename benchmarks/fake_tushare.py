@@ -0,0 +1,257 @@
+"""本地 Tushare 替身：不需要 token 和网络，为每个已封装的接口生成形状接近真实数据的确定性结果。
+
+用法：
+    from fake_tushare import FakeProApi
+    app.pro._pro = FakeProApi(market_size=1000)
+
+- 各接口的返回字段取自 docs/interface.md，stk_factor_pro 为完整的约 150 个因子
+- 按 ts_code + 日期区间查询时每个代码每个交易日一行；只传 trade_date 时返回 market_size
+  只股票的全市场截面；财务类接口按报告期、周线/月线接口按周/月生成
+- 支持 fields 裁剪和 limit/offset 分页（行数上限与 client.ROW_LIMITS 一致时会触发自动分页）
+- 相同的参数总是返回相同的数据；latency 为每次调用额外等待的秒数，模拟网络往返
+"""
+
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DOCS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docs", "interface.md")
+
+# 日期类字段：生成 YYYYMMDD 字符串
+DATE_FIELDS = {
+    "trade_date", "cal_date", "ann_date", "f_ann_date", "end_date", "period", "list_date",
+    "delist_date", "in_date", "out_date", "pretrade_date",
+}
+# 描述中含这些词的字段生成字符串
+_TEXT_MARKERS = re.compile(r"代码|名称|简称|全称|状态|类型|地域|行业|交易所|货币|拼音|领涨|标识|是否|来源|实控人|级别|原因")
+
+# 各接口的数据频率：D 交易日、W 周、M 月、Q 报告期、S 静态列表（不按日期展开）
+FREQUENCY = {
+    "index_weekly": "W", "index_monthly": "M",
+    "income": "Q", "balancesheet": "Q", "cashflow": "Q", "fina_indicator": "Q",
+    "stk_holdernumber": "Q", "top10_floatholders": "Q",
+    "stock_basic": "S", "index_classify": "S", "index_member_all": "S",
+}
+# 每个代码每个日期的行数（如十大流通股东每期 10 行）
+ROWS_PER_KEY = {"top10_floatholders": 10}
+# 不传代码时的代码数量（不填为 market_size）
+UNIVERSE_SIZE = {
+    "moneyflow_cnt_ths": 400, "moneyflow_ind_ths": 90, "ths_daily": 1200,
+    "index_classify": 511, "index_weight": 300, "index_dailybasic": 12,
+}
+# 没有 ts_code 列、每个日期一行的接口
+MARKET_LEVEL = {"moneyflow_mkt_dc", "moneyflow_hsgt"}
+
+# 文档只列出了默认参数的因子名（如 ma_qfq、rsi_qfq），真实接口还返回带周期后缀的字段
+_EXTRA_FIELDS = {
+    "stk_factor_pro": [
+        "ma_qfq_5", "ma_qfq_20", "macd_dif_qfq", "macd_qfq", "mfi_qfq", "psy_qfq", "rsi_qfq_6",
+        "rsi_qfq_12", "wr1_qfq", "wr_qfq", "ktn_upper_qfq", "ktn_down_qfq", "topdays", "lowdays",
+    ],
+}
+
+_DAILY_BASIC_FIELDS = [
+    "ts_code", "trade_date", "close", "turnover_rate", "turnover_rate_f", "volume_ratio", "pe",
+    "pe_ttm", "pb", "ps", "ps_ttm", "dv_ratio", "dv_ttm", "total_share", "float_share",
+    "free_share", "total_mv", "circ_mv",
+]
+
+
+def parse_interface_docs(path: str = DOCS) -> Dict[str, List[Tuple[str, str]]]:
+    """解析接口文档，返回 {接口名: [(字段名, 描述), ...]}。"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    specs: Dict[str, List[Tuple[str, str]]] = {}
+    for section in text.split("\n### ")[1:]:
+        api = section.split("\n", 1)[0].rsplit(" - ", 1)[-1].strip()
+        match = re.search(r"\*\*返回字段[^*]*\*\*", section)
+        if match is None:
+            continue
+        lines = []
+        for line in section[match.end():].split("\n")[1:]:
+            if line.startswith("**") or line.startswith("---"):
+                break
+            lines.append(line)
+        fields = re.findall(r"^- `(\w+)`:?\s*(.*)$", "\n".join(lines), flags=re.M)
+        specs[api] = list(dict((name, desc) for name, desc in fields).items())
+    specs.setdefault("daily_basic", [(name, "") for name in _DAILY_BASIC_FIELDS])
+    for api, names in _EXTRA_FIELDS.items():
+        known = {name for name, _ in specs.get(api, [])}
+        specs[api] = specs.get(api, []) + [(name, "") for name in names if name not in known]
+    return specs
+
+
+# 前/后复权价格字段，如 close_qfq、open_hfq
+_ADJUSTED_PRICE = re.compile(r"^(open|high|low|close|pre_close)_(qfq|hfq)$")
+
+
+def _seed(*parts: Any) -> int:
+    return zlib.crc32("|".join(str(p) for p in parts).encode("utf-8"))
+
+
+def stock_codes(n: int) -> List[str]:
+    """n 个形如真实A股的代码（深市、沪市交替）。"""
+    return [f"{i:06d}.SZ" if i % 2 else f"{600000 + i:06d}.SH" for i in range(1, n + 1)]
+
+
+class FakeProApi:
+    """与 ts.pro_api() 接口相同的本地替身。
+
+    - market_size: 全市场截面的股票数量
+    - latency: 每次调用额外等待的秒数
+    - history_start: 未指定开始日期时的默认起始日
+    """
+
+    def __init__(
+        self,
+        market_size: int = 5000,
+        latency: float = 0.0,
+        history_start: str = "20150101",
+        today: Optional[str] = None,
+    ) -> None:
+        self.market_size = market_size
+        self.latency = latency
+        self.history_start = history_start
+        self.today = today or date.today().strftime("%Y%m%d")
+        self.specs = parse_interface_docs()
+        self.calls: Dict[str, int] = {}
+        self.rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ 日期
+
+    def _dates(self, freq: str, start: str, end: str) -> List[str]:
+        # 交易日近似为工作日（pd.bdate_range 逐日生成，较慢，按星期过滤日历日）
+        days = pd.date_range(start, end)
+        days = days[days.dayofweek < 5]
+        if freq == "W":
+            days = days[days.dayofweek == 4]
+        elif freq == "M":
+            days = pd.Series(days).groupby(days.to_period("M")).max()
+        elif freq == "Q":
+            days = pd.date_range(start, end)
+            days = days[days.is_month_end & (days.month % 3 == 0)]
+        return [d.strftime("%Y%m%d") for d in days]
+
+    def _date_range(self, api: str, kwargs: Dict[str, Any]) -> List[str]:
+        freq = FREQUENCY.get(api, "D")
+        single = kwargs.get("trade_date") or kwargs.get("period") or kwargs.get("cal_date")
+        if single:
+            return [str(single)]
+        end = str(kwargs.get("end_date") or self.today)
+        start = kwargs.get("start_date")
+        if not start:
+            # 只给代码时：日线默认一年，周/月/季度数据默认全部历史
+            start = self.history_start if freq != "D" else (
+                (date(int(end[:4]), int(end[4:6]), int(end[6:])) - timedelta(days=365)).strftime("%Y%m%d")
+            )
+        return self._dates(freq, str(start), end)[::-1]
+
+    # ------------------------------------------------------------------ 生成
+
+    def _frame(self, api: str, kwargs: Dict[str, Any], fields: List[str]) -> pd.DataFrame:
+        spec = self.specs.get(api)
+        if spec is None:
+            raise RuntimeError(f"fake backend has no schema for {api}")
+        if fields:
+            wanted = set(fields)
+            spec = [(name, desc) for name, desc in spec if name in wanted]
+
+        freq = FREQUENCY.get(api, "D")
+        dates = [""] if freq == "S" else self._date_range(api, kwargs)
+        if api in MARKET_LEVEL:
+            codes = [""]
+        elif kwargs.get("ts_code") and freq != "S":
+            codes = [c.strip() for c in str(kwargs["ts_code"]).split(",") if c.strip()]
+        else:
+            codes = stock_codes(UNIVERSE_SIZE.get(api, self.market_size))
+        per_key = ROWS_PER_KEY.get(api, 1)
+
+        n_codes, n_dates = len(codes), len(dates)
+        n = n_codes * n_dates * per_key
+        key = (api, codes[0], codes[-1], n_codes, dates[0], dates[-1])
+        # 行按日期降序、代码升序排列（与 Tushare 一致）
+        date_col = np.repeat(np.array(dates, dtype=object), n_codes * per_key)
+        code_col = np.tile(np.repeat(np.array(codes, dtype=object), per_key), n_dates)
+        # 价格类字段按代码做随机游走
+        walk = np.random.default_rng(_seed(*key, "price")).normal(0, 0.02, size=(n_dates, n_codes * per_key))
+        price = (10 * np.exp(np.cumsum(walk[::-1], axis=0)[::-1])).reshape(-1)
+
+        columns: Dict[str, Any] = {}
+        for name, desc in spec:
+            if name in ("ts_code", "con_code"):
+                columns[name] = code_col
+            elif name == "out_date" and kwargs.get("is_new", "Y") != "N":
+                # 最新成分尚未剔除
+                columns[name] = np.full(n, None, dtype=object)
+            elif name in DATE_FIELDS:
+                columns[name] = date_col if dates[0] else np.full(n, self.history_start, dtype=object)
+            elif _TEXT_MARKERS.search(desc) or name in ("name", "exchange", "market"):
+                columns[name] = np.array([f"{name}_{i % 97}" for i in range(n)], dtype=object)
+            elif name == "adj_factor":
+                columns[name] = np.ones(n)
+            else:
+                # 每列单独取随机种子：裁剪字段不影响其余列的取值。复权因子恒为 1，
+                # 前/后复权价格（close_qfq 等）与原始价格同一种子，取值相同
+                rng = np.random.default_rng(_seed(*key, _ADJUSTED_PRICE.sub(r"\1", name)))
+                values = np.exp(rng.normal(2.0, 0.6, size=n))
+                if re.match(r"(rsi|kdj|mfi|psy|wr)", name):
+                    values = rng.uniform(0, 100, size=n)
+                elif re.match(r"(open|high|low|close|pre_close|avg_price|ma_|ema_|expma_|boll_|ktn_)", name):
+                    values = price * (1 + 0.001 * (values - 8.0))
+                elif "pct" in name or "change" in name or name.startswith("net"):
+                    values = values - 8.0
+                values[rng.random(n) < 0.02] = np.nan
+                columns[name] = values
+        return pd.DataFrame(columns, columns=[name for name, _ in spec])
+
+    def _trade_cal(self, kwargs: Dict[str, Any]) -> pd.DataFrame:
+        days = pd.date_range(kwargs.get("start_date") or "19900101", kwargs.get("end_date") or self.today)
+        is_open = (days.dayofweek < 5).astype(int)
+        df = pd.DataFrame({
+            "exchange": kwargs.get("exchange") or "SSE",
+            "cal_date": days.strftime("%Y%m%d"),
+            "is_open": is_open,
+        })
+        open_dates = df["cal_date"].where(df["is_open"] == 1).ffill().shift(1)
+        df["pretrade_date"] = open_dates
+        if kwargs.get("is_open") not in (None, ""):
+            df = df[df["is_open"] == int(kwargs["is_open"])]
+        return df[::-1].reset_index(drop=True)
+
+    # ------------------------------------------------------------------ 接口
+
+    def query(self, api_name: str, fields: str = "", **kwargs: Any) -> pd.DataFrame:
+        if self.latency:
+            time.sleep(self.latency)
+        offset = int(kwargs.pop("offset", 0) or 0)
+        limit = kwargs.pop("limit", None)
+        names = [f.strip() for f in (fields or "").split(",") if f.strip()]
+        if api_name == "trade_cal":
+            df = self._trade_cal(kwargs)
+        else:
+            df = self._frame(api_name, kwargs, names)
+        if names:
+            df = df[[n for n in dict.fromkeys(names) if n in df.columns]]
+        if offset or limit:
+            df = df.iloc[offset:offset + int(limit) if limit else None].reset_index(drop=True)
+        with self._lock:
+            self.calls[api_name] = self.calls.get(api_name, 0) + 1
+            self.rows[api_name] = self.rows.get(api_name, 0) + len(df)
+        return df
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(**kwargs: Any) -> pd.DataFrame:
+            return self.query(name, **kwargs)
+
+        return call
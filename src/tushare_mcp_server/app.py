@@ -0,0 +1,21 @@
+from mcp.server.fastmcp import FastMCP
+
+from tushare_mcp_server.client import TushareClient
+from tushare_mcp_server.freshness import FreshnessPolicy
+from tushare_mcp_server.trade_calendar import TradingCalendar
+
+
+# 服务器（server.py）与分析模块（tech_ext.py）共用的 MCP 实例、Tushare 客户端和交易日历，
+# 限速队列、连接与本地缓存在所有工具之间共享
+
+# 按接口限速、限制并发并排队，配额或网络错误时自动退避重试；
+# token 读取与 ts.pro_api() 推迟到第一次调用接口时，启动时不导入 tushare/pandas
+pro = TushareClient()
+
+# 交易日历索引（上交所日历，本地缓存）
+trade_calendar = TradingCalendar(fetch=pro.trade_cal)
+
+# 接口结果缓存按交易日历与各接口的发布时间过期：已发布的历史区间一直缓存，当日数据到发布时间后才刷新
+pro.cache.policy = FreshnessPolicy(trade_calendar)
+
+mcp = FastMCP("Tushare MCP Server")
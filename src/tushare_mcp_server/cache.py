@@ -0,0 +1,353 @@
+import os
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from tushare_mcp_server import stats
+from tushare_mcp_server.shared_cache import POLL_INTERVAL, SHARED_CACHE, SharedCache
+
+if TYPE_CHECKING:  # 只用于类型标注：freshness 依赖交易日历，交易日历又经由客户端取数
+    from tushare_mcp_server.freshness import FreshnessPolicy
+
+
+# 内存缓存的容量上限（MB，按 DataFrame 实际占用的内存计算），设为 0 关闭缓存：
+# 可通过环境变量 TUSHARE_API_CACHE_MB 覆盖
+API_CACHE_MB = float(os.getenv("TUSHARE_API_CACHE_MB", "256"))
+
+# 缓存结果的默认有效期（秒）：TUSHARE_API_CACHE_TTL 设置默认值，
+# TUSHARE_API_CACHE_TTLS 按接口覆盖，格式如 "moneyflow=60,stock_basic=86400"；有效期为 0 的接口不缓存。
+# 设置了 freshness.FreshnessPolicy 时，有效期只用于没有发布时间规则可循的结果
+DEFAULT_TTL = int(os.getenv("TUSHARE_API_CACHE_TTL", "300"))
+
+ENDPOINT_TTLS: Dict[str, int] = {
+    # 交易日历、行业分类、股票列表变化很慢
+    "trade_cal": 86400,
+    "index_classify": 86400,
+    "stock_basic": 21600,
+    "index_member_all": 21600,
+    # 财务报表与股东数据只在公告时变化
+    "fina_indicator": 3600,
+    "income": 3600,
+    "balancesheet": 3600,
+    "cashflow": 3600,
+    "stk_holdernumber": 3600,
+    "top10_floatholders": 3600,
+    # 已由 FactorStore 持久化在本地，不再在内存中重复保存
+    "stk_factor_pro": 0,
+}
+
+# start_date/end_date 所筛选的日期列（默认 trade_date）：缓存的较宽区间按该列切片后用于较窄区间的查询。
+# 与 docs/interface.md 中各接口的参数说明一致：fina_indicator、income 按报告期（end_date 列）筛选，
+# 其余财务报表与股东数据按公告日
+RANGE_COLUMNS: Dict[str, str] = {
+    "trade_cal": "cal_date",
+    "fina_indicator": "end_date",
+    "income": "end_date",
+    "balancesheet": "ann_date",
+    "cashflow": "ann_date",
+    "stk_holdernumber": "ann_date",
+    "top10_floatholders": "ann_date",
+}
+
+# 参与区间包含判断、不计入其余参数的键
+_RANGE_KEYS = ("start_date", "end_date", "trade_date")
+
+
+def _parse_ttls(spec: str) -> Dict[str, int]:
+    ttls: Dict[str, int] = {}
+    for item in spec.split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip() and value.strip().isdigit():
+            ttls[name.strip()] = int(value)
+    return ttls
+
+
+ENDPOINT_TTLS.update(_parse_ttls(os.getenv("TUSHARE_API_CACHE_TTLS", "")))
+
+
+def _frame_bytes(df: Any) -> int:
+    """DataFrame 实际占用的内存（含字符串等对象列的内容）。"""
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except (AttributeError, TypeError):
+        return 0
+
+
+def _freeze(value: Any) -> Any:
+    """把 JSON 解码得到的嵌套列表还原为缓存键使用的嵌套元组。"""
+    return tuple(_freeze(v) for v in value) if isinstance(value, list) else value
+
+
+def _fields(value: Any) -> Optional[Tuple[str, ...]]:
+    if not value:
+        return None
+    names = value.split(",") if isinstance(value, str) else list(value)
+    names = [n.strip() for n in names if n.strip()]
+    return tuple(dict.fromkeys(names)) or None
+
+
+class _Entry:
+    def __init__(
+        self,
+        api: str,
+        params: Tuple[Tuple[str, str], ...],
+        span: Optional[Tuple[str, str]],
+        fields: Optional[Tuple[str, ...]],
+        frame: Any,
+        expires: float,
+    ) -> None:
+        self.api = api
+        self.params = params
+        self.span = span
+        self.fields = fields
+        self.frame = frame
+        self.nbytes = _frame_bytes(frame)
+        self.expires = expires
+
+
+class FrameCache:
+    """Tushare 接口结果的进程内缓存：按接口与规范化后的参数缓存 DataFrame。
+
+    - 每个接口有各自的有效期（ENDPOINT_TTLS，默认 DEFAULT_TTL），过期后重新请求；
+      设置 policy 后按交易日历与接口发布时间决定过期时间（已发布的历史区间一直缓存，见 freshness.py）
+    - 容量按 DataFrame 实际占用的内存计算，超出 max_bytes 时淘汰最久未使用的结果
+    - 区间包含：已缓存 [start_date, end_date] 的结果可以切片回答其中任意较窄区间
+      或单个 trade_date 的查询（其余参数相同、所需字段都已缓存时），不必再请求
+
+    带 limit/offset 的调用只返回部分结果，不缓存。
+
+    设置 shared（shared_cache.SharedCache）后作为两级缓存：进程内未命中时查询同一台机器上各进程共享的缓存，
+    新取到的结果同时写入两级；同一份数据同一时间只由一个进程拉取，其他进程等待其结果。
+
+    - max_bytes: 容量上限（字节），默认 API_CACHE_MB；为 0 时不缓存
+    - ttls: 接口 -> 有效期（秒），默认 ENDPOINT_TTLS
+    - default_ttl: 未在 ttls 中的接口的有效期，默认 DEFAULT_TTL
+    - policy: 过期策略，不设置时只按有效期过期
+    - shared: 跨进程共享缓存，默认在 TUSHARE_SHARED_CACHE=1 时创建，否则不使用
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        ttls: Optional[Dict[str, int]] = None,
+        default_ttl: Optional[int] = None,
+        policy: Optional["FreshnessPolicy"] = None,
+        shared: Optional[SharedCache] = None,
+    ) -> None:
+        self.max_bytes = int(API_CACHE_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self.ttls = ENDPOINT_TTLS if ttls is None else ttls
+        self.default_ttl = DEFAULT_TTL if default_ttl is None else default_ttl
+        self.policy = policy
+        self.shared = shared if shared is not None or not SHARED_CACHE else SharedCache()
+        self._entries: "OrderedDict[Tuple[Any, ...], _Entry]" = OrderedDict()
+        # (接口, 区间以外的参数) -> 对应的缓存键，用于区间包含查找
+        self._groups: Dict[Tuple[Any, ...], List[Tuple[Any, ...]]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def ttl(self, api: str) -> int:
+        return self.ttls.get(api, self.default_ttl)
+
+    def enabled(self, api: str, kwargs: Dict[str, Any]) -> bool:
+        """该次调用是否走缓存。"""
+        return (
+            self.max_bytes > 0
+            and self.ttl(api) > 0
+            and kwargs.get("limit") is None
+            and kwargs.get("offset") is None
+        )
+
+    @staticmethod
+    def _normalize(
+        api: str, kwargs: Dict[str, Any]
+    ) -> Tuple[Tuple[Tuple[str, str], ...], Optional[Tuple[str, str]], Optional[Tuple[str, ...]], Tuple[Any, ...]]:
+        """返回 (区间以外的参数, 查询区间, 字段, 完整缓存键)。未传（None 或空串）的参数不计入。"""
+        params = tuple(sorted(
+            (name, str(value)) for name, value in kwargs.items()
+            if value is not None and value != "" and name not in _RANGE_KEYS and name != "fields"
+        ))
+        start, end, day = (kwargs.get(k) for k in _RANGE_KEYS)
+        span: Optional[Tuple[str, str]] = None
+        if day:
+            span = (str(day), str(day))
+        elif start and end:
+            span = (str(start), str(end))
+        fields = _fields(kwargs.get("fields"))
+        dates = tuple((k, str(kwargs[k])) for k in _RANGE_KEYS if kwargs.get(k))
+        return params, span, fields, (api, params, dates, fields)
+
+    def _slice(self, entry: _Entry, span: Tuple[str, str], fields: Optional[Tuple[str, ...]]) -> Any:
+        """用 entry 回答区间 span、字段 fields 的查询（返回新的 DataFrame），不能回答时返回 None。"""
+        if entry.span is None or not (entry.span[0] <= span[0] and span[1] <= entry.span[1]):
+            return None
+        if fields is None:
+            if entry.fields is not None:
+                return None  # 缓存的是指定字段，未必包含接口默认返回的全部字段
+        elif not set(fields) <= set(entry.frame.columns):
+            return None
+        column = RANGE_COLUMNS.get(entry.api, "trade_date")
+        if column not in entry.frame.columns:
+            return None
+        dates = entry.frame[column].astype(str)
+        df = entry.frame[(dates >= span[0]) & (dates <= span[1])].reset_index(drop=True)
+        return df if fields is None else df[list(fields)]
+
+    def get(self, api: str, kwargs: Dict[str, Any]) -> Any:
+        """返回缓存的结果（副本），没有可用结果时返回 None。"""
+        params, span, fields, key = self._normalize(api, kwargs)
+        now = time.time()
+        df = self._get_local(api, params, span, fields, key, now)
+        if df is None and self.shared is not None:
+            df = self._get_shared(api, params, span, fields, key, now)
+        return df
+
+    def _get_local(
+        self,
+        api: str,
+        params: Tuple[Tuple[str, str], ...],
+        span: Optional[Tuple[str, str]],
+        fields: Optional[Tuple[str, ...]],
+        key: Tuple[Any, ...],
+        now: float,
+    ) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= now:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry.frame.copy()
+            if span is None:
+                return None
+            # 后缓存的结果优先：通常更新鲜
+            for candidate in reversed(self._groups.get((api, params), [])):
+                other = self._entries[candidate]
+                if other.expires <= now:
+                    continue
+                df = self._slice(other, span, fields)
+                if df is not None:
+                    self._entries.move_to_end(candidate)
+                    return df
+            return None
+
+    def _get_shared(
+        self,
+        api: str,
+        params: Tuple[Tuple[str, str], ...],
+        span: Optional[Tuple[str, str]],
+        fields: Optional[Tuple[str, ...]],
+        key: Tuple[Any, ...],
+        now: float,
+    ) -> Any:
+        """从共享缓存取结果，取到后同时放入进程内缓存。"""
+        assert self.shared is not None
+        key_text = json.dumps(key, ensure_ascii=False)
+        for shared_key, shared_span, shared_fields, expires, frame in self.shared.lookup(
+            key_text, api, json.dumps(params, ensure_ascii=False), span, now
+        ):
+            entry = _Entry(
+                api, params, shared_span, _freeze(json.loads(shared_fields)) if shared_fields else None,
+                frame, expires,
+            )
+            df = frame.copy() if shared_key == key_text else (
+                self._slice(entry, span, fields) if span is not None else None
+            )
+            if df is not None:
+                self.shared.touch(shared_key, now)
+                self._put_local(_freeze(json.loads(shared_key)), entry)
+                return df
+        return None
+
+    def fetch(self, api: str, kwargs: Dict[str, Any], load: Callable[[], Any]) -> Any:
+        """返回缓存的结果；没有时调用 load 取数并写入缓存。
+
+        使用共享缓存时，其他进程正在拉取同一份数据则等待其结果，而不是同时向 Tushare 重复请求。
+        """
+        df = self.get(api, kwargs)
+        stats.record_cache("api_cache", int(df is not None), int(df is None))
+        if df is not None:
+            return df
+        if self.shared is None:
+            df = load()
+            self.put(api, kwargs, df)
+            return df
+
+        key_text = json.dumps(self._normalize(api, kwargs)[3], ensure_ascii=False)
+        owner = self.shared.claim(key_text)
+        while owner is None:
+            time.sleep(POLL_INTERVAL)
+            df = self.get(api, kwargs)
+            if df is not None:
+                return df
+            # 登记的进程拉取失败或超时后，由本进程接手
+            owner = self.shared.claim(key_text)
+        try:
+            df = load()
+            self.put(api, kwargs, df)
+            return df
+        finally:
+            self.shared.release(key_text, owner)
+
+    def put(self, api: str, kwargs: Dict[str, Any], df: Any) -> None:
+        """缓存一次调用的结果；单个结果超过容量上限时不缓存。"""
+        if df is None or not hasattr(df, "columns"):
+            return
+        params, span, fields, key = self._normalize(api, kwargs)
+        # 在加锁之外计算过期时间：过期策略可能需要加载交易日历
+        now, ttl = time.time(), self.ttl(api)
+        expires = now + ttl if self.policy is None else self.policy.expires(api, span, df, now, ttl)
+        entry = _Entry(api, params, span, fields, df.copy(), expires)
+        self._put_local(key, entry)
+        if self.shared is not None:
+            self.shared.store(
+                json.dumps(key, ensure_ascii=False), api, json.dumps(params, ensure_ascii=False),
+                span, json.dumps(fields, ensure_ascii=False) if fields else None, expires, entry.frame,
+            )
+
+    def _put_local(self, key: Tuple[Any, ...], entry: _Entry) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._groups.setdefault((entry.api, entry.params), []).append(key)
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: Tuple[Any, ...]) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+        group = self._groups[(entry.api, entry.params)]
+        group.remove(key)
+        if not group:
+            del self._groups[(entry.api, entry.params)]
+
+    def invalidate(self, api: Optional[str] = None) -> None:
+        """丢弃某个接口（不传时为全部接口）的缓存结果。"""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if api is None or e.api == api]:
+                self._drop(key)
+
+    def clear(self) -> None:
+        """丢弃进程内的全部缓存结果（共享缓存不受影响，见 SharedCache.clear）。"""
+        self.invalidate()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """缓存的结果数（其中不再过期的条数）、占用字节数、容量上限与累计淘汰次数（命中率见 stats 的 api_cache）。"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "settled": sum(1 for e in self._entries.values() if math.isinf(e.expires)),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                **({"shared": self.shared.snapshot()} if self.shared is not None else {}),
+            }
@@ -0,0 +1,444 @@
+import os
+import time
+import functools
+import heapq
+import random
+import itertools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from tushare_mcp_server import stats
+from tushare_mcp_server.cache import FrameCache
+
+
+# 每个接口同时在途的请求数上限：TUSHARE_ENDPOINT_CONCURRENCY 设置默认值，
+# TUSHARE_ENDPOINT_LIMITS 按接口覆盖，格式如 "income=1,index_member_all=2"
+DEFAULT_CONCURRENCY = int(os.getenv("TUSHARE_ENDPOINT_CONCURRENCY", "4"))
+
+ENDPOINT_CONCURRENCY: Dict[str, int] = {
+    # 单次返回数据量大、频控较严的接口
+    "index_member_all": 2,
+    "income": 2,
+    "balancesheet": 2,
+    "cashflow": 2,
+    "fina_indicator": 2,
+    "top10_floatholders": 2,
+}
+
+# 每个接口每分钟的调用配额：TUSHARE_RATE_LIMIT 设置默认值，
+# TUSHARE_RATE_LIMITS 按接口覆盖，格式如 "stk_factor_pro=30,moneyflow=100"
+DEFAULT_RATE_LIMIT = int(os.getenv("TUSHARE_RATE_LIMIT", "200"))
+
+ENDPOINT_RATE_LIMITS: Dict[str, int] = {}
+
+# 配额或网络错误的最大重试次数与退避参数（秒）
+MAX_RETRIES = int(os.getenv("TUSHARE_MAX_RETRIES", "3"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# 各接口单次请求返回的行数上限（见 docs/interface.md）：结果触及上限时按 offset 自动分页
+ROW_LIMITS: Dict[str, int] = {
+    "stk_factor_pro": 10000,
+    "moneyflow": 6000,
+    "moneyflow_cnt_ths": 5000,
+    "moneyflow_ind_ths": 5000,
+    "cyq_perf": 5000,
+    "index_member_all": 2000,
+    "stk_holdernumber": 3000,
+    "index_weekly": 1000,
+    "stk_auction_o": 10000,
+    "income": 3000,
+    "index_monthly": 5000,
+    "idx_factor_pro": 8000,
+    "moneyflow_mkt_dc": 3000,
+    "moneyflow_hsgt": 300,
+    "index_dailybasic": 3000,
+    "daily_basic": 6000,
+}
+
+# 单次调用最多拉取的页数，防止异常参数导致无限翻页
+MAX_PAGES = 200
+
+# 调用优先级：数值越小越先获得配额
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits: Dict[str, int] = {}
+    for item in spec.split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip() and value.strip().isdigit():
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+ENDPOINT_CONCURRENCY.update(_parse_limits(os.getenv("TUSHARE_ENDPOINT_LIMITS", "")))
+ENDPOINT_RATE_LIMITS.update(_parse_limits(os.getenv("TUSHARE_RATE_LIMITS", "")))
+
+_priority: ContextVar[int] = ContextVar("tushare_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """在 with 块内发起的 Tushare 调用使用指定优先级排队。"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+# Tushare 在超出频次时返回的提示，如“抱歉，您每分钟最多访问该接口200次”
+_QUOTA_MARKERS = ("每分钟最多访问", "每小时最多访问", "访问过于频繁", "too many requests")
+# 网络抖动或服务端临时故障
+_TRANSIENT_MARKERS = (
+    "timed out", "timeout", "connection aborted", "connection reset", "connection refused",
+    "max retries", "bad gateway", "service unavailable", "服务器繁忙", "系统繁忙",
+)
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """把异常归类为 "quota"、"transient"（均可重试）或 None（不重试，如权限不足、参数错误）。"""
+    message = str(error).lower()
+    if any(m in message for m in _QUOTA_MARKERS):
+        return "quota"
+    if isinstance(error, (ConnectionError, TimeoutError)) or any(m in message for m in _TRANSIENT_MARKERS):
+        return "transient"
+    return None
+
+
+class EndpointScheduler:
+    """单个接口的调度器：令牌桶限速 + 并发上限 + 按优先级排队。
+
+    令牌按每分钟配额匀速补充，桶容量为 10 秒的配额（至少 1 个），
+    空闲后可以小幅突发，持续负载下则平滑地用满配额。
+    """
+
+    def __init__(self, name: str, rate_per_minute: int, concurrency: int) -> None:
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * 10)
+        self.concurrency = concurrency
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        # 统计信息
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, level: int) -> float:
+        """排队直到轮到自己且有令牌和并发名额，返回等待秒数。"""
+        start = time.monotonic()
+        with self._cond:
+            ticket = (level, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == ticket and self._in_flight < self.concurrency:
+                        if self._tokens >= 1.0:
+                            break
+                        self._cond.wait((1.0 - self._tokens) / self.rate)
+                    else:
+                        self._cond.wait()
+                heapq.heappop(self._waiters)
+                self._tokens -= 1.0
+                self._in_flight += 1
+            except BaseException:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                raise
+            finally:
+                self._cond.notify_all()
+            waited = time.monotonic() - start
+            self.calls += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            return waited
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record_error(self, kind: Optional[str]) -> None:
+        with self._cond:
+            self.errors += 1
+            if kind == "quota":
+                self.quota_errors += 1
+
+    def record_retry(self) -> None:
+        with self._cond:
+            self.retries += 1
+
+    def penalize(self) -> None:
+        """收到配额错误：清空令牌桶，让排队中的其他调用也一起放缓。"""
+        with self._cond:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "queue_depth": len(self._waiters),
+                "in_flight": self._in_flight,
+                "tokens": round(self._tokens, 2),
+                "rate_per_minute": round(self.rate * 60),
+                "concurrency": self.concurrency,
+                "calls": self.calls,
+                "retries": self.retries,
+                "errors": self.errors,
+                "quota_errors": self.quota_errors,
+                "avg_wait": round(self.total_wait / self.calls, 3) if self.calls else 0.0,
+                "max_wait": round(self.max_wait, 3),
+            }
+
+
+_schedulers: Dict[str, EndpointScheduler] = {}
+_schedulers_guard = threading.Lock()
+
+
+def endpoint_scheduler(api_name: str) -> EndpointScheduler:
+    """返回某个接口的调度器（进程内所有客户端共享）。"""
+    with _schedulers_guard:
+        scheduler = _schedulers.get(api_name)
+        if scheduler is None:
+            scheduler = EndpointScheduler(
+                api_name,
+                ENDPOINT_RATE_LIMITS.get(api_name, DEFAULT_RATE_LIMIT),
+                ENDPOINT_CONCURRENCY.get(api_name, DEFAULT_CONCURRENCY),
+            )
+            _schedulers[api_name] = scheduler
+        return scheduler
+
+
+def scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    """所有已调用过的接口的排队与限速统计。"""
+    with _schedulers_guard:
+        schedulers = sorted(_schedulers.items())
+    return {name: s.snapshot() for name, s in schedulers}
+
+
+def _backoff(attempt: int, kind: str) -> float:
+    # 配额错误需要等到下一个计费窗口，起步更长；加入抖动避免多个调用同时重试
+    base = BACKOFF_BASE * (5 if kind == "quota" else 1)
+    return min(BACKOFF_MAX, base * 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+def call_with_retry(api_name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """经由接口调度器执行一次 Tushare 调用，配额或网络错误时指数退避重试。"""
+    scheduler = endpoint_scheduler(api_name)
+    level = _priority.get()
+    attempt = 0
+    while True:
+        scheduler.acquire(level)
+        try:
+            stats.record_upstream()
+            return func(*args, **kwargs)
+        except Exception as e:
+            kind = classify_error(e)
+            scheduler.record_error(kind)
+            if kind is None or attempt >= MAX_RETRIES:
+                raise
+            if kind == "quota":
+                scheduler.penalize()
+        finally:
+            scheduler.release()
+        scheduler.record_retry()
+        time.sleep(_backoff(attempt, kind))
+        attempt += 1
+
+
+def select_fields(df: Any, fields: Any) -> Any:
+    """按 fields（逗号分隔字符串或列表）在本地裁剪列，兼容不支持 fields 下推的接口。"""
+    if not fields or not hasattr(df, "columns"):
+        return df
+    names = fields.split(",") if isinstance(fields, str) else list(fields)
+    names = [n.strip() for n in names if n.strip()]
+    if not names or list(df.columns) == names:
+        return df
+    return df[[n for n in dict.fromkeys(names) if n in df.columns]]
+
+
+def fetch_pages(api_name: str, func: Callable[..., Any], row_limit: int, **kwargs: Any) -> Any:
+    """按 offset 分页拉取行数受限接口的完整结果。
+
+    先请求第一页；若触及上限，再按该接口的并发上限成批并发请求后续页，
+    直到某一页不满为止，按页序合并返回。各页仍经由接口调度器排队限速。
+    """
+
+    def page(offset: int) -> Any:
+        return call_with_retry(api_name, func, offset=offset, limit=row_limit, **kwargs)
+
+    first = page(0)
+    if first is None or len(first) < row_limit:
+        return first
+
+    pages = [first]
+    wave = endpoint_scheduler(api_name).concurrency
+    with ThreadPoolExecutor(max_workers=wave) as pool:
+        index = 1
+        while index < MAX_PAGES:
+            # 每个任务复制一份上下文，保留调用方设置的优先级
+            futures = [
+                pool.submit(contextvars.copy_context().run, page, row_limit * (index + i))
+                for i in range(min(wave, MAX_PAGES - index))
+            ]
+            results = [f.result() for f in futures]
+            if index == 1 and results[0] is not None and results[0].head(1).equals(first.head(1)):
+                # 接口不支持 offset：返回的仍是第一页，只保留第一页
+                return first
+            done = False
+            for df in results:
+                if df is None or df.empty:
+                    done = True
+                    break
+                pages.append(df)
+                if len(df) < row_limit:
+                    done = True
+                    break
+            if done:
+                break
+            index += len(results)
+    import pandas as pd
+
+    return pd.concat(pages, ignore_index=True)
+
+
+# 底层 HTTP 客户端：tushare（默认，ts.pro_api()，每次调用新建连接）或
+# httpx（http_client.SyncDataApi，异步 keep-alive 连接池），通过环境变量 TUSHARE_HTTP_CLIENT 选择
+HTTP_CLIENT = os.getenv("TUSHARE_HTTP_CLIENT", "tushare").strip().lower()
+
+
+def create_pro_api() -> Any:
+    """读取 Tushare token 并创建 pro 接口对象（ts.pro_api() 或 http_client.SyncDataApi）。
+
+    tushare 的导入和 token 校验都推迟到第一次调用接口时，服务器启动时不做网络相关的初始化。
+    设置了 TUSHARE_REPLAY_MODE 时，录制模式在 pro 对象外包一层 replay.RecordingApi，
+    回放模式直接返回 replay.ReplayApi（不需要 token）。
+    """
+    from tushare_mcp_server import replay
+
+    if replay.REPLAY_MODE and replay.REPLAY_MODE not in replay.REPLAY_MODES:
+        raise RuntimeError(
+            f"不支持的 TUSHARE_REPLAY_MODE: {replay.REPLAY_MODE}，可选: {', '.join(replay.REPLAY_MODES)}"
+        )
+    if replay.REPLAY_MODE == "replay":
+        return replay.ReplayApi(replay.ResponseArchive())
+    api = _create_upstream_api()
+    if replay.REPLAY_MODE == "record":
+        return replay.RecordingApi(api, replay.ResponseArchive())
+    return api
+
+
+def _create_upstream_api() -> Any:
+    from dotenv import load_dotenv
+
+    # Load Tushare token: prefer env var, fallback to .env
+    token = os.getenv("TUSHARE_TOKEN")
+    if not token:
+        load_dotenv()
+        token = os.getenv("TUSHARE_TOKEN")
+    if not token:
+        raise RuntimeError("Missing TUSHARE_TOKEN. Set env or .env before running.")
+
+    if HTTP_CLIENT == "httpx":
+        from tushare_mcp_server.http_client import AsyncDataApi, SyncDataApi
+
+        return SyncDataApi(AsyncDataApi(token))
+    if HTTP_CLIENT != "tushare":
+        raise RuntimeError(f"不支持的 TUSHARE_HTTP_CLIENT: {HTTP_CLIENT}，可选: tushare, httpx")
+
+    import tushare as ts
+
+    ts.set_token(token)
+    return ts.pro_api()
+
+
+class TushareClient:
+    """ts.pro_api() 的薄封装：``client.<接口>(...)`` 调用经由该接口的调度器排队。
+
+    用法与 pro 对象完全相同，例如 ``client.daily_basic(trade_date="20240115")``。
+    每个接口按每分钟配额限速、限制并发，配额或网络错误时自动退避重试；
+    有单次行数上限的接口（ROW_LIMITS）在调用方未指定 limit/offset 时自动分页；
+    传入 fields 时下推给 Tushare，并在本地按 fields 裁剪返回的列。
+    结果经由进程内缓存（cache.FrameCache）：有效期内相同参数、或被已缓存的较宽日期区间包含的查询不再请求。
+
+    - pro: 已创建的 pro 对象；不传时在第一次调用接口时由 factory 创建
+    - factory: 创建 pro 对象的函数，默认 create_pro_api
+    - cache: 结果缓存，默认新建一个 FrameCache（容量与有效期见 cache.py）
+    """
+
+    def __init__(
+        self,
+        pro: Any = None,
+        factory: Callable[[], Any] = create_pro_api,
+        cache: Optional[FrameCache] = None,
+    ) -> None:
+        self._pro = pro
+        self._factory = factory
+        self._pro_lock = threading.Lock()
+        self.cache = FrameCache() if cache is None else cache
+
+    @property
+    def api(self) -> Any:
+        """底层的 pro 对象（首次访问时创建）。"""
+        if self._pro is None:
+            with self._pro_lock:
+                if self._pro is None:
+                    self._pro = self._factory()
+        return self._pro
+
+    priority = staticmethod(priority)
+
+    def _call(self, api_name: str, func: Callable[..., Any], **kwargs: Any) -> Any:
+        if not self.cache.enabled(api_name, kwargs):
+            return self._fetch(api_name, func, **kwargs)
+        return self.cache.fetch(api_name, kwargs, functools.partial(self._fetch, api_name, func, **kwargs))
+
+    def _fetch(self, api_name: str, func: Callable[..., Any], **kwargs: Any) -> Any:
+        row_limit = ROW_LIMITS.get(api_name)
+        start = time.perf_counter()
+        df = None
+        try:
+            with stats.fetching():
+                if row_limit and "limit" not in kwargs and "offset" not in kwargs:
+                    df = fetch_pages(api_name, func, row_limit, **kwargs)
+                else:
+                    df = call_with_retry(api_name, func, **kwargs)
+        finally:
+            rows = len(df) if df is not None and hasattr(df, "columns") else 0
+            stats.record_endpoint(api_name, time.perf_counter() - start, rows, error=df is None)
+        return select_fields(df, kwargs.get("fields"))
+
+    def query(self, api_name: str, fields: str = "", **kwargs: Any) -> Any:
+        return self._call(api_name, functools.partial(self.api.query, api_name), fields=fields, **kwargs)
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        # 延迟到真正调用时才解析底层接口，构造 FactorStore(fetch=client.stk_factor_pro) 等不会触发初始化
+        def call(**kwargs: Any) -> Any:
+            return self._call(name, getattr(self.api, name), **kwargs)
+
+        call.__name__ = name
+        return call
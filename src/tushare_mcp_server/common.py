@@ -0,0 +1,31 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+
+# Tushare 数据以北京时间发布，判断“今天”、发布时间时统一使用 UTC+8
+CN_TZ = timezone(timedelta(hours=8))
+
+
+def cn_today() -> str:
+    """北京时间的今天（YYYYMMDD）。"""
+    return datetime.now(CN_TZ).strftime("%Y%m%d")
+
+
+def atomic_write(path: str, write: Callable[[str], None]) -> None:
+    """先由 write(临时文件路径) 写入同目录下的临时文件，再原子替换为 path。
+
+    多个服务器进程同时读写本地存储与缓存时不会读到半个文件；写入失败时删除临时文件，path 保持原样。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
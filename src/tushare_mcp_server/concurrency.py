@@ -0,0 +1,155 @@
+import os
+import functools
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from tushare_mcp_server.stats import track_tool
+
+
+T = TypeVar("T")
+
+# 同时执行的工具调用上限：可通过环境变量 TUSHARE_MAX_WORKERS 覆盖
+MAX_WORKERS = int(os.getenv("TUSHARE_MAX_WORKERS", "8"))
+
+# 单个客户端（MCP 会话）同时执行的工具调用上限：可通过环境变量 TUSHARE_CLIENT_MAX_WORKERS 覆盖，
+# 默认不单独限制（不超过 MAX_WORKERS）
+CLIENT_MAX_WORKERS = int(os.getenv("TUSHARE_CLIENT_MAX_WORKERS", "0")) or MAX_WORKERS
+
+
+class FairLimiter:
+    """按客户端公平分配工作线程的并发上限。
+
+    空闲时直接执行；满载时排队的调用按客户端轮转放行：每空出一个名额，优先给当前执行数最少的客户端
+    （相同时给最早排队的客户端），同一客户端内按先后顺序。一个客户端一次提交几十个调用（如批量取数）
+    不会让其他客户端的单个调用排在它们之后；只有一个客户端时与普通的并发上限相同。
+
+    - total: 总并发上限
+    - per_client: 单个客户端的并发上限
+    """
+
+    def __init__(self, total: int, per_client: Optional[int] = None) -> None:
+        self.total = max(1, total)
+        self.per_client = max(1, min(per_client or self.total, self.total))
+        self.running = 0
+        self._active: Dict[Hashable, int] = {}
+        # 按开始排队的先后保存各客户端的等待队列
+        self._waiting: Dict[Hashable, Deque[anyio.Event]] = {}
+
+    def _eligible(self, client: Hashable) -> bool:
+        return self._active.get(client, 0) < self.per_client
+
+    def _grant(self, client: Hashable) -> None:
+        self.running += 1
+        self._active[client] = self._active.get(client, 0) + 1
+
+    def _dispatch(self) -> None:
+        while self.running < self.total:
+            candidates = [c for c in self._waiting if self._eligible(c)]
+            if not candidates:
+                return
+            # min 在相同执行数时返回最先出现（最早排队）的客户端
+            client = min(candidates, key=lambda c: self._active.get(c, 0))
+            queue = self._waiting[client]
+            event = queue.popleft()
+            if not queue:
+                del self._waiting[client]
+            self._grant(client)
+            event.set()
+
+    async def acquire(self, client: Hashable) -> None:
+        if self.running < self.total and not self._waiting and self._eligible(client):
+            self._grant(client)
+            return
+        event = anyio.Event()
+        self._waiting.setdefault(client, deque()).append(event)
+        # 排队的都是已达单客户端上限的客户端时仍有空闲名额，立即按轮转规则放行
+        self._dispatch()
+        try:
+            await event.wait()
+        except BaseException:
+            # 取消时：尚未放行则移出队列，已放行则归还名额
+            queue = self._waiting.get(client)
+            if queue is not None and event in queue:
+                queue.remove(event)
+                if not queue:
+                    del self._waiting[client]
+            else:
+                self.release(client)
+            raise
+
+    def release(self, client: Hashable) -> None:
+        self.running -= 1
+        active = self._active.get(client, 0) - 1
+        if active > 0:
+            self._active[client] = active
+        else:
+            self._active.pop(client, None)
+        self._dispatch()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """执行中与排队中的调用数，以及有调用在执行或排队的客户端数。"""
+        return {
+            "max_workers": self.total,
+            "client_max_workers": self.per_client,
+            "running": self.running,
+            "waiting": sum(len(q) for q in self._waiting.values()),
+            "clients": len(set(self._active) | set(self._waiting)),
+        }
+
+
+_limiter: Optional[FairLimiter] = None
+_threads: Optional[anyio.CapacityLimiter] = None
+
+
+def _worker_limiter() -> FairLimiter:
+    # 在事件循环内首次使用时创建，所有客户端、所有工具共享同一个上限
+    global _limiter, _threads
+    if _limiter is None:
+        _limiter = FairLimiter(MAX_WORKERS, CLIENT_MAX_WORKERS)
+        _threads = anyio.CapacityLimiter(MAX_WORKERS)
+    return _limiter
+
+
+def _client_key() -> Hashable:
+    """当前请求所属的客户端：MCP 会话对象（stdio 下只有一个，HTTP/SSE 下每个连接一个）。"""
+    from mcp.server.lowlevel.server import request_ctx
+
+    ctx = request_ctx.get(None)
+    return ctx.session if ctx is not None else None
+
+
+def worker_stats() -> Dict[str, Any]:
+    """工作线程的并发上限、执行中与排队中的调用数。"""
+    if _limiter is None:
+        return FairLimiter(MAX_WORKERS, CLIENT_MAX_WORKERS).snapshot()
+    return _limiter.snapshot()
+
+
+def run_in_worker(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """把同步工具函数包装为异步函数，放到有界工作线程池中执行。
+
+    FastMCP 会在事件循环里直接调用同步工具，一次阻塞的 Tushare 请求会卡住
+    其他所有请求；包装后各工具调用互不阻塞。functools.wraps 保留原函数的
+    签名和文档，FastMCP 据此生成工具参数说明。每次调用的耗时、上游请求数
+    等度量由 stats.track_tool 记录。
+
+    多个客户端共用一个服务器进程（HTTP/SSE 传输）时，满载后按客户端轮转放行（见 FairLimiter）。
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        limiter = _worker_limiter()
+        client = _client_key()
+        await limiter.acquire(client)
+        try:
+            return await anyio.to_thread.run_sync(
+                functools.partial(track_tool, fn.__name__, fn, *args, **kwargs),
+                limiter=_threads,
+            )
+        finally:
+            limiter.release(client)
+
+    return wrapper
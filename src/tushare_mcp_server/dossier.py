@@ -0,0 +1,180 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+
+# 财务报表、股东人数保留的最近报告期数
+DOSSIER_PERIODS = 4
+
+# 资金流向、筹码分布保留的交易日数（含目标日）
+DOSSIER_DAYS = 5
+
+# 各部分读取的字段：只拉取个股分析用得到的列
+BASIC_FIELDS = ["ts_code", "name", "area", "industry", "market", "list_date", "act_name"]
+DAILY_BASIC_FIELDS = [
+    "ts_code", "trade_date", "close", "turnover_rate", "turnover_rate_f", "volume_ratio",
+    "pe_ttm", "pb", "ps_ttm", "dv_ttm", "total_share", "float_share", "total_mv", "circ_mv",
+]
+FINA_INDICATOR_FIELDS = [
+    "ts_code", "ann_date", "end_date", "eps", "dt_eps", "bps", "ocfps", "profit_dedt",
+    "grossprofit_margin", "netprofit_margin", "roe", "roe_dt", "roa", "roic",
+    "debt_to_assets", "current_ratio", "quick_ratio", "ocf_to_or",
+]
+INCOME_FIELDS = [
+    "ts_code", "ann_date", "end_date", "basic_eps", "total_revenue", "revenue", "oper_cost",
+    "sell_exp", "admin_exp", "fin_exp", "oper_profit", "total_profit", "n_income_attr_p",
+]
+BALANCESHEET_FIELDS = [
+    "ts_code", "ann_date", "end_date", "money_cap", "accounts_receiv", "inventories",
+    "total_cur_assets", "goodwill", "total_assets", "st_borr", "lt_borr", "total_cur_liab",
+    "total_liab", "total_hldr_eqy_exc_min_int",
+]
+CASHFLOW_FIELDS = [
+    "ts_code", "ann_date", "end_date", "net_profit", "n_cashflow_act", "c_pay_acq_const_fiolta",
+    "n_cashflow_inv_act", "n_cash_flows_fnc_act", "free_cashflow",
+]
+MONEYFLOW_FIELDS = [
+    "ts_code", "trade_date", "buy_lg_amount", "sell_lg_amount", "buy_elg_amount",
+    "sell_elg_amount", "net_mf_amount",
+]
+CYQ_FIELDS = [
+    "ts_code", "trade_date", "his_low", "his_high", "cost_5pct", "cost_50pct", "cost_95pct",
+    "weight_avg", "winner_rate",
+]
+HOLDER_NUMBER_FIELDS = ["ts_code", "ann_date", "end_date", "holder_num"]
+TOP10_FIELDS = ["ts_code", "ann_date", "end_date", "name", "hold_amount", "hold_ratio"]
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """DataFrame 转为记录列表，缺失值为 None；ts_code 已在卷宗顶层给出，不再逐行重复。"""
+    df = df.drop(columns="ts_code", errors="ignore")
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _announced(df: pd.DataFrame, trade_date: str) -> pd.DataFrame:
+    """只保留 trade_date 当日及之前已公告的行，避免历史日期的卷宗用到之后才公布的数据。"""
+    if df.empty or "ann_date" not in df.columns:
+        return df
+    return df[df["ann_date"].astype(str) <= trade_date]
+
+
+def _latest_periods(df: pd.DataFrame, trade_date: str, n: int = DOSSIER_PERIODS) -> List[Dict[str, Any]]:
+    """已公告的最近 n 个报告期（按报告期降序），同一报告期多次公告（更正）时取最后一次。"""
+    df = _announced(df, trade_date)
+    if df.empty:
+        return []
+    df = df.sort_values(["end_date", "ann_date"], kind="stable").drop_duplicates("end_date", keep="last")
+    return _records(df.iloc[::-1].head(n))
+
+
+def _latest_holders(df: pd.DataFrame, trade_date: str) -> List[Dict[str, Any]]:
+    """已公告的最近一期前十大流通股东，按持股数量降序。"""
+    df = _announced(df, trade_date)
+    if df.empty:
+        return []
+    df = df[df["end_date"] == df["end_date"].max()]
+    # 同一期多次公告时保留最后一次公告的名单
+    df = df[df["ann_date"] == df["ann_date"].max()]
+    return _records(df.sort_values("hold_amount", ascending=False, kind="stable"))
+
+
+def _recent_days(df: pd.DataFrame, start_date: str, trade_date: str) -> List[Dict[str, Any]]:
+    """[start_date, trade_date] 期间的逐日数据，按交易日降序。"""
+    if df.empty:
+        return []
+    dates = df["trade_date"].astype(str)
+    df = df[(dates >= start_date) & (dates <= trade_date)]
+    return _records(df.sort_values("trade_date", ascending=False, kind="stable"))
+
+
+def _single_row(df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    if df.empty:
+        return None
+    return _records(df.head(1))[0]
+
+
+def _columns(fields: List[str]) -> str:
+    return ",".join(fields)
+
+
+def dossier_sections(
+    client: Any,
+    ts_code: str,
+    trade_date: str,
+    window_start: str,
+) -> Dict[str, Callable[[], Any]]:
+    """个股卷宗的各部分：名称 -> 无参取数函数（一次接口调用，并把结果裁剪到相关窗口与字段）。
+
+    - stock_basic、daily_basic: 基础信息与 trade_date 当日的估值、市值
+    - fina_indicator、income、balancesheet、cashflow: 近两年公告、trade_date 前已公告的最近 DOSSIER_PERIODS 个报告期
+    - moneyflow、cyq_perf: [window_start, trade_date] 的逐日数据
+    - stk_holdernumber: 最近 DOSSIER_PERIODS 期股东人数；top10_floatholders: 最近一期前十大流通股东
+    """
+    since = f"{int(trade_date[:4]) - 2}0101"
+    year_ago = f"{int(trade_date[:4]) - 1}{trade_date[4:]}"
+
+    def stock_basic() -> Any:
+        df = client.stock_basic(ts_code=ts_code, fields=_columns(BASIC_FIELDS))
+        return _single_row(df[df["ts_code"] == ts_code] if not df.empty else df)
+
+    def daily_basic() -> Any:
+        return _single_row(
+            client.daily_basic(ts_code=ts_code, trade_date=trade_date, fields=_columns(DAILY_BASIC_FIELDS))
+        )
+
+    def statement(api: str, fields: List[str]) -> Callable[[], Any]:
+        def fetch() -> Any:
+            df = getattr(client, api)(
+                ts_code=ts_code, start_date=since, end_date=trade_date, fields=_columns(fields)
+            )
+            return _latest_periods(df, trade_date)
+        return fetch
+
+    def daily(api: str, fields: List[str]) -> Callable[[], Any]:
+        def fetch() -> Any:
+            df = getattr(client, api)(
+                ts_code=ts_code, start_date=window_start, end_date=trade_date, fields=_columns(fields)
+            )
+            return _recent_days(df, window_start, trade_date)
+        return fetch
+
+    def top10_floatholders() -> Any:
+        df = client.top10_floatholders(
+            ts_code=ts_code, start_date=year_ago, end_date=trade_date, fields=_columns(TOP10_FIELDS)
+        )
+        return _latest_holders(df, trade_date)
+
+    return {
+        "stock_basic": stock_basic,
+        "daily_basic": daily_basic,
+        "fina_indicator": statement("fina_indicator", FINA_INDICATOR_FIELDS),
+        "income": statement("income", INCOME_FIELDS),
+        "balancesheet": statement("balancesheet", BALANCESHEET_FIELDS),
+        "cashflow": statement("cashflow", CASHFLOW_FIELDS),
+        "moneyflow": daily("moneyflow", MONEYFLOW_FIELDS),
+        "cyq_perf": daily("cyq_perf", CYQ_FIELDS),
+        "stk_holdernumber": statement("stk_holdernumber", HOLDER_NUMBER_FIELDS),
+        "top10_floatholders": top10_floatholders,
+    }
+
+
+def gather(sections: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """并发执行各部分的取数函数，按 sections 的顺序返回结果；某一部分出错时该部分为 {"error": ...}，不影响其他部分。
+
+    每个部分各占一个线程，总耗时接近最慢的一次接口调用；各接口仍经由各自的调度器排队限速。
+    """
+    def run(fetch: Callable[[], Any]) -> Any:
+        try:
+            return fetch()
+        except Exception as e:
+            return {"error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, len(sections))) as pool:
+        # 每个任务复制一份上下文，保留调用方的优先级与工具调用度量
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, run, fetch)
+            for name, fetch in sections.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
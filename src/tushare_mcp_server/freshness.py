@@ -0,0 +1,116 @@
+import math
+import time
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from tushare_mcp_server.common import CN_TZ
+from tushare_mcp_server.trade_calendar import TradingCalendar
+
+
+# 按交易日发布的接口当日数据完整发布的时间（北京时间 HH:MM，见 docs/interface.md 各接口的更新说明，取偏晚的时间）
+PUBLISH_TIMES = {
+    "daily_basic": "17:00",  # 每日15点～17点更新
+    "stk_factor_pro": "17:00",
+    "stk_auction_o": "17:00",
+    "cyq_perf": "18:00",  # 每天17~18点左右更新
+    "ths_daily": "18:00",
+    "index_dailybasic": "18:00",
+    "idx_factor_pro": "18:00",
+    "moneyflow": "19:00",
+    "moneyflow_cnt_ths": "19:00",
+    "moneyflow_ind_ths": "19:00",
+    "moneyflow_mkt_dc": "19:00",
+    "moneyflow_hsgt": "20:00",  # 每天18~20点之间完成当日更新
+}
+
+# 未列出的按交易日发布的接口
+DEFAULT_PUBLISH_TIME = "18:00"
+
+# 按公告日（ann_date）筛选、公告后不再修改的接口：公告日都已过去的区间不再变化
+ANNOUNCEMENT_APIS = ("stk_holdernumber", "top10_floatholders")
+
+# 财务报表：只按有效期过期。fina_indicator、income 的 start_date/end_date 是报告期，已过去的报告期
+# 仍会陆续公告；各报表的更正（update_flag）沿用原公告日，已过去的公告区间也会变化
+STATEMENT_APIS = ("fina_indicator", "income", "balancesheet", "cashflow")
+
+# 不按日期发布的参考数据（交易日历、股票列表、行业分类与成分）：只按有效期过期
+REFERENCE_APIS = ("trade_cal", "stock_basic", "index_classify", "index_member_all")
+
+# 不是每个交易日都有行的接口（周线、月线、月度权重）：不按“当日行缺失”判断发布延迟
+PERIODIC_APIS = ("index_weekly", "index_monthly", "index_weight")
+
+
+def publish_at(api: str, day: str) -> float:
+    """day 当日 api 数据的发布时间（时间戳）。"""
+    hour, minute = PUBLISH_TIMES.get(api, DEFAULT_PUBLISH_TIME).split(":")
+    moment = datetime.strptime(day, "%Y%m%d").replace(
+        hour=int(hour), minute=int(minute), tzinfo=CN_TZ
+    )
+    return moment.timestamp()
+
+
+def published(api: str, day: str, now: Optional[float] = None) -> bool:
+    """day 当日的 api 数据是否已过发布时间（之后不再变化，可以落盘长期保存）。"""
+    return (time.time() if now is None else now) >= publish_at(api, day)
+
+
+class FreshnessPolicy:
+    """按交易日历与各接口的发布时间决定缓存结果何时过期。
+
+    - 按交易日发布的接口：区间内的交易日都已发布（收盘且过了该接口的发布时间）的结果不再变化，一直缓存；
+      区间包含尚未发布的交易日（或未指定结束日期）时，缓存到下一个交易日的发布时间，届时新数据才会出现。
+      最近一个已发布交易日的行缺失（上游发布延迟）时改为按有效期重新检查
+    - 按公告日发布的股东数据：结束日期早于最后一个已发布交易日的公告区间不再变化，一直缓存；其余按有效期
+    - 财务报表（按报告期筛选，或有沿用原公告日的更正）与参考数据（交易日历、股票列表、行业分类与成分）：按有效期
+
+    交易日历不可用时退回有效期。
+
+    - calendar: 交易日历
+    """
+
+    def __init__(self, calendar: TradingCalendar) -> None:
+        self.calendar = calendar
+
+    def settled(self, api: str, now: float) -> Tuple[str, str]:
+        """返回 (最后一个已发布的交易日, 下一个待发布的交易日)。"""
+        today = datetime.fromtimestamp(now, CN_TZ).strftime("%Y%m%d")
+        latest = self.calendar.latest(today)
+        if latest == today and now < publish_at(api, today):
+            return self.calendar.shift(today, -1), today
+        return latest, self.calendar.shift(latest, 1)
+
+    def expires(
+        self,
+        api: str,
+        span: Optional[Tuple[str, str]],
+        frame: Any,
+        now: float,
+        ttl: float,
+    ) -> float:
+        """api 在 span（[开始, 结束]，未指定区间时为 None）上的结果 frame 的过期时间戳，不再变化时为 inf。
+
+        ttl 为该接口的有效期（秒），规则不适用时按 now + ttl 过期。
+        """
+        fallback = now + ttl
+        if api in REFERENCE_APIS or api in STATEMENT_APIS:
+            return fallback
+        end = span[1] if span is not None else None
+
+        try:
+            settled, pending = self.settled(api, now)
+        except Exception:
+            return fallback
+        if api in ANNOUNCEMENT_APIS:
+            return math.inf if end is not None and end < settled else fallback
+        # 最近一个已发布交易日在区间内、结果中却没有这一天的行：上游发布延迟，按有效期重新检查
+        late = (
+            api not in PERIODIC_APIS
+            and (span is None or span[0] <= settled <= span[1])
+            and hasattr(frame, "columns")
+            and "trade_date" in frame.columns
+            and not (frame["trade_date"].astype(str) == settled).any()
+        )
+        if end is not None and end < pending:
+            return fallback if late else math.inf
+        next_publish = publish_at(api, pending)
+        return min(fallback, next_publish) if late else next_publish
@@ -0,0 +1,178 @@
+import os
+import json
+import asyncio
+import logging
+import functools
+import threading
+from typing import TYPE_CHECKING, Any, Coroutine, Dict, Optional, TypeVar, cast
+
+import httpx
+
+if TYPE_CHECKING:  # 只用于类型标注
+    import pandas as pd
+
+try:  # 可选依赖：安装 orjson 后响应解码更快
+    import orjson
+except ImportError:  # pragma: no cover - 未安装时回退到标准库
+    orjson = None
+
+
+# Tushare HTTP 接口地址：可通过环境变量 TUSHARE_API_URL 覆盖（如指向本地模拟服务）
+DEFAULT_API_URL = "http://api.waditu.com/dataapi"
+
+# 连接池中保持的最大连接数（即同时在途的最大请求数），超出的请求排队复用已有连接。
+# httpcore 连接池的调度开销随连接数平方增长，连接数超过十几个后反而变慢，不宜设得过大
+HTTP_MAX_CONNECTIONS = int(os.getenv("TUSHARE_HTTP_MAX_CONNECTIONS", "10"))
+
+# 单次请求的超时时间（秒），与 tushare 默认值一致
+HTTP_TIMEOUT = float(os.getenv("TUSHARE_HTTP_TIMEOUT", "30"))
+
+T = TypeVar("T")
+
+# httpx 默认按 INFO 级别记录每个请求，服务器日志中只保留警告与错误
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def _decode(content: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class AsyncDataApi:
+    """Tushare HTTP 接口的异步客户端，与 ``ts.pro_api()`` 的请求、响应格式一致。
+
+    所有请求共用一个 keep-alive 连接池（httpx.AsyncClient），不再为每次调用新建 TCP 连接；
+    在途请求数由信号量限制为 max_connections，多余的请求在信号量上排队等待空闲连接。
+    响应按 ``{"fields": [...], "items": [[...], ...]}`` 直接解码为 DataFrame。
+
+    - token: Tushare token
+    - url: 接口地址，默认 TUSHARE_API_URL 或 DEFAULT_API_URL
+    - max_connections: 连接池大小，默认 HTTP_MAX_CONNECTIONS
+    - timeout: 单次请求超时（秒），默认 HTTP_TIMEOUT
+    - transport: httpx 传输层，默认建立真实连接；测试时可传入 ``httpx.MockTransport`` 模拟接口
+
+    用法：``await api.daily_basic(trade_date="20240115")`` 或 ``await api.query("daily_basic", ...)``。
+    连接池在第一次请求时于当前事件循环中创建，之后只能在同一个事件循环中使用。
+    """
+
+    def __init__(
+        self,
+        token: str,
+        url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        timeout: Optional[float] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self._token = token
+        self.url = (url or os.getenv("TUSHARE_API_URL") or DEFAULT_API_URL).rstrip("/")
+        self.max_connections = max(1, max_connections or HTTP_MAX_CONNECTIONS)
+        self.timeout = HTTP_TIMEOUT if timeout is None else timeout
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(self.timeout, pool=None),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def query(self, api_name: str, fields: str = "", **kwargs: Any) -> "pd.DataFrame":
+        """调用 Tushare 接口 api_name，返回 DataFrame。"""
+        import pandas as pd
+
+        kwargs.setdefault("ts_type_name", self.url)
+        payload: Dict[str, Any] = {
+            "api_name": api_name,
+            "token": self._token,
+            "params": kwargs,
+            "fields": fields,
+        }
+        client = self._http()
+        try:
+            # httpcore 连接池每次分配连接都要遍历全部排队请求，大量请求直接排进池里时开销随队列长度
+            # 平方增长；先在信号量上排队，池中最多只有 max_connections 个请求
+            async with cast(asyncio.Semaphore, self._slots):
+                res = await client.post(f"{self.url}/{api_name}", json=payload)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(f"{api_name} request timed out") from e
+        except httpx.TransportError as e:
+            raise ConnectionError(f"{api_name} connection error: {e!r}") from e
+
+        if res.status_code == 429:
+            raise RuntimeError(f"{api_name}: HTTP 429 too many requests")
+        if res.status_code >= 500:
+            raise ConnectionError(f"{api_name}: HTTP {res.status_code} service unavailable")
+        if res.status_code >= 400:
+            raise RuntimeError(f"{api_name}: HTTP {res.status_code} {res.reason_phrase}")
+
+        result = _decode(res.content)
+        if result["code"] != 0:
+            raise RuntimeError(result["msg"])
+        data = result["data"]
+        return pd.DataFrame(data["items"], columns=data["fields"])
+
+    async def aclose(self) -> None:
+        """关闭连接池。"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._slots = None
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return functools.partial(self.query, name)
+
+
+class SyncDataApi:
+    """AsyncDataApi 的同步外观：在后台线程的事件循环上执行请求，接口与 ``ts.pro_api()`` 相同。
+
+    server.py 的工具在工作线程中同步调用 ``pro.<接口>(...)``，经由本类后所有线程的请求
+    都在同一个事件循环里复用 AsyncDataApi 的连接池，几百个在途调用共享少量连接。
+    """
+
+    def __init__(self, api: AsyncDataApi) -> None:
+        self.api = api
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="tushare-http", daemon=True
+                )
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _run(self, coro: Coroutine[Any, Any, T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coro, self._event_loop()).result()
+
+    def query(self, api_name: str, fields: str = "", **kwargs: Any) -> "pd.DataFrame":
+        """同步调用 Tushare 接口 api_name，返回 DataFrame。"""
+        return self._run(self.api.query(api_name, fields, **kwargs))
+
+    def close(self) -> None:
+        """关闭连接池并停止后台事件循环。"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.api.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return functools.partial(self.query, name)
@@ -0,0 +1,217 @@
+import os
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tushare_mcp_server.common import atomic_write, cn_today
+from tushare_mcp_server.freshness import published
+from tushare_mcp_server.trade_calendar import DEFAULT_CACHE_DIR
+
+
+# 申万行业层级
+INDUSTRY_LEVELS = ("l1", "l2", "l3")
+
+# 参与行业内排名的 daily_basic 指标 -> 是否允许 0（PE 只统计正值，亏损股不参与排名）
+RANK_METRICS = {"pe_ttm": False, "pb": True, "ps_ttm": True, "dv_ttm": True}
+
+# daily_basic 截面读取的字段
+BASIC_FIELDS = ["ts_code", "trade_date", "close", *RANK_METRICS, "total_mv"]
+
+# 申万行业成分读取的字段：in_date/out_date 用于还原历史交易日的行业归属
+MEMBER_FIELDS = [
+    "ts_code", "name", "l1_code", "l1_name", "l2_code", "l2_name", "l3_code", "l3_name",
+    "in_date", "out_date",
+]
+
+# 排名所依据的截面接口：按 freshness.PUBLISH_TIMES 判断某个交易日的数据是否已发布完整
+BASIC_API = "daily_basic"
+
+# 尚未发布完整的交易日，内存中的排名结果默认保留的秒数（与接口结果缓存的默认有效期一致）
+UNSETTLED_TTL = 300
+
+# 内存中保留多少个交易日的排名结果
+RANK_CACHE_DATES = 16
+
+# 写入 Parquet 元数据的键
+_META_KEY = b"tushare_industry"
+
+
+def rank_within(df: pd.DataFrame, group: str, metric: str, allow_zero: bool) -> np.ndarray:
+    """每只股票 metric 在所属 group 内的分位（0-100，同组有效值中不高于它的占比），无效值与未分类股票为 NaN。"""
+    values = pd.to_numeric(df[metric], errors="coerce")
+    values = values.where((values >= 0) if allow_zero else (values > 0))
+    ranks = values.groupby(df[group]).rank(method="max", pct=True)
+    return (ranks * 100).round(1).to_numpy(dtype=float)
+
+
+class IndustryRanks:
+    """行业内估值排名：一次 daily_basic 全市场截面 + 申万行业成分，向量化计算全部股票的行业内分位。
+
+    - fetch_basic: daily_basic 拉取函数，按 ``fetch_basic(trade_date=..., fields=...)`` 调用
+    - fetch_members: index_member_all 拉取函数，按 ``fetch_members(is_new="Y"/"N", fields=...)`` 调用
+    - cache_dir: 缓存目录，默认 TUSHARE_CACHE_DIR 或 ``~/.cache/tushare_mcp_server``
+    - unsettled_ttl: 尚未发布完整的交易日的排名在内存中保留的秒数，默认 UNSETTLED_TTL
+
+    行业成分（含已剔除的历史成分）缓存在 ``<cache_dir>/sw_members.parquet``，每天最多重新拉取一次；
+    按 in_date/out_date 还原每个交易日当天的行业归属，历史排名不受之后调整行业、上市、退市的影响。
+    已发布完整（过了 daily_basic 的发布时间）的交易日，排名结果缓存在
+    ``<cache_dir>/industry_ranks/<trade_date>.parquet``；当天发布前算出的排名可能基于不完整的截面，
+    只在内存中保留 unsettled_ttl 秒。最近 RANK_CACHE_DATES 个交易日同时保留在内存中。
+    """
+
+    def __init__(
+        self,
+        fetch_basic: Callable[..., Any],
+        fetch_members: Callable[..., Any],
+        cache_dir: Optional[str] = None,
+        unsettled_ttl: Optional[float] = None,
+    ) -> None:
+        self.fetch_basic = fetch_basic
+        self.fetch_members = fetch_members
+        self.cache_dir = cache_dir or os.getenv("TUSHARE_CACHE_DIR") or DEFAULT_CACHE_DIR
+        self.unsettled_ttl = UNSETTLED_TTL if unsettled_ttl is None else unsettled_ttl
+        self._members: Optional[pd.DataFrame] = None
+        self._members_on = ""
+        self._members_lock = threading.Lock()
+        # 交易日 -> (排名结果, 过期时间戳)，已发布完整的交易日不过期
+        self._ranks: "OrderedDict[str, Tuple[pd.DataFrame, float]]" = OrderedDict()
+        self._ranks_lock = threading.Lock()
+        self._date_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def _members_path(self) -> str:
+        return os.path.join(self.cache_dir, "sw_members.parquet")
+
+    def _ranks_path(self, trade_date: str) -> str:
+        return os.path.join(self.cache_dir, "industry_ranks", f"{trade_date}.parquet")
+
+    @staticmethod
+    def _write(df: pd.DataFrame, path: str, meta: Dict[str, str]) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            _META_KEY: json.dumps(meta).encode("utf-8"),
+        })
+        atomic_write(path, lambda tmp_path: pq.write_table(table, tmp_path))
+
+    # ------------------------------------------------------------------ 行业成分
+
+    def _history(self) -> pd.DataFrame:
+        """申万行业成分的全部记录（最新与已剔除的历史成分），每天最多重新拉取一次。"""
+        today = cn_today()
+        with self._members_lock:
+            if self._members is None:
+                try:
+                    table = pq.read_table(self._members_path)
+                    meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b"{}"))
+                    # 旧版缓存只有最新成分、没有纳入/剔除日期，重新拉取
+                    if set(MEMBER_FIELDS) <= set(table.column_names):
+                        self._members, self._members_on = table.to_pandas(), meta.get("fetched_on", "")
+                except (FileNotFoundError, pa.ArrowInvalid):
+                    pass
+            if self._members is None or self._members_on < today:
+                fields = ",".join(MEMBER_FIELDS)
+                frames = [self.fetch_members(is_new=is_new, fields=fields) for is_new in ("Y", "N")]
+                frames = [f for f in frames if f is not None and not f.empty]
+                if not frames:
+                    if self._members is None:
+                        raise RuntimeError("未获取到申万行业成分数据")
+                else:
+                    df = pd.concat(frames, ignore_index=True).reindex(columns=MEMBER_FIELDS)
+                    for column in ("in_date", "out_date"):
+                        df[column] = df[column].astype(object).where(df[column].notna(), None)
+                    df = df.drop_duplicates().reset_index(drop=True)
+                    self._write(df, self._members_path, {"fetched_on": today})
+                    self._members, self._members_on = df, today
+            return self._members
+
+    def members(self, trade_date: Optional[str] = None) -> pd.DataFrame:
+        """trade_date 当天（默认今天）的申万行业成分，每只股票一行（ts_code、name 与三级行业代码/名称）。
+
+        纳入日期不晚于 trade_date、剔除日期晚于 trade_date（或尚未剔除）的记录有效；
+        同一天有多条有效记录时取纳入日期最晚的一条。
+        """
+        df = self._history()
+        trade_date = trade_date or cn_today()
+        in_date = df["in_date"].fillna("").astype(str)
+        out_date = df["out_date"].fillna("").astype(str)
+        valid = (in_date <= trade_date) & ((out_date == "") | (out_date > trade_date))
+        df = df[valid].assign(_in=in_date[valid]).sort_values("_in", kind="stable")
+        df = df.drop_duplicates("ts_code", keep="last").drop(columns=["_in", "in_date", "out_date"])
+        return df.reset_index(drop=True)
+
+    # ------------------------------------------------------------------ 排名
+
+    def _date_lock(self, trade_date: str) -> threading.Lock:
+        with self._ranks_lock:
+            return self._date_locks.setdefault(trade_date, threading.Lock())
+
+    def _remember(self, trade_date: str, df: pd.DataFrame, expires: float = math.inf) -> pd.DataFrame:
+        with self._ranks_lock:
+            self._ranks[trade_date] = (df, expires)
+            self._ranks.move_to_end(trade_date)
+            while len(self._ranks) > RANK_CACHE_DATES:
+                self._ranks.popitem(last=False)
+            # 交易日锁随排名结果一起淘汰，正在计算的交易日（锁被持有）保留
+            for date in [d for d, lock in self._date_locks.items() if d not in self._ranks and not lock.locked()]:
+                del self._date_locks[date]
+        return df
+
+    def _compute(self, trade_date: str) -> pd.DataFrame:
+        basic = self.fetch_basic(trade_date=trade_date, fields=",".join(BASIC_FIELDS))
+        if basic is None or basic.empty:
+            raise RuntimeError(f"未获取到 {trade_date} 的 daily_basic 数据")
+        basic = basic.reindex(columns=BASIC_FIELDS).drop_duplicates("ts_code", keep="last")
+        df = basic.merge(self.members(trade_date), on="ts_code", how="left")
+        for level in INDUSTRY_LEVELS:
+            for metric, allow_zero in RANK_METRICS.items():
+                df[f"{metric}_{level}_rank"] = rank_within(df, f"{level}_code", metric, allow_zero)
+            df[f"{level}_size"] = df.groupby(f"{level}_code")["ts_code"].transform("size")
+        return df.sort_values("ts_code", kind="stable").reset_index(drop=True)
+
+    def _cached(self, trade_date: str) -> Optional[pd.DataFrame]:
+        with self._ranks_lock:
+            entry = self._ranks.get(trade_date)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._ranks[trade_date]
+                return None
+            self._ranks.move_to_end(trade_date)
+            return entry[0]
+
+    def ranks(self, trade_date: str) -> pd.DataFrame:
+        """trade_date 全市场的行业内排名：daily_basic 字段、当天的行业成分、各层级的 <指标>_<层级>_rank 与 <层级>_size。"""
+        df = self._cached(trade_date)
+        if df is not None:
+            return df
+        # 同一交易日只计算一次，并发请求等待第一个请求的结果
+        with self._date_lock(trade_date):
+            df = self._cached(trade_date)
+            if df is not None:
+                return df
+            # 发布时间之前拉取的截面可能不完整：不落盘，也不读取之前落盘的结果
+            settled = published(BASIC_API, trade_date)
+            path = self._ranks_path(trade_date)
+            if settled:
+                try:
+                    table = pq.read_table(path)
+                    meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b"{}"))
+                    # 旧版结果按拉取当天的最新成分计算，重新计算
+                    if meta.get("members_on") == trade_date:
+                        return self._remember(trade_date, table.to_pandas())
+                except (FileNotFoundError, pa.ArrowInvalid):
+                    pass
+            df = self._compute(trade_date)
+            if not settled:
+                return self._remember(trade_date, df, time.time() + self.unsettled_ttl)
+            self._write(df, path, {"members_on": trade_date, "members_fetched_on": self._members_on})
+            return self._remember(trade_date, df)
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tushare_mcp_server.common import atomic_write
+
+
+# 录制/回放模式：通过环境变量 TUSHARE_REPLAY_MODE 选择
+# - record: 照常请求 Tushare，并把每次调用的返回结果写入本地归档
+# - replay: 只从归档读取，不访问网络、不需要 token；归档中没有的调用返回错误
+# 不设置时不录制也不回放
+REPLAY_MODE = os.getenv("TUSHARE_REPLAY_MODE", "").strip().lower()
+
+REPLAY_MODES = ("record", "replay")
+
+# 归档目录：可通过环境变量 TUSHARE_REPLAY_DIR 覆盖
+DEFAULT_REPLAY_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "tushare_mcp_server", "replay"
+)
+
+# 回放时按录制耗时的倍数等待，0（默认）表示立即返回，1 表示还原录制时的接口延迟
+REPLAY_DELAY = float(os.getenv("TUSHARE_REPLAY_DELAY", "0"))
+
+# 写入 Parquet 元数据的键
+_META_KEY = b"tushare_replay"
+
+
+def normalize_params(fields: Any = "", **kwargs: Any) -> Dict[str, str]:
+    """把一次调用的参数规范化为字符串字典：去掉 None 和空字符串，fields 去掉多余空格。
+
+    ``pro.daily(ts_code="000001.SZ", fields="a, b")`` 与
+    ``pro.query("daily", fields="a,b", ts_code="000001.SZ", end_date=None)`` 得到同一结果。
+    """
+    if fields and not isinstance(fields, str):
+        fields = ",".join(str(f) for f in fields)
+    params = {k: str(v) for k, v in kwargs.items() if v is not None and v != ""}
+    names = [f.strip() for f in (fields or "").split(",") if f.strip()]
+    if names:
+        params["fields"] = ",".join(names)
+    return dict(sorted(params.items()))
+
+
+def archive_key(api_name: str, params: Dict[str, str]) -> str:
+    """接口名与规范化参数的摘要，作为归档文件名。"""
+    text = json.dumps([api_name, params], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+class ResponseArchive:
+    """Tushare 返回结果的本地归档。
+
+    每次调用保存为 ``<root>/<接口名>/<参数摘要>.parquet``，调用参数与录制耗时写在文件元数据中；
+    ``<root>/index.jsonl`` 按录制顺序逐行记录接口名、参数、行数和耗时，便于查看一次会话调用了哪些接口。
+
+    - root: 归档目录，默认 TUSHARE_REPLAY_DIR 或 ``~/.cache/tushare_mcp_server/replay``
+    """
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.root = root or os.getenv("TUSHARE_REPLAY_DIR") or DEFAULT_REPLAY_DIR
+        self._index_lock = threading.Lock()
+
+    def _path(self, api_name: str, key: str) -> str:
+        return os.path.join(self.root, api_name, f"{key}.parquet")
+
+    def save(self, api_name: str, params: Dict[str, str], df: pd.DataFrame, elapsed: float) -> None:
+        """保存一次调用的结果（相同参数的旧结果被覆盖）。"""
+        key = archive_key(api_name, params)
+        meta = {"api_name": api_name, "params": params, "elapsed": round(elapsed, 6)}
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            _META_KEY: json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+        })
+
+        # 原子替换，并发录制同一调用时不会留下半个文件
+        atomic_write(
+            self._path(api_name, key),
+            lambda tmp_path: pq.write_table(table, tmp_path, compression="zstd"),
+        )
+
+        line = json.dumps(
+            {
+                **meta,
+                "key": key,
+                "rows": len(df),
+                "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            },
+            ensure_ascii=False,
+        )
+        with self._index_lock:
+            with open(os.path.join(self.root, "index.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def load(self, api_name: str, params: Dict[str, str]) -> Optional[Tuple[pd.DataFrame, float]]:
+        """读取一次调用的结果，返回 (DataFrame, 录制耗时)；归档中没有时返回 None。"""
+        path = self._path(api_name, archive_key(api_name, params))
+        try:
+            table = pq.read_table(path)
+        except FileNotFoundError:
+            return None
+        meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b"{}"))
+        return table.to_pandas(), float(meta.get("elapsed", 0.0))
+
+
+class RecordingApi:
+    """包装 pro 对象：照常调用 Tushare，并把每次调用的结果写入归档。
+
+    接口与 ``ts.pro_api()`` 相同。录制发生在 TushareClient 的限速与分页之下，
+    自动分页的每一页分别保存，回放时按相同的 offset/limit 逐页命中。
+    """
+
+    def __init__(self, api: Any, archive: ResponseArchive) -> None:
+        self.api = api
+        self.archive = archive
+
+    def _record(self, api_name: str, func: Callable[..., Any], fields: Any, kwargs: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        df = func(fields=fields, **kwargs)
+        elapsed = time.perf_counter() - start
+        if isinstance(df, pd.DataFrame):
+            self.archive.save(api_name, normalize_params(fields, **kwargs), df, elapsed)
+        return df
+
+    def query(self, api_name: str, fields: str = "", **kwargs: Any) -> Any:
+        return self._record(api_name, lambda **kw: self.api.query(api_name, **kw), fields, kwargs)
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(fields: Any = "", **kwargs: Any) -> Any:
+            return self._record(name, getattr(self.api, name), fields, kwargs)
+
+        return call
+
+
+class ReplayApi:
+    """从归档回放 Tushare 调用的 pro 对象，不访问网络，接口与 ``ts.pro_api()`` 相同。
+
+    - archive: 录制时使用的归档
+    - delay: 按录制耗时的倍数等待后返回，默认 REPLAY_DELAY
+
+    参数与录制时不同（包括依赖当天日期的默认参数）的调用在归档中找不到，抛出 RuntimeError，
+    工具返回错误信息而不是回退到网络。
+    """
+
+    def __init__(self, archive: ResponseArchive, delay: Optional[float] = None) -> None:
+        self.archive = archive
+        self.delay = REPLAY_DELAY if delay is None else delay
+
+    def query(self, api_name: str, fields: str = "", **kwargs: Any) -> pd.DataFrame:
+        params = normalize_params(fields, **kwargs)
+        found = self.archive.load(api_name, params)
+        if found is None:
+            raise RuntimeError(f"回放归档中没有 {api_name} 的记录: {json.dumps(params, ensure_ascii=False)}")
+        df, elapsed = found
+        if self.delay > 0:
+            time.sleep(elapsed * self.delay)
+        return df
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(fields: Any = "", **kwargs: Any) -> pd.DataFrame:
+            return self.query(name, fields, **kwargs)
+
+        return call
@@ -0,0 +1,81 @@
+import os
+import json
+from typing import TYPE_CHECKING, Any, Optional, cast
+
+if TYPE_CHECKING:  # 只用于类型标注，避免服务器启动时导入 pandas
+    import pandas as pd
+
+try:  # 可选依赖：安装 orjson 后结果字典的编码更快
+    import orjson
+except ImportError:  # pragma: no cover - 未安装时回退到标准库
+    orjson = None
+
+from tushare_mcp_server.stats import serializing
+
+
+# 浮点数保留的小数位数：可通过环境变量 TUSHARE_FLOAT_PRECISION 覆盖（默认 10，与 pandas 一致）
+DEFAULT_PRECISION = int(os.getenv("TUSHARE_FLOAT_PRECISION", "10"))
+
+OUTPUT_FORMATS = ("records", "split", "values")
+
+
+def dump_frame(
+    df: "pd.DataFrame",
+    output_format: str = "records",
+    precision: Optional[int] = None,
+) -> str:
+    """把 DataFrame 序列化为 JSON 字符串。
+
+    - records: 对象数组 ``[{"col": v, ...}, ...]``（默认，与原有输出一致）
+    - split: 行式紧凑格式 ``{"columns": [...], "data": [[...], ...]}``，列名只出现一次
+    - values: 列式紧凑格式 ``{"col": [v1, v2, ...], ...}``
+    - precision: 浮点数保留的小数位数（0-15），默认 DEFAULT_PRECISION
+
+    紧凑格式（split/values）会去掉整列为空的字段。
+    """
+    with serializing():
+        return _encode_frame(df, output_format, precision)
+
+
+def _encode_frame(df: "pd.DataFrame", output_format: str, precision: Optional[int]) -> str:
+    digits = DEFAULT_PRECISION if precision is None else max(0, min(int(precision), 15))
+    if output_format == "records":
+        return cast(str, df.to_json(orient="records", force_ascii=False, double_precision=digits))
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}，可选: {', '.join(OUTPUT_FORMATS)}")
+
+    df = df.dropna(axis=1, how="all")
+    header = json.dumps([str(c) for c in df.columns], ensure_ascii=False, separators=(",", ":"))
+    if output_format == "split":
+        # pandas 的 orient="split" 会逐行装箱，按 values 编码再拼接表头要快一倍以上
+        data = df.to_json(orient="values", force_ascii=False, double_precision=digits)
+        return f'{{"columns":{header},"data":{data}}}'
+
+    if orjson is not None:
+        # 数值列先取整到指定精度，再由 orjson 直接编码 numpy 数组（NaN 编码为 null）
+        columns = {}
+        for name in df.columns:
+            values = df[name].to_numpy()
+            if values.dtype.kind == "f":
+                columns[str(name)] = values.round(digits)
+            elif values.dtype.kind in "iub":
+                columns[str(name)] = values
+            else:
+                columns[str(name)] = df[name].astype(object).where(df[name].notna(), None).tolist()
+        return orjson.dumps(columns, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    # 逐列交给 pandas 的 C 编码器，避免转成 Python 对象
+    columns_json = [
+        json.dumps(str(name), ensure_ascii=False)
+        + ":"
+        + cast(str, df[name].to_json(orient="values", force_ascii=False, double_precision=digits))
+        for name in df.columns
+    ]
+    return "{" + ",".join(columns_json) + "}"
+
+
+def dumps(obj: Any) -> str:
+    """紧凑地编码工具返回的结果字典（不缩进），安装了 orjson 时使用 orjson。"""
+    with serializing():
+        if orjson is not None:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
@@ -1,33 +1,24 @@
-import os
 import json
-from typing import Optional, cast
+from typing import Dict, List, Optional, Union
 
-import pandas as pd
-import tushare as ts
-from dotenv import load_dotenv
-from mcp.server.fastmcp import FastMCP
-
-
-# Load Tushare token: prefer env var, fallback to .env
-token = os.getenv("TUSHARE_TOKEN")
-if not token:
-    load_dotenv()
-    token = os.getenv("TUSHARE_TOKEN")
-if not token:
-    raise RuntimeError("Missing TUSHARE_TOKEN. Set env or .env before running.")
-
-ts.set_token(token)
-pro = ts.pro_api()
-
-mcp = FastMCP("Tushare MCP Server")
+# 以脚本方式运行（uv run src/tushare_mcp_server/server.py）时没有包上下文，使用绝对导入
+from tushare_mcp_server import stats
+from tushare_mcp_server.app import mcp, pro, trade_calendar
+from tushare_mcp_server.client import scheduler_stats
+from tushare_mcp_server.concurrency import run_in_worker, worker_stats
+from tushare_mcp_server.serialize import dump_frame
 
 
 @mcp.tool()
+@run_in_worker
 def stk_factor_pro(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取股票技术面因子数据（专业版技术指标）。
 
@@ -35,31 +26,45 @@ def stk_factor_pro(
     - ts_code: 股票代码，如 000001.SZ
     - trade_date: 交易日期，格式 YYYYMMDD
     - start_date/end_date: 开始/结束日期，格式 YYYYMMDD
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
-        df = pro.stk_factor_pro(
+        # 与分析工具共用本地存储：取到的数据同时写入存储，之后对同一股票的分析不再重复请求
+        from tushare_mcp_server import tech_ext
+
+        df = tech_ext.fetch_factor_pro(
             ts_code=ts_code,
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            fields=fields,
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def moneyflow(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取个股资金流向数据。
 
     - ts_code: 股票代码
     - trade_date: 交易日期
     - start_date/end_date: 日期范围
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.moneyflow(
@@ -67,24 +72,32 @@ def moneyflow(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def moneyflow_cnt_ths(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取同花顺概念板块资金流向数据。
 
     - ts_code: 板块代码
     - trade_date: 交易日期 YYYYMMDD
     - start_date/end_date: 日期范围
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.moneyflow_cnt_ths(
@@ -92,13 +105,15 @@ def moneyflow_cnt_ths(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def moneyflow_ind_ths(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
@@ -106,6 +121,9 @@ def moneyflow_ind_ths(
     end_date: Optional[str] = None,
     industry_code: Optional[str] = None,
     industry_name: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取同花顺行业板块资金流向数据。
 
@@ -113,6 +131,9 @@ def moneyflow_ind_ths(
     - trade_date: 交易日期 YYYYMMDD
     - start_date/end_date: 日期范围
     - industry_code/name: 行业代码或名称
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.moneyflow_ind_ths(
@@ -122,24 +143,32 @@ def moneyflow_ind_ths(
             end_date=end_date,
             industry_code=industry_code,
             industry_name=industry_name,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def cyq_perf(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取股票筹码分布数据。
 
     - ts_code: 股票代码
     - trade_date: 交易日期
     - start_date/end_date: 日期范围
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.cyq_perf(
@@ -147,13 +176,15 @@ def cyq_perf(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def stock_basic(
     ts_code: Optional[str] = None,
     name: Optional[str] = None,
@@ -162,10 +193,14 @@ def stock_basic(
     market: Optional[str] = None,
     is_hs: Optional[str] = None,
     fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取股票基本信息。
 
     常用参数：ts_code、name、exchange、list_status、market、is_hs、fields
+
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.stock_basic(
@@ -177,38 +212,52 @@ def stock_basic(
             is_hs=is_hs,
             **({"fields": fields} if fields is not None else {})
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def index_classify(
     level: Optional[str] = None,
     src: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取行业分类信息。
 
     可选参数：level、src
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
-        df = pro.index_classify(level=level, src=src)
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        df = pro.index_classify(level=level, src=src, **({"fields": fields} if fields is not None else {}))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def fina_indicator(
     ts_code: Optional[str] = None,
     ann_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     period: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取财务指标数据。
 
     常用参数：ts_code、ann_date、start_date、end_date、period
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.fina_indicator(
@@ -217,19 +266,24 @@ def fina_indicator(
             start_date=start_date,
             end_date=end_date,
             period=period,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def stk_holdernumber(
     ts_code: Optional[str] = None,
     ann_date: Optional[str] = None,
     enddate: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取股东人数数据。
 
@@ -237,6 +291,9 @@ def stk_holdernumber(
     - ann_date: 公告日期
     - enddate: 截止日期
     - start_date/end_date: 公告日期范围
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.stk_holdernumber(
@@ -245,24 +302,32 @@ def stk_holdernumber(
             enddate=enddate,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def ths_daily(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取同花顺指数日线数据。
 
     - ts_code: 指数代码
     - trade_date: 交易日期
     - start_date/end_date: 日期范围
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.ths_daily(
@@ -270,44 +335,59 @@ def ths_daily(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def index_weekly(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取指数周线数据。
 
     - ts_code: 指数代码
     - trade_date: 交易日期
     - start_date/end_date: 日期范围
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
-        df = pro.index_weekly(ts_code=ts_code, trade_date=trade_date, start_date=start_date, end_date=end_date)
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        df = pro.index_weekly(ts_code=ts_code, trade_date=trade_date, start_date=start_date, end_date=end_date, **({"fields": fields} if fields is not None else {}))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def trade_cal(
     exchange: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     is_open: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取交易日历数据。
 
     - exchange: 交易所代码（SSE/ SZSE / …）
     - start_date/end_date: 日期范围
     - is_open: 是否交易日（1 是，0 否）
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.trade_cal(
@@ -315,24 +395,60 @@ def trade_cal(
             start_date=start_date,
             end_date=end_date,
             is_open=is_open,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def trade_date_offset(
+    date: str,
+    offsets: Optional[List[int]] = None,
+) -> str:
+    """按交易日计算日期偏移（基于本地缓存的交易日历索引，无需逐次调用 trade_cal）。
+
+    参数说明：
+    - date: 基准日期，格式 YYYYMMDD；非交易日时以之前最近的交易日为基准
+    - offsets: 交易日偏移量列表，负数向前、正数向后，如 [-5, -20, -60]
+
+    返回示例：
+    {
+      "date": "20251106",
+      "is_open": true,
+      "latest_trade_date": "20251106",
+      "offsets": {"-5": "20251030", "-20": "20251010", "-60": "20250812"}
+    }
+
+    典型用法：一次调用得到短线/中期/长期分析的开始日（前推5/20/60个交易日，不含当日）。
+    """
+    try:
+        return json.dumps(trade_calendar.describe(date, offsets or []), ensure_ascii=False)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def stk_auction_o(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取集合竞价数据。
 
     - ts_code: 股票代码
     - trade_date: 交易日期
     - start_date/end_date: 日期范围
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.stk_auction_o(
@@ -340,13 +456,15 @@ def stk_auction_o(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def income(
     ts_code: Optional[str] = None,
     ann_date: Optional[str] = None,
@@ -356,6 +474,9 @@ def income(
     period: Optional[str] = None,
     report_type: Optional[str] = None,
     comp_type: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取利润表数据。
 
@@ -364,6 +485,9 @@ def income(
     - start_date/end_date: 公告日期范围（YYYYMMDD）
     - period: 报告期（如 20171231、20170930 等）
     - report_type/comp_type: 报告类型/公司类型
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.income(
@@ -375,13 +499,15 @@ def income(
             period=period,
             report_type=report_type,
             comp_type=comp_type,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def balancesheet(
     ts_code: str,
     ann_date: Optional[str] = None,
@@ -390,6 +516,9 @@ def balancesheet(
     period: Optional[str] = None,
     report_type: Optional[str] = None,
     comp_type: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取资产负债表数据。
 
@@ -398,6 +527,9 @@ def balancesheet(
     - start_date/end_date: 公告日期范围（YYYYMMDD）
     - period: 报告期（如 20171231、20170930 等）
     - report_type/comp_type: 报告类型/公司类型
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.balancesheet(
@@ -408,13 +540,15 @@ def balancesheet(
             period=period,
             report_type=report_type,
             comp_type=comp_type,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def cashflow(
     ts_code: str,
     ann_date: Optional[str] = None,
@@ -425,6 +559,9 @@ def cashflow(
     report_type: Optional[str] = None,
     comp_type: Optional[str] = None,
     is_calc: Optional[int] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取现金流量表数据。
 
@@ -434,6 +571,9 @@ def cashflow(
     - period: 报告期（如 20171231、20170930 等）
     - report_type/comp_type: 报告类型/公司类型
     - is_calc: 是否计算报表
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.cashflow(
@@ -446,19 +586,24 @@ def cashflow(
             report_type=report_type,
             comp_type=comp_type,
             is_calc=is_calc,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def top10_floatholders(
     ts_code: str,
     period: str,
     ann_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取前十大流通股东数据。
 
@@ -466,6 +611,9 @@ def top10_floatholders(
     - period: 报告期（YYYYMMDD）
     - ann_date: 公告日期（YYYYMMDD）
     - start_date/end_date: 报告期范围（YYYYMMDD）
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.top10_floatholders(
@@ -474,18 +622,23 @@ def top10_floatholders(
             ann_date=ann_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def index_monthly(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取指数月线行情数据。
 
@@ -493,6 +646,9 @@ def index_monthly(
     - ts_code: TS指数代码
     - trade_date: 交易日期，格式 YYYYMMDD
     - start_date/end_date: 开始/结束日期，格式 YYYYMMDD
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.index_monthly(
@@ -500,18 +656,23 @@ def index_monthly(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def idx_factor_pro(
     ts_code: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     trade_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取指数技术因子数据（专业版）。
 
@@ -519,6 +680,9 @@ def idx_factor_pro(
     - ts_code: 指数代码(大盘指数 申万指数 中信指数)
     - start_date/end_date: 开始/结束日期
     - trade_date: 交易日期
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.idx_factor_pro(
@@ -526,17 +690,22 @@ def idx_factor_pro(
             start_date=start_date,
             end_date=end_date,
             trade_date=trade_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def moneyflow_mkt_dc(
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取东方财富大盘资金流向数据。
 
@@ -556,23 +725,31 @@ def moneyflow_mkt_dc(
     - 每日盘后更新
     - 包含上证/深证收盘价、涨跌幅
     - 提供主力净流入、超大单、大单、中单、小单资金流向数据
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.moneyflow_mkt_dc(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def moneyflow_hsgt(
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取沪深港通资金流向数据。
 
@@ -592,6 +769,9 @@ def moneyflow_hsgt(
     - 提供北向资金和南向资金数据
     - 每日18~20点之间完成更新
     - 每次最多返回300条记录
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     # 参数验证
     if trade_date is None and start_date is None:
@@ -608,24 +788,32 @@ def moneyflow_hsgt(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def index_weight(
     index_code: str,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取各类指数成分和权重（月度数据）。
 
     - index_code: 指数代码（必选），如 399300.SZ
     - trade_date: 交易日期 YYYYMMDD（可选）
     - start_date/end_date: 日期范围 YYYYMMDD（可选）
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.index_weight(
@@ -633,24 +821,32 @@ def index_weight(
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def index_dailybasic(
     trade_date: Optional[str] = None,
     ts_code: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取大盘指数每日指标数据。
 
     - trade_date: 交易日期 YYYYMMDD
     - ts_code: TS指数代码
     - start_date/end_date: 日期范围 YYYYMMDD
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.index_dailybasic(
@@ -658,19 +854,23 @@ def index_dailybasic(
             ts_code=ts_code,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def daily_basic(
     ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取全部股票每日重要的基本面指标。
 
@@ -678,6 +878,8 @@ def daily_basic(
     - trade_date: 交易日期（二选一，YYYYMMDD）
     - start_date/end_date: 日期范围（YYYYMMDD）
     - fields: 指定返回字段（可选）
+
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.daily_basic(
@@ -687,18 +889,22 @@ def daily_basic(
             end_date=end_date,
             **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
+@run_in_worker
 def index_member_all(
     l1_code: Optional[str] = None,
     l2_code: Optional[str] = None,
     l3_code: Optional[str] = None,
     ts_code: Optional[str] = None,
     is_new: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    precision: Optional[int] = None,
 ) -> str:
     """获取申万行业成分构成(分级)。
 
@@ -720,6 +926,9 @@ def index_member_all(
     
     # 获取000001.SZ所属行业
     index_member_all(ts_code='000001.SZ')
+
+    返回字段：fields 为逗号分隔的字段列表，不传时返回全部字段
+    输出格式：output_format 可选 records（默认，对象数组）、split（列名只出现一次）、values（按列输出）；precision 为浮点数保留的小数位数
     """
     try:
         df = pro.index_member_all(
@@ -728,49 +937,596 @@ def index_member_all(
             l3_code=l3_code,
             ts_code=ts_code,
             is_new=is_new,
+            **({"fields": fields} if fields is not None else {}),
         )
-        return cast(str, df.to_json(orient="records", force_ascii=False))
+        return dump_frame(df, output_format, precision)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
-def get_sentiment_volume(ts_code: str, trade_date: str) -> str:
-    """获取股票的量能情绪分析，评估市场参与度、资金流向与情绪倾向。
+@run_in_worker
+def get_trend_signals(
+    ts_code: Union[str, List[str]],
+    trade_date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> str:
+    """获取股票趋势信号综合分析。
+    
+    基于 stk_factor_pro 数据，提供多维度的趋势信号分析：
+    - 价格与均线关系 (price_vs_ma5)
+    - 均线排列状态 (ma5_vs_ma20) 
+    - MACD信号 (macd_status)
+    - 综合趋势方向 (trend_direction)
+    - 趋势强度 (trend_strength)
+    - 动量变化 (momentum_change)
     
     参数说明：
-    - ts_code: 股票代码，如 000001.SZ
+    - ts_code: 股票代码（必需），如 000001.SZ；传入代码列表或逗号分隔的多个代码时进入批量模式
     - trade_date: 交易日期，格式 YYYYMMDD
+    - start_date/end_date: 开始/结束日期，格式 YYYYMMDD
     
-    返回字段：
-    - turnover_status: 换手率状态 (high_turnover/normal_turnover/low_turnover)
-    - volume_status: 量比状态 (volume_surge/normal_volume/volume_dry_up)
-    - obv_trend: OBV趋势 (rising/falling/flat/insufficient_data)
-    - brar_sentiment: BRAR情绪 (bullish_sentiment/bearish_sentiment/neutral_sentiment)
-    - vr_status: VR容量比率 (bullish_volume/bearish_volume/neutral_volume)
-    - mfi_psy_status: MFI和PSY状态组合
-    - market_sentiment: 综合市场情绪 (strongly_bullish/strongly_bearish/apathetic/neutral)
+    返回格式：
+    - 单日查询（使用trade_date）：返回单个JSON对象
+    - 多日查询（使用start_date/end_date）：返回JSON对象数组
+    - 批量模式：返回以 ts_code 为键的映射，值为上述单日对象或数组
     
-    分析目标：
-    - 市场对这只股票的关注度高吗？
-    - 是资金流入还是流出？
-    - 当前情绪是乐观、悲观还是冷漠？
+    返回示例：
+    {
+      "ts_code": "000001.SZ",
+      "trade_date": "20240115",
+      "price_vs_ma5": "above",
+      "ma5_vs_ma20": "bullish_alignment",
+      "macd_status": "positive_momentum",
+      "trend_direction": "up",
+      "trend_strength": "strong",
+      "momentum_change": "accelerating"
+    }
+    """
+    try:
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.get_trend_signals(ts_code, trade_date, start_date, end_date)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def get_sentiment_volume(
+    ts_code: Union[str, List[str]],
+    trade_date: str,
+) -> str:
+    """获取股票市场情绪与量能综合分析。
     
-    使用说明：
-    - 基于stk_factor_pro的完整技术指标数据
-    - 综合多个量能与情绪指标给出判断
-    - 不判断价格方向，只判断情绪强度与倾向
+    基于 stk_factor_pro 数据，评估股票当前的市场参与度、资金流向与情绪倾向：
+    - 换手率状态 (turnover_status)：反映股票流动性和市场关注度
+    - 量比状态 (volume_status)：衡量当前成交量相对于近期均量的放大程度
+    - OBV趋势 (obv_trend)：通过累积成交量判断资金流向
+    - BRAR情绪 (brar_sentiment)：反映多空双方力量对比
+    - VR容量比率 (vr_status)：通过涨跌日成交量对比衡量买卖力量
+    - MFI和PSY状态 (mfi_psy_status)：综合资金流量指标和心理线指标
+    - 综合市场情绪 (market_sentiment)：融合多个指标给出总体情绪倾向
+    
+    参数说明：
+    - ts_code: 股票代码（必需），如 000001.SZ；传入代码列表或逗号分隔的多个代码时进入批量模式
+    - trade_date: 交易日期（必需），格式 YYYYMMDD
+    
+    批量模式：一次性拉取全部股票的数据并统一计算，返回以 ts_code 为键的结果映射
+    
+    返回示例：
+    {
+      "ts_code": "000001.SZ",
+      "trade_date": "20240115",
+      "turnover_status": "high_turnover",
+      "volume_status": "volume_surge",
+      "obv_trend": "rising",
+      "brar_sentiment": "bullish_sentiment",
+      "vr_status": "bullish_volume",
+      "mfi_psy_status": "mfi_neutral_psy_neutral",
+      "market_sentiment": "strongly_bullish"
+    }
     """
     try:
-        from .tech_ext import get_sentiment_volume as sentiment_func
-        result = sentiment_func(ts_code, trade_date)
-        return json.dumps(result, ensure_ascii=False)
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.get_sentiment_volume(ts_code, trade_date)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
+@mcp.tool()
+@run_in_worker
+def get_valuation_metrics(
+    ts_code: Union[str, List[str]],
+    trade_date: str,
+) -> str:
+    """获取股票估值指标综合分析。
+    
+    基于 stk_factor_pro 数据，评估股票当前的估值水平与投资性价比：
+    - PE状态 (pe_status)：基于历史分位数判断市盈率高低
+    - PB状态 (pb_status)：基于历史分位数判断市净率水平
+    - 股息吸引力 (dividend_attractiveness)：股息率绝对水平评估
+    - PS状态 (ps_status)：基于历史分位数判断市销率水平
+    - 市值分类 (market_cap_category)：按总市值规模分类
+    - 综合估值结论 (valuation_summary)：融合多个指标给出投资建议
+    
+    参数说明：
+    - ts_code: 股票代码（必需），如 000001.SZ；传入代码列表或逗号分隔的多个代码时进入批量模式
+    - trade_date: 交易日期（必需），格式 YYYYMMDD
+    
+    批量模式：一次性拉取全部股票的数据并统一计算，返回以 ts_code 为键的结果映射
+    
+    返回示例：
+    {
+      "ts_code": "000001.SZ",
+      "trade_date": "20240115",
+      "pe_status": "cheap",
+      "pb_status": "reasonable",
+      "dividend_attractiveness": "attractive",
+      "ps_status": "fair_revenue",
+      "market_cap_category": "large_cap",
+      "valuation_summary": "undervalued"
+    }
+    """
+    try:
+        from tushare_mcp_server import tech_ext
 
+        return tech_ext.get_valuation_metrics(ts_code, trade_date)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def get_technical_profile(
+    ts_code: Union[str, List[str]],
+    trade_date: str,
+) -> str:
+    """获取股票某个交易日的技术面综合画像：一次调用返回五个分析工具的全部结果。
+    
+    一次读取各规则集所需数据的并集（只取用到的字段），在同一份数据上依次应用：
+    - trend: 趋势信号，同 get_trend_signals
+    - sentiment: 市场情绪与量能，同 get_sentiment_volume
+    - oscillator: 震荡指标信号，同 get_oscillator_signals
+    - volatility: 波动性分析，同 get_volatility_profile
+    - valuation: 估值指标，同 get_valuation_metrics
+    各部分的判断规则与对应工具完全一致；需要完整技术面时用本工具代替分别调用五个工具。
+    
+    参数说明：
+    - ts_code: 股票代码（必需），如 000001.SZ；传入代码列表或逗号分隔的多个代码时进入批量模式
+    - trade_date: 交易日期（必需），格式 YYYYMMDD
+    
+    批量模式：返回以 ts_code 为键的结果映射
+    
+    返回示例：
+    {
+      "ts_code": "000001.SZ",
+      "trade_date": "20240115",
+      "trend": {"price_vs_ma5": "above", "ma5_vs_ma20": "bullish_alignment",
+                "macd_status": "positive_momentum", "trend_direction": "up",
+                "trend_strength": "moderate", "momentum_change": "accelerating"},
+      "sentiment": {"turnover_status": "normal_turnover", "volume_status": "normal_volume",
+                    "obv_trend": "rising", "brar_sentiment": "bullish_sentiment", "vr_status": "neutral_volume",
+                    "mfi_psy_status": "mfi_neutral_psy_neutral", "market_sentiment": "neutral"},
+      "oscillator": {"rsi_status": "neutral", "kdj_status": "neutral", "williams_r_status": "neutral",
+                     "bias_status": "normal_deviation", "cci_status": "normal_range",
+                     "reversal_signal": "no_significant_signal"},
+      "volatility": {"atr_status": "normal_volatility", "bollinger_status": "upper_half",
+                     "mass_status": "reversal_zone", "keltner_status": "within_keltner_channel",
+                     "extreme_price_status": "no_extreme_price", "volatility_regime": "normal_volatility",
+                     "risk_warning": "none"},
+      "valuation": {"pe_status": "cheap", "pb_status": "discount", "dividend_attractiveness": "attractive",
+                    "ps_status": "fair_revenue", "market_cap_category": "large_cap",
+                    "valuation_summary": "undervalued"}
+    }
+    各字段的取值与对应的单项工具相同，数据不足时为 null。
+    """
+    try:
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.get_technical_profile(ts_code, trade_date)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def get_stock_dossier(
+    ts_code: str,
+    trade_date: Optional[str] = None,
+) -> str:
+    """获取个股分析卷宗：一次调用并发拉取个股分析常用的全部接口，返回裁剪后的紧凑结果。
+
+    代替依次调用 stock_basic、daily_basic、fina_indicator、income、balancesheet、cashflow、
+    moneyflow、cyq_perf、stk_holdernumber、top10_floatholders 与技术面分析：各接口同时请求，
+    总耗时接近其中最慢的一次调用。每部分只保留分析用得到的字段和窗口：
+    - stock_basic: 名称、地域、行业、市场、上市日期、实控人
+    - daily_basic: trade_date 当日的收盘价、换手率、量比、PE_TTM/PB/PS_TTM/股息率、股本与市值
+    - fina_indicator/income/balancesheet/cashflow: trade_date 前已公告的最近4个报告期（按报告期降序，更正公告取最后一次）
+    - moneyflow/cyq_perf: 截至 trade_date 最近5个交易日的大单/特大单资金流向与筹码成本分布（按日期降序）
+    - stk_holdernumber: 最近4期股东人数；top10_floatholders: 最近一期前十大流通股东
+    - technical: 技术面综合画像，同 get_technical_profile
+    某一部分取数出错时该部分为 {"error": "..."}，其余部分照常返回；没有数据时为 null 或空列表。
+
+    参数说明：
+    - ts_code: 股票代码（必需），如 600426.SH
+    - trade_date: 交易日期，格式 YYYYMMDD；不传时为最近一个交易日，非交易日向前顺延
+
+    返回示例：
+    {
+      "ts_code": "600426.SH",
+      "trade_date": "20251104",
+      "stock_basic": {"name": "华鲁恒升", "industry": "化工原料", "list_date": "20020709", ...},
+      "daily_basic": {"close": 27.5, "pe_ttm": 18.2, "pb": 1.9, "total_mv": 5840000.0, ...},
+      "fina_indicator": [{"ann_date": "20251025", "end_date": "20250930", "roe": 7.1, "grossprofit_margin": 15.2, ...}, ...],
+      "income": [...], "balancesheet": [...], "cashflow": [...],
+      "moneyflow": [{"trade_date": "20251104", "net_mf_amount": 3521.4, ...}, ...],
+      "cyq_perf": [{"trade_date": "20251104", "cost_50pct": 26.8, "winner_rate": 62.3, ...}, ...],
+      "stk_holdernumber": [{"ann_date": "20251025", "end_date": "20250930", "holder_num": 98765}, ...],
+      "top10_floatholders": [{"ann_date": "20251025", "end_date": "20250930", "name": "...", "hold_amount": 1.2e8, "hold_ratio": 5.6}, ...],
+      "technical": {"trend": {...}, "sentiment": {...}, "oscillator": {...}, "volatility": {...}, "valuation": {...}}
+    }
+    """
+    try:
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.get_stock_dossier(ts_code, trade_date)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def get_valuation_percentiles(
+    ts_code: Union[str, List[str]],
+    trade_date: str,
+) -> str:
+    """获取股票当日估值在自身近5年历史中的分位。
+    
+    基于 stk_factor_pro 数据，返回 PE、PB、PS 当日取值及其在近5年（1250个交易日）历史中的分位（0-100，
+    即历史中不高于当日值的样本占比）：
+    - PE、PS 优先使用 TTM 口径，当日缺失时回退到静态口径；PE 只统计正值，PB、PS 统计非负值
+    - 历史有效样本不足100个，或当日值无效（如亏损股 PE 为负）时分位为 null
+    - *_history 为参与计算的历史样本数
+    
+    参数说明：
+    - ts_code: 股票代码（必需），如 000001.SZ；传入代码列表或逗号分隔的多个代码时进入批量模式
+    - trade_date: 交易日期（必需），格式 YYYYMMDD，可以是任意历史交易日
+    
+    批量模式：各股票的估值历史索引常驻内存，数千只股票的分位查询也只需二分查找，适合全市场估值筛选
+    
+    返回示例：
+    {
+      "ts_code": "000001.SZ",
+      "trade_date": "20240115",
+      "pe": 4.52,
+      "pe_percentile": 8.3,
+      "pe_history": 1249,
+      "pb": 0.51,
+      "pb_percentile": 2.1,
+      "pb_history": 1249,
+      "ps": 1.32,
+      "ps_percentile": 15.7,
+      "ps_history": 1249
+    }
+    """
+    try:
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.get_valuation_percentiles(ts_code, trade_date)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def get_oscillator_signals(
+    ts_code: Union[str, List[str]],
+    trade_date: str,
+) -> str:
+    """获取股票震荡指标信号分析。
+    
+    基于 Tushare 专业版提供的全量技术因子，对股票当前的超买、超卖状态及潜在反转信号进行结构化、语义化的判断：
+    - RSI超买超卖状态 (rsi_status)
+    - KDJ综合信号分析 (kdj_status)  
+    - 威廉指标状态 (williams_r_status)
+    - 乖离率偏离程度 (bias_status)
+    - CCI异常波动预警 (cci_status)
+    - 综合反转信号评估 (reversal_signal)
+    
+    参数说明：
+    - ts_code: 股票代码（必需），如 000001.SZ；传入代码列表或逗号分隔的多个代码时进入批量模式
+    - trade_date: 交易日期（必需），格式 YYYYMMDD
+    
+    批量模式：一次性拉取全部股票的数据并统一计算，返回以 ts_code 为键的结果映射
+    
+    返回示例：
+    {
+      "ts_code": "000001.SZ",
+      "trade_date": "20240115",
+      "rsi_status": "oversold",
+      "kdj_status": "bullish_crossover_in_oversold",
+      "williams_r_status": "oversold",
+      "bias_status": "high_negative_deviation", 
+      "cci_status": "oversold_or_breakdown",
+      "reversal_signal": "strong_bullish_reversal"
+    }
+    """
+    try:
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.get_oscillator_signals(ts_code, trade_date)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def get_volatility_profile(
+    ts_code: Union[str, List[str]],
+    date: str,
+) -> str:
+    """获取股票波动性分析。
+    
+    基于 Tushare 专业版技术因子数据，评估股票当前的波动水平、风险状态及潜在变盘信号。
+    专门设计用于回答"这只股票最近波动大吗？"、"当前是高风险还是低风险状态？"等问题。
+    
+    核心分析维度：
+    - ATR波动率状态 (atr_status)
+    - 布林带位置与带宽分析 (bollinger_status)  
+    - MASS梅斯指标波动压缩状态 (mass_status)
+    - 肯特纳通道趋势位置 (keltner_status)
+    - 价格极值新鲜度 (extreme_price_status)
+    - 综合波动状态评估 (volatility_regime)
+    - 风险预警信号 (risk_warning)
+    
+    参数说明：
+    - ts_code: 股票代码（必需），如 000001.SZ；传入代码列表或逗号分隔的多个代码时进入批量模式
+    - date: 分析日期（必需），格式 YYYYMMDD
+    
+    批量模式：一次性拉取全部股票的数据并统一计算，返回以 ts_code 为键的结果映射
+    
+    返回示例：
+    {
+      "ts_code": "000001.SZ",
+      "date": "20240115",
+      "atr_status": "normal_volatility",
+      "bollinger_status": "upper_half",
+      "mass_status": "reversal_zone",
+      "keltner_status": "within_keltner_channel",
+      "extreme_price_status": "no_extreme_price",
+      "volatility_regime": "normal_volatility",
+      "risk_warning": "none"
+    }
+    """
+    try:
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.get_volatility_profile(ts_code, date)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def scan_market(
+    trade_date: str,
+    conditions: Optional[Dict[str, Union[str, List[str]]]] = None,
+    rank_by: str = "pct_chg",
+    ascending: bool = False,
+    limit: int = 50,
+) -> str:
+    """全市场信号扫描：对某个交易日的全部A股一次性应用趋势、情绪量能、震荡、波动率规则集。
+    
+    基于 stk_factor_pro 按交易日拉取的全市场截面，回看 21 个交易日（截面按日期缓存在本地，
+    已缓存的交易日不再请求）。冷启动最多 1 次交易日历 + 21 次截面请求，之后每次扫描只需补拉新交易日。
+    判断规则与 get_trend_signals、get_sentiment_volume、get_oscillator_signals、
+    get_volatility_profile 完全一致；估值分位需要5年历史，不参与全市场扫描。
+    
+    参数说明：
+    - trade_date: 交易日期（必需），格式 YYYYMMDD
+    - conditions: 筛选条件，字段名 -> 取值或取值列表，全部满足才入选，
+      如 {"market_sentiment": "strongly_bullish",
+          "kdj_status": ["bullish_crossover", "bullish_crossover_in_oversold"]}；
+      可用字段为上述四个工具返回的全部信号字段，取值须为该字段实际会出现的标签
+      （如 rsi_status 只有 overbought/oversold/neutral），未知字段或取值返回错误并列出可选值；不传时返回全部股票
+    - rank_by: 排序所依据的 stk_factor_pro 数值字段，默认 pct_chg（涨跌幅），
+      可选 pct_chg、close、vol、amount、turnover_rate、turnover_rate_f、volume_ratio、total_mv、circ_mv、pe_ttm、pb
+    - ascending: 是否升序排列，默认 False（降序）
+    - limit: 返回的最大股票数，默认 50
+    
+    返回示例：
+    {
+      "trade_date": "20240115",
+      "total": 5321,
+      "matched": 87,
+      "rank_by": "pct_chg",
+      "results": [
+        {
+          "ts_code": "000001.SZ",
+          "trade_date": "20240115",
+          "pct_chg": 9.98,
+          "price_vs_ma5": "crossing_up",
+          "market_sentiment": "strongly_bullish",
+          "rsi_status": "neutral",
+          "volatility_regime": "normal_volatility",
+          ...
+        }
+      ]
+    }
+    """
+    try:
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.scan_market(trade_date, conditions, rank_by, ascending, limit)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+@run_in_worker
+def get_industry_valuation(
+    trade_date: str,
+    level: str = "l1",
+    ts_code: Optional[Union[str, List[str]]] = None,
+    industry: Optional[str] = None,
+    rank_by: str = "pe_ttm",
+    ascending: bool = True,
+    limit: int = 5,
+) -> str:
+    """申万行业内估值排名：一次性计算全市场每只股票在所属行业内的 PE_TTM、PB、PS_TTM、股息率分位。
+    
+    基于 daily_basic 按交易日拉取的全市场截面与 index_member_all 申万行业成分，
+    一次请求得到全部股票的行业内排名（结果按日期缓存在本地，同一交易日不再请求）。
+    行业归属按成分的纳入/剔除日期取 trade_date 当天的分类，历史日期的排名使用当时的同行业股票；
+    当天 daily_basic 发布（约 17:00）前的排名可能基于不完整的截面，发布后自动重新计算。
+    <指标>_rank 为行业内分位（0-100，同行业有效值中不高于该股票的占比），
+    PE_TTM 只统计正值（亏损股为 null），缺失值为 null。
+    
+    参数说明：
+    - trade_date: 交易日期（必需），格式 YYYYMMDD
+    - level: 申万行业层级，l1（一级，默认）、l2（二级）、l3（三级）
+    - ts_code: 股票代码（可选），传入时只返回这些股票在所属行业内的排名；代码列表或逗号分隔的多个代码返回以 ts_code 为键的映射
+    - industry: 行业代码或名称（可选），如 801780.SI 或 银行，只返回该行业
+    - rank_by: 行业内排序字段，可选 pe_ttm（默认）、pb、ps_ttm、dv_ttm
+    - ascending: 是否升序排列，默认 True（估值最低的在前）；按股息率找高股息时传 False
+    - limit: 每个行业返回的股票数，默认 5
+    
+    返回示例（不传 ts_code）：
+    {
+      "trade_date": "20240115",
+      "level": "l1",
+      "rank_by": "pe_ttm",
+      "total": 5102,
+      "industries": [
+        {
+          "industry_code": "801780.SI",
+          "industry_name": "银行",
+          "size": 42,
+          "stocks": [
+            {"ts_code": "601939.SH", "name": "建设银行", "close": 6.12, "pe_ttm": 4.3, "pe_ttm_rank": 2.4,
+             "pb": 0.52, "pb_rank": 9.5, "ps_ttm": 1.6, "ps_ttm_rank": 11.9, "dv_ttm": 6.1, "dv_ttm_rank": 92.9,
+             "total_mv": 150000000.0},
+            ...
+          ]
+        }
+      ]
+    }
+    传入 ts_code 时每只股票的结果另含 trade_date、industry_code、industry_name、industry_size。
+    """
+    try:
+        from tushare_mcp_server import tech_ext
+
+        return tech_ext.get_industry_valuation(
+            trade_date, level, ts_code, industry, rank_by, ascending, limit
+        )
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+def api_queue_stats() -> str:
+    """查看各 Tushare 接口的限速排队状态。
+
+    返回以接口名为键的统计信息：
+    - queue_depth: 当前排队等待的调用数
+    - in_flight: 正在执行的调用数
+    - tokens: 令牌桶剩余配额
+    - rate_per_minute/concurrency: 每分钟配额与并发上限
+    - calls/retries/errors/quota_errors: 累计调用、重试、出错及配额错误次数
+    - avg_wait/max_wait: 排队等待的平均/最长时间（秒）
+    """
+    try:
+        return json.dumps(scheduler_stats(), ensure_ascii=False, indent=2)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.tool()
+def server_stats(reset: bool = False) -> str:
+    """查看各工具与各 Tushare 接口的耗时统计，找出占用时间最多的工具。
+
+    参数说明：
+    - reset: 返回后清空统计，默认 False
+
+    返回：
+    - tools: 以工具名为键，按累计耗时（total_ms）降序排列
+      - calls/errors: 调用与出错次数
+      - latency_ms/fetch_ms/compute_ms/serialize_ms: 总耗时及取数、计算、序列化耗时的
+        avg/p50/p95/p99/max（毫秒，分位数取最近 TUSHARE_STATS_WINDOW 次调用）
+      - upstream_calls: 实际发出的 Tushare 请求数（含分页与重试），rows: 取回的行数
+      - output_bytes: 返回结果字节数的分布；cache_hit_ratio: 本地存储命中率
+    - endpoints: 以 Tushare 接口名为键的调用次数、出错次数、耗时分布（含排队与分页）和行数
+    - caches: 本地存储（factor_store 按股票、cross_section 按交易日）与接口结果缓存（api_cache）的命中与未命中次数
+    - api_cache: 接口结果内存缓存的条目数（settled 为已发布、不再过期的条数）、占用字节数、容量上限与累计淘汰次数；
+      启用 TUSHARE_SHARED_CACHE 时 shared 为跨进程共享缓存的文件路径、条目数与占用字节数
+    - workers: 工作线程的并发上限（总数与单个客户端）、执行中与排队中的调用数、有调用的客户端数
+
+    设置环境变量 TUSHARE_STATS_FILE 时，每次工具调用的度量还会按 JSON 行追加写入该文件。
+    """
+    try:
+        result = {**stats.snapshot(), "api_cache": pro.cache.snapshot(), "workers": worker_stats()}
+        if reset:
+            stats.reset()
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+@mcp.resource("stats://server", mime_type="application/json")
+def server_stats_resource() -> str:
+    """各工具与各 Tushare 接口的耗时统计（与 server_stats 工具相同）。"""
+    return json.dumps(
+        {**stats.snapshot(), "api_cache": pro.cache.snapshot(), "workers": worker_stats()},
+        ensure_ascii=False,
+        indent=2,
+    )
+
+
+# 传输层：stdio（默认，每个客户端启动一个服务器进程）、streamable-http 或 sse（一个进程服务多个客户端）
+TRANSPORTS = ("stdio", "streamable-http", "sse")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：按 --transport（或环境变量 TUSHARE_TRANSPORT）选择传输层启动服务器。
+
+    HTTP/SSE 传输下所有客户端共用本进程的 Tushare 客户端、限速调度器、接口结果缓存与本地存储，
+    工具调用按客户端公平排队（见 concurrency.FairLimiter）。
+    """
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Tushare MCP Server")
+    parser.add_argument(
+        "--transport", choices=TRANSPORTS, default=os.getenv("TUSHARE_TRANSPORT", "stdio"),
+        help="传输层，默认 stdio（环境变量 TUSHARE_TRANSPORT）",
+    )
+    parser.add_argument(
+        "--host", default=os.getenv("TUSHARE_HOST", mcp.settings.host),
+        help="HTTP/SSE 监听地址，默认 127.0.0.1（环境变量 TUSHARE_HOST）",
+    )
+    parser.add_argument(
+        "--port", type=int, default=int(os.getenv("TUSHARE_PORT", mcp.settings.port)),
+        help="HTTP/SSE 监听端口，默认 8000（环境变量 TUSHARE_PORT）",
+    )
+    args = parser.parse_args(argv)
+
+    if args.transport != "stdio":
+        mcp.settings.host = args.host
+        mcp.settings.port = args.port
+        allowed = [h.strip() for h in os.getenv("TUSHARE_ALLOWED_HOSTS", "").split(",") if h.strip()]
+        if allowed:
+            # 校验请求的 Host 头（防 DNS rebinding），反向代理或内网域名需加入白名单
+            security = mcp.settings.transport_security
+            if security is not None:
+                security.allowed_hosts = [*security.allowed_hosts, *allowed]
+        elif args.host not in ("127.0.0.1", "localhost", "::1"):
+            # 与 FastMCP 对非本机地址的默认行为一致：不校验 Host 头
+            mcp.settings.transport_security = None
+    mcp.run(transport=args.transport)
 
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    main()
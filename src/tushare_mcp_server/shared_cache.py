@@ -0,0 +1,224 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from tushare_mcp_server.trade_calendar import DEFAULT_CACHE_DIR
+
+
+# 设为 1 时启用跨进程共享的接口结果缓存（同一台机器上的多个服务器进程共用一个 SQLite 文件）
+SHARED_CACHE = os.getenv("TUSHARE_SHARED_CACHE", "").strip().lower() in ("1", "true", "yes", "on")
+
+# 共享缓存文件的路径，默认 <TUSHARE_CACHE_DIR>/api_cache.sqlite3
+SHARED_CACHE_PATH = os.getenv("TUSHARE_SHARED_CACHE_PATH", "")
+
+# 共享缓存的容量上限（MB，按序列化后的字节数计算）：可通过环境变量 TUSHARE_SHARED_CACHE_MB 覆盖
+SHARED_CACHE_MB = float(os.getenv("TUSHARE_SHARED_CACHE_MB", "1024"))
+
+# 一个进程拉取某份数据时，其他进程等待其结果的最长时间（秒），超时后各自请求
+LEASE_SECONDS = 60.0
+
+# 等待其他进程的结果时轮询的间隔（秒）
+POLL_INTERVAL = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    api TEXT NOT NULL,
+    params TEXT NOT NULL,
+    span_start TEXT,
+    span_end TEXT,
+    fields TEXT,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    nbytes INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_group ON entries (api, params);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    until REAL NOT NULL
+);
+"""
+
+
+def _encode(df: Any) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = pa.BufferOutputStream()
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), sink)
+    return sink.getvalue().to_pybytes()
+
+
+def _decode(data: bytes) -> Any:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    return pq.read_table(pa.BufferReader(data)).to_pandas()
+
+
+class SharedCache:
+    """跨进程共享的接口结果缓存：同一台机器上的服务器进程共用一个 SQLite（WAL 模式）文件。
+
+    作为 cache.FrameCache 的第二级：进程内缓存未命中时查这里，取到的新数据同时写入这里，
+    一个进程拉取的数据其他进程直接复用，Tushare 配额不再随进程数增长。
+    DataFrame 按 Parquet 序列化保存；过期时间与进程内缓存相同（时间戳，各进程一致）。
+    容量按序列化后的字节数计算，超出时淘汰最久未访问的结果。
+
+    同一份数据同一时间只由一个进程拉取：拉取前在 leases 表登记，其他进程轮询等待其结果
+    （最长 LEASE_SECONDS 秒，拉取失败或超时后各自请求）。
+
+    SQLite 出错（文件损坏、磁盘已满、锁等待超时等）时视为未命中，不影响接口调用。
+
+    - path: SQLite 文件路径，默认 SHARED_CACHE_PATH 或 ``<TUSHARE_CACHE_DIR>/api_cache.sqlite3``
+    - max_bytes: 容量上限（字节），默认 SHARED_CACHE_MB
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+        self.path = path or SHARED_CACHE_PATH or os.path.join(
+            os.getenv("TUSHARE_CACHE_DIR") or DEFAULT_CACHE_DIR, "api_cache.sqlite3"
+        )
+        self.max_bytes = int(SHARED_CACHE_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """当前线程的连接（每个线程一个，首次使用时建表）。"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------ 读写
+
+    def lookup(
+        self, key: str, api: str, params: str, span: Optional[Tuple[str, str]], now: float
+    ) -> Iterator[Tuple[str, Optional[Tuple[str, str]], Optional[str], float, Any]]:
+        """依次产出可能回答查询的未过期结果 (key, 区间, 字段, 过期时间, DataFrame)：先是完全相同的查询，
+        再是区间包含 span 的较宽查询（最近访问的在前）。"""
+        try:
+            conn = self._connect()
+            if span is None:
+                rows = conn.execute(
+                    "SELECT key, span_start, span_end, fields, expires, data FROM entries"
+                    " WHERE key = ? AND expires > ?",
+                    (key, now),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT key, span_start, span_end, fields, expires, data FROM entries"
+                    " WHERE api = ? AND params = ? AND expires > ?"
+                    " AND (key = ? OR (span_start <= ? AND span_end >= ?))"
+                    " ORDER BY key = ? DESC, accessed DESC LIMIT 8",
+                    (api, params, now, key, span[0], span[1], key),
+                ).fetchall()
+        except sqlite3.Error:
+            return
+        for row_key, start, end, fields, expires, data in rows:
+            try:
+                frame = _decode(data)
+            except Exception:
+                continue
+            yield row_key, (start, end) if start is not None else None, fields, expires, frame
+
+    def touch(self, key: str, now: float) -> None:
+        """记录一次命中（用于按最久未访问淘汰）。"""
+        try:
+            with self._connect() as conn:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            pass
+
+    def store(
+        self,
+        key: str,
+        api: str,
+        params: str,
+        span: Optional[Tuple[str, str]],
+        fields: Optional[str],
+        expires: float,
+        frame: Any,
+    ) -> None:
+        """写入一个结果，并淘汰过期与超出容量的结果；无法序列化或超过容量上限的结果不写入。"""
+        try:
+            data = _encode(frame)
+        except Exception:
+            return
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries"
+                    " (key, api, params, span_start, span_end, fields, expires, accessed, nbytes, data)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key, api, params, span[0] if span else None, span[1] if span else None,
+                        fields, expires, now, len(data), data,
+                    ),
+                )
+                conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+                total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+                while total > self.max_bytes:
+                    oldest = conn.execute(
+                        "SELECT key, nbytes FROM entries ORDER BY accessed LIMIT 32"
+                    ).fetchall()
+                    if not oldest:
+                        break
+                    conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in oldest])
+                    total -= sum(n for _, n in oldest)
+        except sqlite3.Error:
+            pass
+
+    def clear(self) -> None:
+        """丢弃全部共享结果（对所有进程生效）。"""
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM entries")
+                conn.execute("DELETE FROM leases")
+        except sqlite3.Error:
+            pass
+
+    # ------------------------------------------------------------------ 拉取登记
+
+    def claim(self, key: str) -> Optional[str]:
+        """登记由本线程拉取 key：成功时返回登记凭证，已有其他未过期的登记时返回 None。"""
+        owner = uuid.uuid4().hex
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND until <= ?", (key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO leases (key, owner, until) VALUES (?, ?, ?)",
+                    (key, owner, now + LEASE_SECONDS),
+                )
+                return owner if cursor.rowcount == 1 else None
+        except sqlite3.Error:
+            return owner  # 无法登记时直接拉取
+
+    def release(self, key: str, owner: str) -> None:
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+        except sqlite3.Error:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        """共享缓存的文件路径、结果数、占用字节数与容量上限。"""
+        try:
+            entries, nbytes = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM entries"
+            ).fetchone()
+        except sqlite3.Error as e:
+            return {"path": self.path, "error": str(e)}
+        return {"path": self.path, "entries": entries, "bytes": nbytes, "max_bytes": self.max_bytes}
@@ -0,0 +1,196 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tushare_mcp_server import stats
+from tushare_mcp_server.common import atomic_write
+from tushare_mcp_server.store import FactorStore, _shift_day
+from tushare_mcp_server.trade_calendar import TradingCalendar
+
+
+# 内存中保留多少只股票的状态（其余只在磁盘上）：可通过环境变量 TUSHARE_STATE_CACHE_SIZE 覆盖
+STATE_CACHE_SIZE = int(os.getenv("TUSHARE_STATE_CACHE_SIZE", "256"))
+
+# 写入 Parquet 元数据的键
+_META_KEY = b"tushare_state"
+
+
+class TickerState:
+    """一只股票截至 as_of 的增量指标状态。
+
+    tail 为最近 tail_days 行的全部因子字段，短回看规则集需要的滚动状态都在其中：
+    ATR 20日均值与前20日高低点（波动率）、前一交易日的 OBV/MTM/MACD/KDJ/MASS（交叉判断）
+    """
+
+    def __init__(self, as_of: str, tail: pd.DataFrame) -> None:
+        self.as_of = as_of
+        self.tail = tail
+
+
+class IndicatorState:
+    """按股票持久化的增量指标状态，建立在 FactorStore 之上。
+
+    第一次分析某只股票时从本地存储读取回看窗口建立状态；之后每个新交易日只从存储读取
+    新增的几行（存储只向 Tushare 补拉缺口）追加到状态末尾、淘汰窗口外的旧行，
+    不再为一天的结果重新读取、计算多年历史。检测到新的复权因子（除权除息）时重建状态。
+
+    状态保存为 ``<store.root>/_state/<ts_code>.parquet``，最近使用的 cache_size 只股票同时保留在内存中。
+
+    - store: 因子存储
+    - calendar: 交易日历，用于计算回看窗口的起始日
+    - tail_days: tail 保留的交易日数（短回看规则集的最长窗口）
+    - cache_size: 内存中保留的股票数，默认 STATE_CACHE_SIZE
+    """
+
+    def __init__(
+        self,
+        store: FactorStore,
+        calendar: TradingCalendar,
+        tail_days: int,
+        cache_size: Optional[int] = None,
+    ) -> None:
+        self.store = store
+        self.calendar = calendar
+        self.tail_days = tail_days
+        self.cache_size = STATE_CACHE_SIZE if cache_size is None else cache_size
+        self._cache: "OrderedDict[Tuple[str, str], TickerState]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    @property
+    def root(self) -> str:
+        return os.path.join(self.store.root, "_state")
+
+    def _lock(self, ts_code: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(ts_code, threading.Lock())
+
+    # ------------------------------------------------------------------ 读写
+
+    def _path(self, ts_code: str) -> str:
+        return os.path.join(self.root, f"{ts_code}.parquet")
+
+    def _remember(self, ts_code: str, state: TickerState) -> TickerState:
+        with self._cache_lock:
+            key = (self.root, ts_code)
+            self._cache[key] = state
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return state
+
+    def _get(self, ts_code: str) -> Optional[TickerState]:
+        with self._cache_lock:
+            state = self._cache.get((self.root, ts_code))
+            if state is not None:
+                self._cache.move_to_end((self.root, ts_code))
+                return state
+        try:
+            table = pq.read_table(self._path(ts_code))
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b"{}"))
+        tail = table.to_pandas()
+        if self.store.fields is not None and not set(self.store.fields) <= set(tail.columns):
+            return None  # 字段集变化，重建
+        return self._remember(ts_code, TickerState(meta["as_of"], tail))
+
+    def _save(self, ts_code: str, state: TickerState) -> TickerState:
+        """写入 Parquet 并缓存读回的数据：与从存储读取的数据类型一致（如全空列为 None）。"""
+        table = pa.Table.from_pandas(state.tail.reset_index(drop=True), preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            _META_KEY: json.dumps({"as_of": state.as_of}).encode("utf-8"),
+        })
+        atomic_write(self._path(ts_code), lambda tmp_path: pq.write_table(table, tmp_path))
+        return self._remember(ts_code, TickerState(state.as_of, table.to_pandas()))
+
+    def invalidate(self, ts_code: str) -> None:
+        """删除某只股票的状态（下次分析时从存储重建）。"""
+        with self._lock(ts_code):
+            with self._cache_lock:
+                self._cache.pop((self.root, ts_code), None)
+            try:
+                os.remove(self._path(ts_code))
+            except FileNotFoundError:
+                pass
+
+    # ------------------------------------------------------------------ 建立与更新
+
+    def _build(self, part: pd.DataFrame) -> TickerState:
+        part = part.reset_index(drop=True)
+        return TickerState(str(part["trade_date"].iloc[-1]), part.tail(self.tail_days))
+
+    def _append(self, state: TickerState, part: pd.DataFrame) -> TickerState:
+        tail = pd.concat([state.tail, part], ignore_index=True).tail(self.tail_days)
+        return TickerState(str(part["trade_date"].iloc[-1]), tail)
+
+    @staticmethod
+    def _rebased(state: TickerState, part: pd.DataFrame) -> bool:
+        """新增行的复权因子变大：出现除权除息，状态中的前复权数据基准失效。"""
+        if "adj_factor" not in part.columns or "adj_factor" not in state.tail.columns:
+            return False
+        new = pd.to_numeric(part["adj_factor"], errors="coerce").max()
+        old = pd.to_numeric(state.tail["adj_factor"], errors="coerce").max()
+        return bool(new > old)
+
+    def load(self, ts_codes: List[str], trade_date: str) -> Dict[str, TickerState]:
+        """返回各股票推进到 trade_date 的状态（as_of 为不晚于 trade_date 的最后一个有数据的交易日）。
+
+        状态已晚于 trade_date（查询历史日期）或存储中没有数据的股票不在返回结果中，调用方应改为直接读取存储。
+        """
+        ts_codes = list(dict.fromkeys(ts_codes))
+        states: Dict[str, TickerState] = {}
+        rebuild: List[str] = []
+        updates: Dict[str, List[str]] = {}
+
+        with ExitStack() as stack:
+            # 按固定顺序加锁，避免并发批量请求互相死锁
+            for ts_code in sorted(ts_codes):
+                stack.enter_context(self._lock(ts_code))
+
+            for code in ts_codes:
+                state = self._get(code)
+                if state is not None and state.as_of > trade_date:
+                    continue
+                if state is None:
+                    rebuild.append(code)
+                    continue
+                states[code] = state
+                if state.as_of < trade_date:
+                    updates.setdefault(state.as_of, []).append(code)
+            stats.record_cache("indicator_state", len(ts_codes) - len(rebuild), len(rebuild))
+
+            # 增量更新：as_of 相同的股票合并为一次存储读取，只读取 as_of 之后的新行
+            for as_of, codes in updates.items():
+                df = self.store.load_many(codes, _shift_day(as_of, 1), trade_date)
+                groups = dict(tuple(df.groupby("ts_code", sort=False))) if not df.empty else {}
+                for code in codes:
+                    part = groups.get(code)
+                    if part is None:
+                        continue  # 停牌等：没有新行，状态不变
+                    if self._rebased(states[code], part):
+                        # 存储在读取新行时已重新拉取该股票的前复权历史，从存储重建状态
+                        states.pop(code)
+                        rebuild.append(code)
+                        continue
+                    states[code] = self._save(code, self._append(states[code], part))
+
+            # 重建：一次存储读取回看窗口
+            if rebuild:
+                start = self.calendar.window_start(trade_date, self.tail_days)
+                df = self.store.load_many(rebuild, start, trade_date)
+                groups = dict(tuple(df.groupby("ts_code", sort=False))) if not df.empty else {}
+                for code in rebuild:
+                    part = groups.get(code)
+                    if part is not None:
+                        states[code] = self._save(code, self._build(part))
+        return states
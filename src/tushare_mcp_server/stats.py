@@ -0,0 +1,289 @@
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+# 每个工具/接口保留最近多少次调用的耗时用于计算分位数：可通过环境变量 TUSHARE_STATS_WINDOW 覆盖
+STATS_WINDOW = int(os.getenv("TUSHARE_STATS_WINDOW", "1000"))
+
+# 设置后每次工具调用的度量按 JSON 行追加写入该文件
+STATS_FILE = os.getenv("TUSHARE_STATS_FILE", "")
+
+
+class Series:
+    """一组样本的累计值与最近 STATS_WINDOW 个样本的分位数。"""
+
+    def __init__(self, window: int = STATS_WINDOW) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent: Deque[float] = deque(maxlen=max(1, window))
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self._recent.append(value)
+
+    def summary(self, scale: float = 1.0, digits: int = 1) -> Dict[str, float]:
+        recent = sorted(self._recent)
+
+        def pct(p: float) -> float:
+            if not recent:
+                return 0.0
+            # 最近秩法：第 ceil(p * n) 个样本
+            index = min(len(recent), max(1, math.ceil(p * len(recent)))) - 1
+            return round(recent[index] * scale, digits)
+
+        return {
+            "avg": round(self.total / self.count * scale, digits) if self.count else 0.0,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": round(self.max * scale, digits),
+        }
+
+
+class CallMetrics:
+    """一次工具调用的度量：上游调用次数、取数/序列化耗时、行数与缓存命中。
+
+    取数可能在分页线程中并发进行，fetch 按“有取数在途”的墙钟时间累计，不会超过总耗时。
+    """
+
+    def __init__(self, tool: str) -> None:
+        self.tool = tool
+        self.upstream_calls = 0
+        self.fetch = 0.0
+        self.serialize = 0.0
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._in_fetch = 0
+        self._fetch_since = 0.0
+        self._lock = threading.Lock()
+
+
+class ToolStats:
+    def __init__(self) -> None:
+        self.errors = 0
+        self.upstream_calls = 0
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latency = Series()
+        self.fetch = Series()
+        self.compute = Series()
+        self.serialize = Series()
+        self.output_bytes = Series()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "calls": self.latency.count,
+            "errors": self.errors,
+            "total_ms": round(self.latency.total * 1e3, 1),
+            "latency_ms": self.latency.summary(1e3),
+            "fetch_ms": self.fetch.summary(1e3),
+            "compute_ms": self.compute.summary(1e3),
+            "serialize_ms": self.serialize.summary(1e3),
+            "upstream_calls": self.upstream_calls,
+            "rows": self.rows,
+            "output_bytes": self.output_bytes.summary(digits=0),
+            "cache_hit_ratio": round(self.cache_hits / lookups, 3) if lookups else None,
+        }
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.errors = 0
+        self.rows = 0
+        self.latency = Series()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.latency.count,
+            "errors": self.errors,
+            "total_ms": round(self.latency.total * 1e3, 1),
+            "latency_ms": self.latency.summary(1e3),
+            "rows": self.rows,
+        }
+
+
+_current: ContextVar[Optional[CallMetrics]] = ContextVar("tushare_call_metrics", default=None)
+
+_tools: Dict[str, ToolStats] = {}
+_endpoints: Dict[str, EndpointStats] = {}
+_caches: Dict[str, List[int]] = {}
+_guard = threading.Lock()
+_started = time.time()
+
+
+def _output_bytes(result: Any) -> int:
+    if not isinstance(result, str):
+        return 0
+    # 纯 ASCII 字符串（CPython 中 O(1) 判断）的字节数等于长度，不必编码
+    return len(result) if result.isascii() else len(result.encode("utf-8"))
+
+
+def track_tool(name: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """执行一次工具调用并记录度量（在工作线程中调用）。"""
+    metrics = CallMetrics(name)
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    result: Any = None
+    try:
+        result = fn(*args, **kwargs)
+        return result
+    finally:
+        elapsed = time.perf_counter() - start
+        _current.reset(token)
+        error = result is None or (isinstance(result, str) and result.startswith('{"error"'))
+        _record_tool(metrics, elapsed, _output_bytes(result), error)
+
+
+def _record_tool(metrics: CallMetrics, elapsed: float, output_bytes: int, error: bool) -> None:
+    compute = max(0.0, elapsed - metrics.fetch - metrics.serialize)
+    with _guard:
+        stats = _tools.get(metrics.tool)
+        if stats is None:
+            stats = _tools[metrics.tool] = ToolStats()
+        stats.errors += int(error)
+        stats.upstream_calls += metrics.upstream_calls
+        stats.rows += metrics.rows
+        stats.cache_hits += metrics.cache_hits
+        stats.cache_misses += metrics.cache_misses
+        stats.latency.add(elapsed)
+        stats.fetch.add(metrics.fetch)
+        stats.compute.add(compute)
+        stats.serialize.add(metrics.serialize)
+        stats.output_bytes.add(output_bytes)
+
+    if STATS_FILE:
+        line = json.dumps({
+            "ts": round(time.time(), 3),
+            "tool": metrics.tool,
+            "error": error,
+            "latency_ms": round(elapsed * 1e3, 2),
+            "fetch_ms": round(metrics.fetch * 1e3, 2),
+            "compute_ms": round(compute * 1e3, 2),
+            "serialize_ms": round(metrics.serialize * 1e3, 2),
+            "upstream_calls": metrics.upstream_calls,
+            "rows": metrics.rows,
+            "output_bytes": output_bytes,
+            "cache_hits": metrics.cache_hits,
+            "cache_misses": metrics.cache_misses,
+        })
+        with _guard:
+            with open(STATS_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+@contextmanager
+def fetching() -> Iterator[None]:
+    """标记一段取数时间，计入当前工具调用的 fetch 耗时。"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with metrics._lock:
+        if metrics._in_fetch == 0:
+            metrics._fetch_since = time.perf_counter()
+        metrics._in_fetch += 1
+    try:
+        yield
+    finally:
+        with metrics._lock:
+            metrics._in_fetch -= 1
+            if metrics._in_fetch == 0:
+                metrics.fetch += time.perf_counter() - metrics._fetch_since
+
+
+@contextmanager
+def serializing() -> Iterator[None]:
+    """标记一段序列化时间，计入当前工具调用的 serialize 耗时。"""
+    metrics = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            with metrics._lock:
+                metrics.serialize += time.perf_counter() - start
+
+
+def record_upstream() -> None:
+    """记录一次实际发出的上游请求（含分页和重试）。"""
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.upstream_calls += 1
+
+
+def record_endpoint(api_name: str, elapsed: float, rows: int, error: bool = False) -> None:
+    """记录一次接口调用（分页合并后）的耗时与行数。"""
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.rows += rows
+    with _guard:
+        stats = _endpoints.get(api_name)
+        if stats is None:
+            stats = _endpoints[api_name] = EndpointStats()
+        stats.errors += int(error)
+        stats.rows += rows
+        stats.latency.add(elapsed)
+
+
+def record_cache(name: str, hits: int, misses: int) -> None:
+    """记录本地缓存 name 的命中与未命中次数。"""
+    if not hits and not misses:
+        return
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.cache_hits += hits
+            metrics.cache_misses += misses
+    with _guard:
+        counts = _caches.setdefault(name, [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+
+
+def snapshot() -> Dict[str, Any]:
+    """全部统计：工具按累计耗时降序排列，便于找出占用时间最多的工具。"""
+    with _guard:
+        tools = {name: s.snapshot() for name, s in _tools.items()}
+        endpoints = {name: s.snapshot() for name, s in _endpoints.items()}
+        caches = {
+            name: {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+            for name, (hits, misses) in sorted(_caches.items())
+        }
+    return {
+        "uptime_s": round(time.time() - _started, 1),
+        "window": STATS_WINDOW,
+        "tools": dict(sorted(tools.items(), key=lambda kv: -kv[1]["total_ms"])),
+        "endpoints": dict(sorted(endpoints.items(), key=lambda kv: -kv[1]["total_ms"])),
+        "caches": caches,
+    }
+
+
+def reset() -> None:
+    """清空全部统计。"""
+    global _started
+    with _guard:
+        _tools.clear()
+        _endpoints.clear()
+        _caches.clear()
+        _started = time.time()
@@ -0,0 +1,474 @@
+import os
+import json
+import threading
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from tushare_mcp_server import stats
+from tushare_mcp_server.common import atomic_write, cn_today
+from tushare_mcp_server.freshness import published
+
+
+# 默认存储目录：可通过环境变量 TUSHARE_STORE_DIR 覆盖
+DEFAULT_STORE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "tushare_mcp_server", "stk_factor_pro"
+)
+
+# stk_factor_pro 单次请求最多返回 10000 行
+ROW_LIMIT = 10000
+
+# 存储的接口：按 freshness.PUBLISH_TIMES 判断某个交易日的截面是否已发布完整
+API_NAME = "stk_factor_pro"
+
+# 前复权价格保留两位小数：由前复权价反推复权基准时按 1 分的误差估计范围（兼容四舍五入与截断）
+QFQ_PRICE_TICK = 0.01
+
+Interval = Tuple[str, str]
+
+
+def _shift_day(date: str, days: int) -> str:
+    return (datetime.strptime(date, "%Y%m%d") + timedelta(days=days)).strftime("%Y%m%d")
+
+
+def _clamp_date(date: str) -> str:
+    """把 20230229 这类由整数减法得到的非法日期回退到当月最后一天。"""
+    year, month, day = int(date[:4]), int(date[4:6]), int(date[6:8])
+    while day > 28:
+        try:
+            return datetime(year, month, day).strftime("%Y%m%d")
+        except ValueError:
+            day -= 1
+    return f"{year:04d}{month:02d}{day:02d}"
+
+
+def _merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """合并重叠或首尾相邻（相差一天）的日期区间。"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= _shift_day(merged[-1][1], 1):
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _qfq_base_bounds(
+    close: np.ndarray, adj_factor: np.ndarray, close_qfq: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """逐行由 close × adj_factor / close_qfq 反推的前复权基准的下界与上界，无效行为 NaN。
+
+    close_qfq 只保留两位小数，单行反推的基准有约 QFQ_PRICE_TICK / close_qfq 的相对误差
+    （低价股可达千分之几），只有区间不相交才说明基准确实不同。
+    """
+    raw = close * adj_factor
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lo = raw / (close_qfq + QFQ_PRICE_TICK)
+        hi = np.where(close_qfq > QFQ_PRICE_TICK, raw / (close_qfq - QFQ_PRICE_TICK), np.inf)
+    invalid = ~(np.isfinite(raw) & (raw > 0) & np.isfinite(close_qfq) & (close_qfq > 0))
+    lo[invalid] = np.nan
+    hi[invalid] = np.nan
+    return lo, hi
+
+
+def _qfq_base(df: pd.DataFrame) -> Optional[Tuple[float, float]]:
+    """df 中前复权价格的复权基准（拉取时的最新复权因子）的取值范围 (下界, 上界)。
+
+    前复权价 = 原始价 × 复权因子 / 基准，同一次拉取的各行基准相同，取各行范围的交集。
+    缺少 close、adj_factor、close_qfq 任一列或没有有效行时返回 None。
+    """
+    if df.empty or not {"close", "adj_factor", "close_qfq"} <= set(df.columns):
+        return None
+    lo, hi = _qfq_base_bounds(*(
+        pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+        for name in ("close", "adj_factor", "close_qfq")
+    ))
+    valid = ~np.isnan(lo)
+    if not valid.any():
+        return None
+    lo, hi = lo[valid], hi[valid]
+    if lo.max() <= hi.min():
+        return float(lo.max()), float(hi.min())
+    # 各行范围没有交集（价格并非按两位小数舍入）：取并集，不据此判断基准变化
+    return float(lo.min()), float(hi.max())
+
+
+def _same_base(a: Optional[Tuple[float, float]], b: Optional[Tuple[float, float]]) -> bool:
+    """两个前复权基准的取值范围是否可能是同一基准（范围相交，或任一未知）。"""
+    return a is None or b is None or (a[0] <= b[1] and b[0] <= a[1])
+
+
+def _missing_intervals(covered: List[Interval], start: str, end: str) -> List[Interval]:
+    """返回 [start, end] 中尚未被 covered 覆盖的区间。"""
+    gaps: List[Interval] = []
+    cursor = start
+    for c_start, c_end in covered:
+        if c_end < cursor:
+            continue
+        if c_start > end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, _shift_day(c_start, -1)))
+        cursor = max(cursor, _shift_day(c_end, 1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class FactorStore:
+    """stk_factor_pro 历史数据的本地列式存储（按 ts_code 分区的 Parquet 文件）。
+
+    每只股票对应一个 ``<ts_code>.parquet`` 数据文件和一个 ``<ts_code>.json``
+    覆盖区间文件。读取时只向 Tushare 请求尚未覆盖的日期缺口，已拉取过的区间
+    直接从本地磁盘读取。全市场截面另存于 ``_trade_date/<trade_date>.parquet``。
+
+    前复权（_qfq）字段以拉取时的最新复权因子为基准：新拉取的缺口（无论早于还是晚于已存区间）
+    与已存数据的基准不同（期间发生除权除息）时，整个已覆盖区间重新拉取，同一文件内基准一致。
+    全市场截面只在该交易日的数据发布后（freshness.PUBLISH_TIMES）落盘，落盘后不再重新校验：
+    各截面的前复权基准可能不同，读取方需按 close × adj_factor / close_qfq 统一基准
+    （见 tech_ext._rebase_qfq）；Tushare 事后修正的历史截面不会自动更新，删除对应文件即可重新拉取。
+
+    - fetch: 实际拉取函数，签名为 ``fetch(ts_code=..., start_date=..., end_date=...)``
+      或 ``fetch(trade_date=...)``，需返回完整结果（TushareClient 会自动分页）
+    - root: 存储目录，默认 ``~/.cache/tushare_mcp_server/stk_factor_pro``
+    - fields: 只拉取并保存这些字段（会下推给 fetch）；已存数据缺少其中某些字段时视为未覆盖，
+      重新拉取。默认保存全部字段
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., pd.DataFrame],
+        root: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> None:
+        self.fetch = fetch
+        self.root = root or os.getenv("TUSHARE_STORE_DIR") or DEFAULT_STORE_DIR
+        self.fields = (
+            None if fields is None else list(dict.fromkeys(["ts_code", "trade_date", *fields]))
+        )
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    # ------------------------------------------------------------------ 路径与元数据
+
+    def _data_path(self, ts_code: str) -> str:
+        return os.path.join(self.root, f"{ts_code}.parquet")
+
+    def _meta_path(self, ts_code: str) -> str:
+        return os.path.join(self.root, f"{ts_code}.json")
+
+    def _cross_section_path(self, trade_date: str) -> str:
+        return os.path.join(self.root, "_trade_date", f"{trade_date}.parquet")
+
+    def _lock(self, ts_code: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(ts_code, threading.Lock())
+
+    def _fetch_kwargs(self) -> Dict[str, str]:
+        return {} if self.fields is None else {"fields": ",".join(self.fields)}
+
+    def _has_fields(self, stored: Optional[List[str]]) -> bool:
+        """已存数据是否包含当前需要的全部字段（stored 为 None 表示全字段）。"""
+        return self.fields is None and stored is None or (
+            self.fields is not None and (stored is None or set(self.fields) <= set(stored))
+        )
+
+    def _read_coverage(self, ts_code: str) -> List[Interval]:
+        try:
+            with open(self._meta_path(ts_code), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if not self._has_fields(meta.get("fields")):
+            return []
+        return [(s, e) for s, e in meta.get("covered", [])]
+
+    def _read_frame(self, ts_code: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        path = self._data_path(ts_code)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_parquet(path, columns=columns)
+
+    @staticmethod
+    def _write_parquet(df: pd.DataFrame, path: str) -> None:
+        atomic_write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+    def _complete(self, df: pd.DataFrame) -> pd.DataFrame:
+        """按 self.fields 取列；接口未返回的字段补空列，下次读取时不会因字段不全而重复拉取。"""
+        if self.fields is None:
+            return df
+        missing = [c for c in self.fields if c not in df.columns]
+        if missing:
+            df = df.assign(**{c: None for c in missing})
+        return df[self.fields]
+
+    def _stored_columns(self, path: str) -> Optional[List[str]]:
+        """截面文件中保存的字段；不限定字段（self.fields 为 None）时不做检查。"""
+        names = pq.read_schema(path).names
+        return None if self.fields is None else names
+
+    def _write(self, ts_code: str, df: pd.DataFrame, covered: List[Interval]) -> None:
+        self._write_parquet(df, self._data_path(ts_code))
+
+        def dump(tmp_path: str) -> None:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"covered": [list(i) for i in covered], "fields": self.fields}, f)
+
+        atomic_write(self._meta_path(ts_code), dump)
+
+    # ------------------------------------------------------------------ 对外接口
+
+    def coverage(self, ts_code: str) -> List[Interval]:
+        """返回某只股票已缓存的日期区间列表。"""
+        return self._read_coverage(ts_code)
+
+    def invalidate(self, ts_code: str) -> None:
+        """删除某只股票的本地数据。"""
+        with self._lock(ts_code):
+            for path in (self._data_path(ts_code), self._meta_path(ts_code)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def load(
+        self,
+        ts_code: str,
+        start_date: str,
+        end_date: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """读取 [start_date, end_date] 区间的数据，按 trade_date 升序返回。
+
+        本地缺失的日期缺口会先从 Tushare 拉取并写回存储。
+        """
+        return self.load_many([ts_code], start_date, end_date, columns)
+
+    def load_many(
+        self,
+        ts_codes: List[str],
+        start_date: str,
+        end_date: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """批量读取多只股票 [start_date, end_date] 区间的数据。
+
+        缺口相同的股票合并为一次逗号拼接 ts_code 的请求（按单次行数上限分块），
+        返回结果按 ts_code（保持传入顺序）、trade_date 升序排列。
+        """
+        today = cn_today()
+        start_date = _clamp_date(start_date)
+        end_date = min(_clamp_date(end_date or today), today)
+        ts_codes = list(dict.fromkeys(ts_codes))
+        if start_date > end_date or not ts_codes:
+            return pd.DataFrame()
+
+        frames: List[pd.DataFrame] = []
+        with ExitStack() as stack:
+            # 按固定顺序加锁，避免并发批量请求互相死锁
+            for ts_code in sorted(ts_codes):
+                stack.enter_context(self._lock(ts_code))
+
+            coverages = {code: self._read_coverage(code) for code in ts_codes}
+            plans: Dict[Interval, List[str]] = {}
+            misses = 0
+            for code in ts_codes:
+                gaps = _missing_intervals(coverages[code], start_date, end_date)
+                misses += bool(gaps)
+                for gap in gaps:
+                    plans.setdefault(gap, []).append(code)
+            stats.record_cache("factor_store", len(ts_codes) - misses, misses)
+
+            parts: Dict[str, List[Tuple[Interval, pd.DataFrame]]] = {}
+            for gap, codes in plans.items():
+                df = self._fetch_many(codes, gap[0], gap[1])
+                groups = dict(tuple(df.groupby("ts_code", sort=False))) if not df.empty else {}
+                for code in codes:
+                    parts.setdefault(code, []).append((gap, groups.get(code, pd.DataFrame())))
+
+            read_columns = (
+                None if columns is None else list(dict.fromkeys(["trade_date", *columns]))
+            )
+            for code in ts_codes:
+                if code in parts:
+                    df = self._merge(code, coverages[code], parts[code], today)
+                else:
+                    df = self._read_frame(code, read_columns)
+                if df.empty:
+                    continue
+                df = df[(df["trade_date"] >= start_date) & (df["trade_date"] <= end_date)]
+                if columns is not None:
+                    df = df[[c for c in columns if c in df.columns]]
+                frames.append(df)
+
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def load_trade_dates(
+        self,
+        trade_dates: List[str],
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """读取若干交易日的全市场截面，按 trade_date、ts_code 升序返回。
+
+        每个交易日只向 Tushare 请求一次 ``fetch(trade_date=...)``，结果按日期
+        落盘；尚未发布完整（返回为空或未到发布时间）的交易日不写入，下次读取时重新拉取。
+        """
+        read_columns = (
+            None if columns is None else list(dict.fromkeys(["ts_code", "trade_date", *columns]))
+        )
+        frames: List[pd.DataFrame] = []
+        hits = misses = 0
+        for trade_date in sorted(set(trade_dates)):
+            path = self._cross_section_path(trade_date)
+            with self._lock(f"_trade_date/{trade_date}"):
+                if os.path.exists(path) and self._has_fields(self._stored_columns(path)):
+                    hits += 1
+                    df = pd.read_parquet(path, columns=read_columns)
+                else:
+                    misses += 1
+                    df = self.fetch(trade_date=trade_date, **self._fetch_kwargs())
+                    if df is None or df.empty:
+                        continue
+                    df = self._complete(df)
+                    if published(API_NAME, trade_date):
+                        self._write_parquet(df, path)
+                    if read_columns is not None:
+                        df = df[[c for c in read_columns if c in df.columns]]
+            if not df.empty:
+                frames.append(df)
+        stats.record_cache("cross_section", hits, misses)
+
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        return df.sort_values(["trade_date", "ts_code"], kind="stable").reset_index(drop=True)
+
+    def ingest(
+        self,
+        ts_codes: List[str],
+        start_date: str,
+        end_date: Optional[str],
+        df: pd.DataFrame,
+    ) -> None:
+        """把外部已拉取的 [start_date, end_date] 区间数据并入存储，之后读取该区间不再请求 Tushare。
+
+        df 需按 self.fields 拉取（如原始 stk_factor_pro 工具的结果）；ts_codes 中没有
+        返回数据的股票（停牌、未上市）同样记为已覆盖，与 load_many 的拉取结果一致。
+        """
+        today = cn_today()
+        start_date = _clamp_date(start_date)
+        end_date = min(_clamp_date(end_date or today), today)
+        ts_codes = list(dict.fromkeys(ts_codes))
+        if start_date > end_date or not ts_codes:
+            return
+
+        groups = dict(tuple(df.groupby("ts_code", sort=False))) if not df.empty else {}
+        with ExitStack() as stack:
+            for ts_code in sorted(ts_codes):
+                stack.enter_context(self._lock(ts_code))
+            for code in ts_codes:
+                part = groups.get(code)
+                part = pd.DataFrame() if part is None else self._complete(part)
+                self._merge(code, self._read_coverage(code), [((start_date, end_date), part)], today)
+
+    def ingest_trade_date(self, trade_date: str, df: pd.DataFrame) -> None:
+        """把外部已拉取的某个交易日全市场截面写入存储（df 需按 self.fields 拉取）。"""
+        if df is None or df.empty or not published(API_NAME, trade_date):
+            return
+        with self._lock(f"_trade_date/{trade_date}"):
+            self._write_parquet(self._complete(df), self._cross_section_path(trade_date))
+
+    def _fetch_many(self, ts_codes: List[str], start_date: str, end_date: str) -> pd.DataFrame:
+        """拉取一组股票在同一日期区间的数据。
+
+        按估算行数把股票分批，使每次请求尽量不超过单次行数上限；
+        估算偏小时由 TushareClient 按 offset 自动分页补齐。
+        """
+        days = (
+            datetime.strptime(end_date, "%Y%m%d") - datetime.strptime(start_date, "%Y%m%d")
+        ).days + 1
+        # A股约 66% 的自然日为交易日，留一些余量估算每只股票的行数来切分批次
+        per_code = max(1, int(days * 0.7) + 1)
+        chunk = max(1, ROW_LIMIT // per_code)
+        frames = []
+        for i in range(0, len(ts_codes), chunk):
+            codes = ts_codes[i:i + chunk]
+            df = self.fetch(
+                ts_code=",".join(codes),
+                start_date=start_date,
+                end_date=end_date,
+                **self._fetch_kwargs(),
+            )
+            if df is not None and not df.empty:
+                frames.append(df)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def _merge(
+        self,
+        ts_code: str,
+        covered: List[Interval],
+        parts: List[Tuple[Interval, pd.DataFrame]],
+        today: str,
+    ) -> pd.DataFrame:
+        """把新拉取的缺口数据并入本地文件，返回合并后的完整数据。"""
+        cached = self._read_frame(ts_code)
+        if not covered:
+            # 无有效覆盖（新股票或字段集变化）：旧数据缺字段，不再沿用
+            cached = pd.DataFrame()
+        cached_adj = (
+            cached["adj_factor"].max()
+            if not cached.empty and "adj_factor" in cached.columns
+            else None
+        )
+        cached_base = _qfq_base(cached)
+
+        fetched: List[pd.DataFrame] = []
+        new_covered = list(covered)
+        for (gap_start, gap_end), part in parts:
+            if not part.empty:
+                fetched.append(part)
+            # 当日数据在盘后才发布：未拿到当日行时，今天不计入已覆盖区间
+            if gap_end >= today and (part.empty or not (part["trade_date"] == today).any()):
+                gap_end = _shift_day(today, -1)
+            if gap_start <= gap_end:
+                new_covered.append((gap_start, gap_end))
+
+        fetched_adj = max(
+            (f["adj_factor"].max() for f in fetched if "adj_factor" in f.columns),
+            default=None,
+        )
+        rebased = cached_adj is not None and fetched_adj is not None and fetched_adj > cached_adj
+        # 向前回补的缺口只含较早的复权因子，需比较前复权基准才能发现期间的除权除息
+        rebased = rebased or not all(_same_base(cached_base, _qfq_base(f)) for f in fetched)
+        if rebased:
+            # 出现新的除权除息：已缓存的前复权（_qfq）数据基准失效，整体重新拉取
+            lo = min(s for s, _ in new_covered)
+            hi = max(e for _, e in new_covered)
+            cached = pd.DataFrame()
+            part = self._fetch_many([ts_code], lo, hi)
+            fetched = [part] if not part.empty else []
+            new_covered = [(lo, hi)]
+
+        frames = ([cached] if not cached.empty else []) + fetched
+        if frames:
+            df = pd.concat(frames, ignore_index=True)
+            df = (
+                df.drop_duplicates(subset="trade_date", keep="last")
+                .sort_values("trade_date")
+                .reset_index(drop=True)
+            )
+        else:
+            df = cached
+        self._write(ts_code, df, _merge_intervals(new_covered))
+        return df
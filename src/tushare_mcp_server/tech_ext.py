@@ -1,1387 +1,1413 @@
-import os
 import json
-from typing import Optional, cast, List, Dict, Any
+import warnings
+from typing import Optional, cast, List, Dict, Any, Callable, Tuple, Union
 
 import pandas as pd
 import numpy as np
-import tushare as ts
-from dotenv import load_dotenv
-from mcp.server.fastmcp import FastMCP
 
-# Load Tushare token: prefer env var, fallback to .env
-token = os.getenv("TUSHARE_TOKEN")
-if not token:
-    load_dotenv()
-    token = os.getenv("TUSHARE_TOKEN")
-if not token:
-    raise RuntimeError("Missing TUSHARE_TOKEN. Set env or .env before running.")
+# 以脚本方式运行时没有包上下文，使用绝对导入
+from tushare_mcp_server.app import pro, trade_calendar
+from tushare_mcp_server.client import PRIORITY_BULK, priority, select_fields
+from tushare_mcp_server.serialize import dumps
+from tushare_mcp_server.dossier import DOSSIER_DAYS, dossier_sections, gather
+from tushare_mcp_server.industry import INDUSTRY_LEVELS, RANK_METRICS, IndustryRanks
+from tushare_mcp_server.state import IndicatorState
+from tushare_mcp_server.common import cn_today
+from tushare_mcp_server.store import FactorStore, _qfq_base_bounds
+from tushare_mcp_server.valuation_index import TickerIndex, ValuationIndex, sorted_percentile
 
-ts.set_token(token)
-pro = ts.pro_api()
+# 各分析工具实际读取的 stk_factor_pro 字段：只拉取、只读取这些列
+TREND_FIELDS = [
+    "close_qfq", "ma_qfq_5", "ma_qfq_20", "macd_dif_qfq", "macd_dea_qfq", "macd_qfq", "mtm_qfq",
+]
+SENTIMENT_FIELDS = [
+    "turnover_rate_f", "turnover_rate", "volume_ratio", "obv_qfq",
+    "brar_ar_qfq", "brar_br_qfq", "vr_qfq", "mfi_qfq", "psy_qfq",
+]
+VALUATION_FIELDS = ["pe", "pe_ttm", "pb", "ps", "ps_ttm", "dv_ratio", "dv_ttm", "total_mv"]
+OSCILLATOR_FIELDS = [
+    "rsi_qfq_6", "rsi_qfq_12", "kdj_k_qfq", "kdj_d_qfq", "wr1_qfq", "wr_qfq",
+    "bias1_qfq", "bias2_qfq", "bias3_qfq", "cci_qfq",
+]
+VOLATILITY_FIELDS = [
+    "atr_qfq", "close_qfq", "high_qfq", "low_qfq", "boll_upper_qfq", "boll_mid_qfq",
+    "boll_lower_qfq", "mass_qfq", "ktn_upper_qfq", "ktn_down_qfq", "topdays", "lowdays",
+]
+# 全市场扫描可用作排序依据的字段
+RANK_FIELDS = [
+    "pct_chg", "close", "vol", "amount", "turnover_rate", "turnover_rate_f", "volume_ratio",
+    "total_mv", "circ_mv", "pe_ttm", "pb",
+]
+# 本地存储保存的字段：各分析工具所需字段的并集，外加除权检测与复权基准换算用的 close、adj_factor
+FACTOR_FIELDS = list(dict.fromkeys([
+    "close", "adj_factor",
+    *TREND_FIELDS, *SENTIMENT_FIELDS, *VALUATION_FIELDS, *OSCILLATOR_FIELDS, *VOLATILITY_FIELDS,
+    *RANK_FIELDS,
+]))
 
-# 使用相同的 MCP 实例或者创建新的实例
-# 如果要使用相同的实例，需要在 server.py 中导入这些工具
-mcp = FastMCP("Tushare Tech Extension")
+# 各规则集需要的交易日数（含目标日）
+TREND_LOOKBACK = 20  # 趋势强度使用近20日相对MACD分位
+SENTIMENT_LOOKBACK = 2  # OBV 与前一交易日比较
+OSCILLATOR_LOOKBACK = 2  # KDJ 交叉与前一交易日比较
+VOLATILITY_LOOKBACK = 21  # ATR 20日均值、前20日高低点
+VALUATION_LOOKBACK = 1250  # 估值分位使用近5年历史
+# 单日分析的增量状态保留的近期交易日数：覆盖趋势、情绪量能、震荡、波动率规则集的回看窗口
+STATE_TAIL_DAYS = max(TREND_LOOKBACK, SENTIMENT_LOOKBACK, OSCILLATOR_LOOKBACK, VOLATILITY_LOOKBACK)
+# 估值分位使用的历史字段 -> 是否允许 0（PE 只统计正值，PB/PS 统计非负值）
+VALUATION_RANKED = {"pe_ttm": False, "pe": False, "pb": True, "ps_ttm": True, "ps": True}
 
+# stk_factor_pro 本地列式存储：同一股票的历史只拉取一次，之后只补缺口
+factor_store = FactorStore(fetch=pro.stk_factor_pro, fields=FACTOR_FIELDS)
 
-@mcp.tool()
-def get_trend_signals(
-    ts_code: str,
+# 按股票的增量状态：短回看规则集需要的近期行，每个新交易日只追加新增的行
+indicator_state = IndicatorState(factor_store, trade_calendar, tail_days=STATE_TAIL_DAYS)
+
+# 按股票的估值历史索引：任意日期的估值分位在内存中二分查找
+valuation_index = ValuationIndex(factor_store, fields=VALUATION_FIELDS, ranked=VALUATION_RANKED)
+
+# 行业内估值排名：每个交易日一次 daily_basic 截面 + 申万行业成分，按日期缓存
+industry_ranks = IndustryRanks(
+    fetch_basic=pro.daily_basic,
+    fetch_members=pro.index_member_all,
+    unsettled_ttl=pro.cache.ttl("daily_basic"),
+)
+
+
+def _column(df: pd.DataFrame, name: str) -> np.ndarray:
+    """取数值列为 float 数组，列缺失时返回全 NaN。"""
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+
+
+def _previous(values: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """前一交易日的值；每只股票序列的第一行为 NaN。"""
+    prev = np.empty_like(values)
+    prev[0:1] = np.nan
+    prev[1:] = values[:-1]
+    prev[pos == 0] = np.nan
+    return prev
+
+
+def _labels(default: Any, n: int) -> np.ndarray:
+    out = np.empty(n, dtype=object)
+    out[:] = default
+    return out
+
+
+def _positions(df: pd.DataFrame) -> np.ndarray:
+    """每行在所属股票序列中的位置（0 表示该股票的第一行）。"""
+    if "ts_code" in df.columns:
+        return df.groupby("ts_code", sort=False).cumcount().to_numpy()
+    return np.arange(len(df))
+
+
+def _window(values: np.ndarray, pos: np.ndarray, size: int) -> np.ndarray:
+    """以每行结尾、长度为 size 的滑动窗口（不跨股票，越界处为 NaN）。"""
+    padded = np.concatenate([np.full(size - 1, np.nan), values])
+    window = np.lib.stride_tricks.sliding_window_view(padded, size)
+    inside = np.arange(size)[None, :] >= (size - 1 - np.minimum(pos, size - 1))[:, None]
+    return np.where(inside, window, np.nan)
+
+
+def _first_present(df: pd.DataFrame, names: List[str]) -> np.ndarray:
+    """按优先级逐行取第一个存在的值：只有列缺失或值为 None 时才回退，NaN 不回退。"""
+    out = np.full(len(df), np.nan)
+    pending = np.ones(len(df), dtype=bool)
+    for name in names:
+        if name not in df.columns:
+            continue
+        present = pending & np.array([v is not None for v in df[name]], dtype=bool)
+        out[present] = _column(df, name)[present]
+        pending &= ~present
+    return out
+
+
+def _build_records(
+    df: pd.DataFrame,
+    fields: Dict[str, np.ndarray],
+    rows: np.ndarray,
+    date_key: str = "trade_date",
+) -> List[Dict[str, Any]]:
+    """为 rows 指定的行生成结果字典；fields 中的数组与 rows 一一对应。"""
+    codes = df["ts_code"].to_numpy()
+    dates = df["trade_date"].to_numpy()
+    return [
+        {
+            "ts_code": str(codes[i]),
+            date_key: str(dates[i]),
+            **{name: values[k] for name, values in fields.items()},
+        }
+        for k, i in enumerate(rows)
+    ]
+
+
+def _trend_signal_fields(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """按列向量化计算 get_trend_signals 的六个字段。
+
+    df 需已按 trade_date 升序排列（多只股票时按 ts_code、trade_date 排列），
+    判断规则与逐行实现完全一致。
+    """
+    n = len(df)
+    pos = _positions(df)
+    has_prev = pos > 0
+
+    close = _column(df, "close_qfq")
+    ma5 = _column(df, "ma_qfq_5")
+    ma20 = _column(df, "ma_qfq_20")
+    dif = _column(df, "macd_dif_qfq")
+    dea = _column(df, "macd_dea_qfq")
+    macd = _column(df, "macd_qfq")
+    mtm = _column(df, "mtm_qfq")
+
+    # 字段1: price_vs_ma5 - 价格与5日均线关系（与 NaN 的比较恒为 False，等价于逐行逻辑）
+    prev_close, prev_ma5 = _previous(close, pos), _previous(ma5, pos)
+    crossing_up = has_prev & (prev_close <= prev_ma5) & (close > ma5)
+    crossing_down = has_prev & ~crossing_up & (prev_close >= prev_ma5) & (close < ma5)
+    price_vs_ma5 = np.where(close > ma5, "above", "below").astype(object)
+    price_vs_ma5[crossing_down] = "crossing_down"
+    price_vs_ma5[crossing_up] = "crossing_up"
+    price_vs_ma5[np.isnan(close) | np.isnan(ma5)] = None
+
+    # 字段2: ma5_vs_ma20 - 均线排列状态
+    ma5_vs_ma20 = np.where(ma5 > ma20, "bullish_alignment", "bearish_alignment").astype(object)
+    ma5_vs_ma20[np.isnan(ma5) | np.isnan(ma20)] = None
+
+    # 字段3: macd_status - MACD信号
+    prev_dif, prev_dea = _previous(dif, pos), _previous(dea, pos)
+    golden = has_prev & (prev_dif <= prev_dea) & (dif > dea)
+    death = has_prev & ~golden & (prev_dif >= prev_dea) & (dif < dea)
+    macd_status = _labels("recovering", n)
+    macd_status[(dif > dea) & (dif > 0)] = "positive_momentum"
+    macd_status[(dif < dea) & (dif < 0)] = "negative_momentum"
+    macd_status[death] = "death_cross"
+    macd_status[golden] = "golden_cross"
+    macd_status[np.isnan(dif) | np.isnan(dea)] = None
+
+    # 字段4: trend_direction - 综合趋势方向
+    up = (ma5 > ma20) & (close > ma5) & (dif >= dea)
+    down = ~up & (ma5 < ma20) & (close < ma5) & (dif <= dea)
+    trend_direction = _labels("sideways", n)
+    trend_direction[down] = "down"
+    trend_direction[up] = "up"
+    trend_direction[np.isnan(np.stack([close, ma5, ma20, dif, dea])).any(axis=0)] = None
+
+    # 字段5: trend_strength - 相对MACD在近20日窗口中的分位（窗口不跨股票）
+    valid = ~np.isnan(macd) & ~np.isnan(close) & (close != 0)
+    relative = np.full(n, np.nan)
+    relative[valid] = np.abs(macd[valid]) / close[valid]
+    window = _window(relative, pos, 20)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        below = (window < relative[:, None]).sum(axis=1)
+        percentile = below / (~np.isnan(window)).sum(axis=1) * 100
+    full_window = pos >= 9  # 窗口至少10天才使用分位数
+    trend_strength = _labels("moderate", n)
+    trend_strength[full_window & (percentile >= 75)] = "strong"
+    trend_strength[full_window & (percentile <= 25)] = "weak"
+    # 数据不足时回退到相对阈值：相对MACD > 1% 为强，< 0.1% 为弱
+    trend_strength[~full_window & (relative > 0.01)] = "strong"
+    trend_strength[~full_window & (relative < 0.001)] = "weak"
+    trend_strength[~valid] = None
+
+    # 字段6: momentum_change - 动量变化
+    prev_mtm = _previous(mtm, pos)
+    reversing = ((prev_mtm <= 0) & (mtm > 0)) | ((prev_mtm >= 0) & (mtm < 0))
+    momentum_change = np.where(
+        mtm > 0,
+        np.where(mtm > prev_mtm, "accelerating", "decelerating"),
+        np.where(mtm < prev_mtm, "accelerating_down", "decelerating_down"),
+    ).astype(object)
+    momentum_change[reversing] = "reversing"
+    momentum_change[~has_prev] = np.where(
+        mtm[~has_prev] > 0, "accelerating", "accelerating_down"
+    )
+    momentum_change[np.isnan(mtm)] = None
+
+    return {
+        "price_vs_ma5": price_vs_ma5,
+        "ma5_vs_ma20": ma5_vs_ma20,
+        "macd_status": macd_status,
+        "trend_direction": trend_direction,
+        "trend_strength": trend_strength,
+        "momentum_change": momentum_change,
+    }
+
+
+def _trend_signal_records(df: pd.DataFrame, since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """get_trend_signals 的逐日结果（每行一条）；since 之前的行只作为回看历史，不输出。"""
+    if df.empty:
+        return []
+    fields = _trend_signal_fields(df)
+    if since is None:
+        return _build_records(df, fields, np.arange(len(df)))
+    rows = np.flatnonzero(df["trade_date"].astype(str).to_numpy() >= since)
+    return _build_records(df, {name: values[rows] for name, values in fields.items()}, rows)
+
+
+def _sentiment_volume_fields(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """按列向量化计算 get_sentiment_volume 的七个字段。"""
+    n = len(df)
+    pos = _positions(df)
+
+    # 字段1: 换手率状态 - 优先使用自由流通换手率，缺失时回退到总换手率
+    turnover_f = _column(df, "turnover_rate_f")
+    turnover = np.where(np.isnan(turnover_f), _column(df, "turnover_rate"), turnover_f)
+    turnover_status = _labels("low_turnover", n)
+    turnover_status[turnover >= 1.0] = "normal_turnover"
+    turnover_status[turnover >= 5.0] = "high_turnover"
+    turnover_status[np.isnan(turnover)] = None
+
+    # 字段2: 量比状态 - volume_ratio < 0.8 统一视为量能不足
+    volume_ratio = _column(df, "volume_ratio")
+    volume_status = _labels("volume_dry_up", n)
+    volume_status[volume_ratio >= 0.8] = "normal_volume"
+    volume_status[volume_ratio >= 2.0] = "volume_surge"
+    volume_status[np.isnan(volume_ratio)] = None
+
+    # 字段3: OBV趋势 - 与前一交易日比较
+    obv = _column(df, "obv_qfq")
+    prev_obv = _previous(obv, pos)
+    obv_trend = _labels("flat", n)
+    obv_trend[obv > prev_obv] = "rising"
+    obv_trend[obv < prev_obv] = "falling"
+    obv_trend[np.isnan(obv) | np.isnan(prev_obv)] = "data_unavailable"
+
+    # 字段4: BRAR情绪 - 先判断极端情绪，再判断常规多空
+    ar = _column(df, "brar_ar_qfq")
+    br = _column(df, "brar_br_qfq")
+    brar_sentiment = np.where(ar > br, "bullish_sentiment", "bearish_sentiment").astype(object)
+    brar_sentiment[np.abs(ar - br) < 5] = "neutral_sentiment"
+    brar_sentiment[(br > 150) & (ar < 100)] = "overly_bearish"
+    brar_sentiment[(ar > 150) & (br < 100)] = "overly_bullish"
+    brar_sentiment[np.isnan(ar) | np.isnan(br)] = None
+
+    # 字段5: VR容量比率
+    vr = _column(df, "vr_qfq")
+    vr_status = _labels("neutral_volume", n)
+    vr_status[vr < 70] = "bearish_volume"
+    vr_status[vr > 150] = "bullish_volume"
+    vr_status[np.isnan(vr)] = None
+
+    # 字段6: MFI和PSY状态组合
+    mfi = _column(df, "mfi_qfq")
+    mfi_status = _labels("mfi_neutral", n)
+    mfi_status[mfi <= 20] = "mfi_oversold"
+    mfi_status[mfi >= 80] = "mfi_overbought"
+    mfi_status[np.isnan(mfi)] = "mfi_na"
+    psy = _column(df, "psy_qfq")
+    psy_status = _labels("psy_neutral", n)
+    psy_status[psy <= 25] = "psy_oversold"
+    psy_status[psy >= 75] = "psy_overbullish"
+    psy_status[np.isnan(psy)] = "psy_na"
+    mfi_psy_status = np.array(
+        [f"{m}_{p}" for m, p in zip(mfi_status, psy_status)], dtype=object
+    ).reshape(n)
+    mfi_psy_status[np.isnan(mfi) & np.isnan(psy)] = "mfi_psy_unavailable"
+
+    # 字段7: 综合市场情绪
+    active = (turnover_status == "high_turnover") | (volume_status == "volume_surge")
+    strongly_bullish = (
+        active
+        & (obv_trend == "rising")
+        & np.isin(brar_sentiment, ["bullish_sentiment", "overly_bullish"])
+        & (vr_status == "bullish_volume")
+    )
+    strongly_bearish = (
+        active
+        & (obv_trend == "falling")
+        & np.isin(brar_sentiment, ["bearish_sentiment", "overly_bearish"])
+        & (vr_status == "bearish_volume")
+    )
+    apathetic = (
+        (turnover_status == "low_turnover")
+        & (volume_status == "volume_dry_up")
+        & np.isin(obv_trend, ["flat", "data_unavailable"])
+    )
+    market_sentiment = _labels("neutral", n)
+    market_sentiment[apathetic] = "apathetic"
+    market_sentiment[strongly_bearish & ~strongly_bullish] = "strongly_bearish"
+    market_sentiment[strongly_bullish] = "strongly_bullish"
+
+    return {
+        "turnover_status": turnover_status,
+        "volume_status": volume_status,
+        "obv_trend": obv_trend,
+        "brar_sentiment": brar_sentiment,
+        "vr_status": vr_status,
+        "mfi_psy_status": mfi_psy_status,
+        "market_sentiment": market_sentiment,
+    }
+
+
+def _oscillator_fields(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """按列向量化计算 get_oscillator_signals 的六个字段。"""
+    n = len(df)
+    pos = _positions(df)
+
+    # 字段1: RSI状态 - 优先RSI6，缺失时回退到RSI12（阈值放宽）
+    rsi_6 = _column(df, "rsi_qfq_6")
+    rsi_12 = _column(df, "rsi_qfq_12")
+    use_6 = ~np.isnan(rsi_6)
+    rsi_status = _labels("neutral", n)
+    rsi_status[(use_6 & (rsi_6 >= 70)) | (~use_6 & (rsi_12 >= 75))] = "overbought"
+    rsi_status[(use_6 & (rsi_6 <= 30)) | (~use_6 & (rsi_12 <= 25))] = "oversold"
+    rsi_status[np.isnan(rsi_6) & np.isnan(rsi_12)] = None
+
+    # 字段2: KDJ综合信号 - 交叉优先，非交叉日判断超买超卖
+    k = _column(df, "kdj_k_qfq")
+    d = _column(df, "kdj_d_qfq")
+    prev_k, prev_d = _previous(k, pos), _previous(d, pos)
+    bullish_cross = (prev_k <= prev_d) & (k > d)
+    bearish_cross = ~bullish_cross & (prev_k >= prev_d) & (k < d)
+    kdj_status = _labels("neutral", n)
+    kdj_status[k < 20] = "oversold_opportunity"
+    kdj_status[k > 80] = "overbought_risk"
+    kdj_status[bearish_cross] = np.where(
+        k[bearish_cross] > 50, "bearish_crossover_in_overbought", "bearish_crossover"
+    )
+    kdj_status[bullish_cross] = np.where(
+        k[bullish_cross] < 50, "bullish_crossover_in_oversold", "bullish_crossover"
+    )
+    kdj_status[np.isnan(k) | np.isnan(d)] = None
+
+    # 字段3: 威廉指标 - 优先WR1（N=6），缺失时回退到WR（N=10）
+    wr1 = _column(df, "wr1_qfq")
+    wr = np.where(np.isnan(wr1), _column(df, "wr_qfq"), wr1)
+    williams_r_status = _labels("neutral", n)
+    williams_r_status[wr <= -80] = "oversold"
+    williams_r_status[wr >= -20] = "overbought"
+    williams_r_status[np.isnan(wr)] = None
+
+    # 字段4: BIAS乖离率 - 依次使用6日/12日/24日乖离率
+    bias1 = _column(df, "bias1_qfq")
+    bias2 = _column(df, "bias2_qfq")
+    bias3 = _column(df, "bias3_qfq")
+    use_1 = ~np.isnan(bias1)
+    use_2 = ~use_1 & ~np.isnan(bias2)
+    use_3 = ~use_1 & ~use_2 & ~np.isnan(bias3)
+    bias_status = _labels("normal_deviation", n)
+    bias_status[(use_1 & (bias1 > 5.0)) | (use_2 & (bias2 > 6.0)) | (use_3 & (bias3 > 7.0))] = (
+        "high_positive_deviation"
+    )
+    bias_status[(use_1 & (bias1 < -5.0)) | (use_2 & (bias2 < -6.0)) | (use_3 & (bias3 < -7.0))] = (
+        "high_negative_deviation"
+    )
+
+    # 字段5: CCI状态
+    cci = _column(df, "cci_qfq")
+    cci_status = _labels("normal_range", n)
+    cci_status[cci > 100] = "overbought_or_breakout"
+    cci_status[cci < -100] = "oversold_or_breakdown"
+    cci_status[np.isnan(cci)] = None
+
+    # 字段6: 综合反转信号 - 统计极端指标数量及多空方向
+    bullish_votes = [
+        rsi_status == "oversold",
+        np.isin(kdj_status, ["oversold_opportunity", "bullish_crossover_in_oversold", "bullish_crossover"]),
+        williams_r_status == "oversold",
+        bias_status == "high_negative_deviation",
+        cci_status == "oversold_or_breakdown",
+    ]
+    bearish_votes = [
+        rsi_status == "overbought",
+        np.isin(kdj_status, ["overbought_risk", "bearish_crossover_in_overbought", "bearish_crossover"]),
+        williams_r_status == "overbought",
+        bias_status == "high_positive_deviation",
+        cci_status == "overbought_or_breakout",
+    ]
+    bullish_signals = np.sum(bullish_votes, axis=0)
+    bearish_signals = np.sum(bearish_votes, axis=0)
+    extreme_indicators = bullish_signals + bearish_signals
+
+    # 强信号判断使用第一个存在的乖离率列（列存在但值为 NaN 时不回退）
+    is_bias_extreme = _first_present(df, ["bias1_qfq", "bias2_qfq", "bias3_qfq"]) <= -4.0
+    has_bullish_crossover = np.isin(kdj_status, ["bullish_crossover", "bullish_crossover_in_oversold"])
+    has_bearish_crossover = np.isin(kdj_status, ["bearish_crossover", "bearish_crossover_in_overbought"])
+    strong_bullish = has_bullish_crossover & is_bias_extreme
+    strong_bearish = (
+        ~strong_bullish
+        & ~((bullish_signals >= 2) & is_bias_extreme)
+        & (bearish_signals >= 2)
+        & has_bearish_crossover
+    )
+    reversal_signal = _labels("no_significant_signal", n)
+    reversal_signal[extreme_indicators >= 2] = "moderate_reversal_risk"
+    reversal_signal[(extreme_indicators >= 2) & strong_bearish] = "strong_bearish_reversal"
+    reversal_signal[(extreme_indicators >= 2) & strong_bullish] = "strong_bullish_reversal"
+
+    return {
+        "rsi_status": rsi_status,
+        "kdj_status": kdj_status,
+        "williams_r_status": williams_r_status,
+        "bias_status": bias_status,
+        "cci_status": cci_status,
+        "reversal_signal": reversal_signal,
+    }
+
+
+def _volatility_fields(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """按列向量化计算 get_volatility_profile 的七个字段。"""
+    n = len(df)
+    pos = _positions(df)
+
+    # 字段1: ATR状态 - 近20日至少15个有效值时与均值比较，否则使用绝对阈值
+    atr = _column(df, "atr_qfq")
+    atr_window = _window(atr, pos, 20)
+    atr_count = (~np.isnan(atr_window)).sum(axis=1)
+    use_relative = (pos >= 19) & (atr_count >= 15)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_atr_20 = np.nansum(atr_window, axis=1) / atr_count
+    atr_status = _labels("normal_volatility", n)
+    atr_status[np.where(use_relative, atr > 1.5 * avg_atr_20, atr > 2.0)] = "high_volatility"
+    atr_status[np.where(use_relative, atr < 0.7 * avg_atr_20, atr < 0.5)] = "low_volatility"
+    atr_status[np.isnan(atr)] = None
+
+    # 字段2: 布林带状态 - 价格位置 + 带宽（宽/窄）
+    close = _column(df, "close_qfq")
+    boll_upper = _column(df, "boll_upper_qfq")
+    boll_lower = _column(df, "boll_lower_qfq")
+    boll_mid = _column(df, "boll_mid_qfq")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        band_width = (boll_upper - boll_lower) / boll_mid
+    wide, narrow = band_width > 0.15, band_width < 0.08
+    above, below = close >= boll_upper, ~(close >= boll_upper) & (close <= boll_lower)
+    upper_half = ~above & ~below & (close > boll_mid)
+    lower_half = ~above & ~below & ~upper_half
+    bollinger_status = _labels(None, n)
+    bollinger_status[above] = "above_upper_band"
+    bollinger_status[above & narrow] = "above_upper_with_narrow_band"
+    bollinger_status[above & wide] = "above_upper_with_wide_band"
+    bollinger_status[below] = "below_lower_band"
+    bollinger_status[below & narrow] = "below_lower_with_narrow_band"
+    bollinger_status[below & wide] = "below_lower_with_wide_band"
+    bollinger_status[upper_half] = np.where(narrow[upper_half], "upper_half_narrow_band", "upper_half")
+    bollinger_status[lower_half] = np.where(narrow[lower_half], "lower_half_narrow_band", "lower_half")
+    bollinger_status[np.isnan(np.stack([close, boll_upper, boll_lower, boll_mid])).any(axis=0)] = None
+
+    # 字段3: MASS梅斯指标 - 今日 < 27 且前日 >= 27 为反转信号
+    mass = _column(df, "mass_qfq")
+    prev_mass = _previous(mass, pos)
+    mass_status = _labels("reversal_zone", n)
+    mass_status[mass < 26.5] = "low_mass"
+    mass_status[mass > 27] = "high_mass"
+    mass_status[(mass < 27) & (prev_mass >= 27)] = "mass_reversal_signal"
+    mass_status[np.isnan(mass)] = None
+
+    # 字段4: 肯特纳通道位置
+    ktn_upper = _column(df, "ktn_upper_qfq")
+    ktn_down = _column(df, "ktn_down_qfq")
+    keltner_status = _labels("within_keltner_channel", n)
+    keltner_status[close <= ktn_down] = "below_keltner_lower"
+    keltner_status[close >= ktn_upper] = "above_keltner_upper"
+    keltner_status[np.isnan(close) | np.isnan(ktn_upper) | np.isnan(ktn_down)] = None
+
+    # 字段5: 价格极值 - 优先使用 topdays/lowdays，缺失时用前20日高低点替代
+    topdays = _column(df, "topdays")
+    lowdays = _column(df, "lowdays")
+    high = _column(df, "high_qfq")
+    low = _column(df, "low_qfq")
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # 全 NaN 窗口
+        hist_high = np.nanmax(_window(_previous(high, pos), pos, 20), axis=1)
+        hist_low = np.nanmin(_window(_previous(low, pos), pos, 20), axis=1)
+    has_days = ~np.isnan(topdays) | ~np.isnan(lowdays)
+    has_hist = ~has_days & (pos >= 20)
+    extreme_price_status = _labels("no_extreme_price", n)
+    extreme_price_status[has_hist & (high >= hist_high * 0.98)] = "near_new_high"
+    extreme_price_status[has_hist & (low < hist_low)] = "recent_new_low"
+    extreme_price_status[has_hist & (high > hist_high)] = "recent_new_high"
+    extreme_price_status[has_days & (lowdays >= 20)] = "recent_new_low"
+    extreme_price_status[has_days & (topdays >= 20)] = "recent_new_high"
+
+    # 字段6: 综合波动状态
+    bollinger_text = np.array([s or "" for s in bollinger_status], dtype=object).reshape(n)
+    is_wide_band = np.array(["wide_band" in s for s in bollinger_text], dtype=bool).reshape(n)
+    is_narrow_band = np.array(["narrow_band" in s for s in bollinger_text], dtype=bool).reshape(n)
+    is_high_vol = atr_status == "high_volatility"
+    is_low_vol = atr_status == "low_volatility"
+    is_extreme_price = np.isin(extreme_price_status, ["recent_new_high", "recent_new_low"])
+    elevated = is_high_vol & is_wide_band & is_extreme_price
+    compression = ~elevated & (is_narrow_band | (mass_status == "low_mass")) & is_low_vol
+    volatility_regime = _labels("normal_volatility", n)
+    volatility_regime[compression] = "compression_before_breakout"
+    volatility_regime[elevated] = "elevated_volatility"
+
+    # 字段7: 风险预警
+    above_upper = np.array(["above_upper" in s for s in bollinger_text], dtype=bool).reshape(n)
+    below_lower = np.array(["below_lower" in s for s in bollinger_text], dtype=bool).reshape(n)
+    high_risk = above_upper & (extreme_price_status == "recent_new_high") & is_high_vol
+    high_opportunity = ~high_risk & below_lower & (extreme_price_status == "recent_new_low") & is_high_vol
+    consolidation = ~high_risk & ~high_opportunity & is_narrow_band & is_low_vol
+    risk_warning = _labels("none", n)
+    risk_warning[consolidation] = "low_risk_consolidation"
+    risk_warning[high_opportunity] = "high_short_term_opportunity"
+    risk_warning[high_risk] = "high_short_term_risk"
+
+    return {
+        "atr_status": atr_status,
+        "bollinger_status": bollinger_status,
+        "mass_status": mass_status,
+        "keltner_status": keltner_status,
+        "extreme_price_status": extreme_price_status,
+        "volatility_regime": volatility_regime,
+        "risk_warning": risk_warning,
+    }
+
+
+def _index_percentiles(
+    indexes: List[TickerIndex],
+    windows: List[Tuple[int, int]],
+    primary: str,
+    fallback: Optional[str],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """计算每只股票估值窗口 [lo, hi)（目标日之前）的历史30/70分位数。
+
+    primary 列有效样本不足100个时改用 fallback 列；返回 (样本数, p30, p70)。
+    """
+    count = np.zeros(len(indexes), dtype=int)
+    p30 = np.full(len(indexes), np.nan)
+    p70 = np.full(len(indexes), np.nan)
+    for k, (index, (lo, hi)) in enumerate(zip(indexes, windows)):
+        for name in (primary, fallback):
+            if name is None:
+                continue
+            count[k] = index.count(name, lo, hi)
+            if count[k] >= 100:
+                hist = index.sorted_values(name, lo, hi)
+                p30[k], p70[k] = sorted_percentile(hist, 30), sorted_percentile(hist, 70)
+                break
+    return count, p30, p70
+
+
+# 估值分位：(主字段, 回退字段)
+_VALUATION_PERCENTILES = {
+    "pe": ("pe_ttm", "pe"),
+    "pb": ("pb", None),
+    "ps": ("ps_ttm", "ps"),
+}
+
+
+def _valuation_labels(
+    current: pd.DataFrame,
+    percentiles: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]],
+) -> Dict[str, np.ndarray]:
+    """由目标行与各估值指标的 (历史样本数, p30, p70) 得出六个估值字段。"""
+    n = len(current)
+
+    # 字段1: PE状态 - 优先pe_ttm，缺失时回退到pe；有足够历史时使用30/70分位
+    pe_ttm = _column(current, "pe_ttm")
+    pe = np.where(np.isnan(pe_ttm), _column(current, "pe"), pe_ttm)
+    count, p30, p70 = percentiles["pe"]
+    enough = count >= 100
+    pe_status = _labels("fair", n)
+    pe_status[np.where(enough, pe > p70, pe > 50)] = "expensive"
+    pe_status[np.where(enough, pe < p30, pe < 15)] = "cheap"
+    pe_status[pe <= 0] = "unprofitable"
+    pe_status[np.isnan(pe)] = None
+
+    # 字段2: PB状态 - 极端值优先，其次历史分位，历史不足时使用绝对阈值
+    pb = _column(current, "pb")
+    count, p30, p70 = percentiles["pb"]
+    enough = count >= 100
+    pb_status = _labels("reasonable", n)
+    pb_status[np.where(enough, pb < p30, pb < 1)] = "discount"
+    pb_status[np.where(enough, pb > p70, pb > 5)] = "high_premium"
+    pb_status[enough & (pb > 10)] = "extreme_premium"
+    pb_status[pb < 0.5] = "deep_discount"
+    pb_status[np.isnan(pb)] = None
+
+    # 字段3: 股息吸引力 - 优先dv_ttm，缺失时回退到dv_ratio
+    dv_ttm = _column(current, "dv_ttm")
+    dividend = np.where(np.isnan(dv_ttm), _column(current, "dv_ratio"), dv_ttm)
+    dividend_attractiveness = _labels("low_yield", n)
+    dividend_attractiveness[dividend >= 1.0] = "moderate"
+    dividend_attractiveness[dividend >= 3.0] = "attractive"
+    dividend_attractiveness[dividend >= 5.0] = "very_attractive"
+    dividend_attractiveness[np.isnan(dividend)] = "no_dividend"
+
+    # 字段4: PS状态 - 优先ps_ttm，缺失时回退到ps
+    ps_ttm = _column(current, "ps_ttm")
+    ps = np.where(np.isnan(ps_ttm), _column(current, "ps"), ps_ttm)
+    count, p30, p70 = percentiles["ps"]
+    enough = count >= 100
+    ps_status = _labels("fair_revenue", n)
+    ps_status[~enough & (ps < 2)] = "reasonable_revenue"
+    ps_status[~enough & (ps > 20)] = "extremely_high"
+    ps_status[enough & (ps < p30)] = "undervalued_revenue"
+    ps_status[enough & (ps > p70)] = "overvalued_revenue"
+    ps_status[np.isnan(ps)] = None
+
+    # 字段5: 市值分类（total_mv 单位：万元）
+    total_mv = _column(current, "total_mv")
+    market_cap_category = _labels("small_cap", n)
+    market_cap_category[total_mv >= 2000000] = "mid_cap"
+    market_cap_category[total_mv >= 10000000] = "large_cap"
+    market_cap_category[np.isnan(total_mv)] = "unknown"
+
+    # 字段6: 综合估值结论，优先级：亏损股 > 低估 > 高估 > 成长溢价 > 投机性 > 中性
+    has_dividend = np.isin(dividend_attractiveness, ["attractive", "very_attractive", "moderate"])
+    undervalued = (
+        ((pe_status == "cheap") | np.isin(pb_status, ["discount", "deep_discount"])
+         | (ps_status == "undervalued_revenue"))
+        & has_dividend
+        & (market_cap_category != "small_cap")
+    )
+    overvalued = (
+        ((pe_status == "expensive") & np.isin(pb_status, ["high_premium", "extreme_premium"]))
+        | ((ps_status == "overvalued_revenue") & (market_cap_category == "small_cap"))
+    )
+    growth_priced = (
+        (pe_status == "expensive")
+        & np.isin(ps_status, ["fair_revenue", "reasonable_revenue"])
+        & np.isin(market_cap_category, ["large_cap", "mid_cap"])
+    )
+    speculative = (
+        (market_cap_category == "small_cap")
+        & (pe_status == "expensive")
+        & np.isin(dividend_attractiveness, ["low_yield", "no_dividend"])
+    )
+    valuation_summary = _labels("neutral", n)
+    for mask, label in [
+        (speculative, "speculative"),
+        (growth_priced, "growth_priced"),
+        (overvalued, "overvalued"),
+        (undervalued, "undervalued"),
+        (pe_status == "unprofitable", "unprofitable"),
+    ]:
+        valuation_summary[mask] = label
+
+    return {
+        "pe_status": pe_status,
+        "pb_status": pb_status,
+        "dividend_attractiveness": dividend_attractiveness,
+        "ps_status": ps_status,
+        "market_cap_category": market_cap_category,
+        "valuation_summary": valuation_summary,
+    }
+
+
+# 全市场扫描：取各规则集中最长的回看窗口
+SCAN_LOOKBACK_DAYS = max(TREND_LOOKBACK, SENTIMENT_LOOKBACK, OSCILLATOR_LOOKBACK, VOLATILITY_LOOKBACK)
+
+# 全市场扫描可用的规则集
+_SCAN_RULES: Dict[str, Callable[[pd.DataFrame], Dict[str, np.ndarray]]] = {
+    "trend": _trend_signal_fields,
+    "sentiment": _sentiment_volume_fields,
+    "oscillator": _oscillator_fields,
+    "volatility": _volatility_fields,
+}
+
+# 各信号字段可能的取值（scan_market 据此校验筛选条件；缺失数据时字段为 null，不能作为筛选值）
+_MFI_LABELS = ("mfi_oversold", "mfi_overbought", "mfi_neutral", "mfi_na")
+_PSY_LABELS = ("psy_oversold", "psy_overbullish", "psy_neutral", "psy_na")
+SIGNAL_LABELS: Dict[str, Tuple[str, ...]] = {
+    # 趋势
+    "price_vs_ma5": ("above", "below", "crossing_up", "crossing_down"),
+    "ma5_vs_ma20": ("bullish_alignment", "bearish_alignment"),
+    "macd_status": ("golden_cross", "death_cross", "positive_momentum", "negative_momentum", "recovering"),
+    "trend_direction": ("up", "down", "sideways"),
+    "trend_strength": ("strong", "moderate", "weak"),
+    "momentum_change": (
+        "accelerating", "decelerating", "accelerating_down", "decelerating_down", "reversing",
+    ),
+    # 情绪量能
+    "turnover_status": ("high_turnover", "normal_turnover", "low_turnover"),
+    "volume_status": ("volume_surge", "normal_volume", "volume_dry_up"),
+    "obv_trend": ("rising", "falling", "flat", "data_unavailable"),
+    "brar_sentiment": (
+        "overly_bullish", "overly_bearish", "bullish_sentiment", "bearish_sentiment", "neutral_sentiment",
+    ),
+    "vr_status": ("bullish_volume", "bearish_volume", "neutral_volume"),
+    "mfi_psy_status": (
+        *(f"{m}_{p}" for m in _MFI_LABELS for p in _PSY_LABELS if (m, p) != ("mfi_na", "psy_na")),
+        "mfi_psy_unavailable",
+    ),
+    "market_sentiment": ("strongly_bullish", "strongly_bearish", "apathetic", "neutral"),
+    # 震荡指标
+    "rsi_status": ("overbought", "oversold", "neutral"),
+    "kdj_status": (
+        "bullish_crossover_in_oversold", "bullish_crossover", "bearish_crossover_in_overbought",
+        "bearish_crossover", "oversold_opportunity", "overbought_risk", "neutral",
+    ),
+    "williams_r_status": ("overbought", "oversold", "neutral"),
+    "bias_status": ("high_positive_deviation", "high_negative_deviation", "normal_deviation"),
+    "cci_status": ("overbought_or_breakout", "oversold_or_breakdown", "normal_range"),
+    "reversal_signal": (
+        "strong_bullish_reversal", "strong_bearish_reversal", "moderate_reversal_risk",
+        "no_significant_signal",
+    ),
+    # 波动率
+    "atr_status": ("high_volatility", "low_volatility", "normal_volatility"),
+    "bollinger_status": (
+        "above_upper_band", "above_upper_with_narrow_band", "above_upper_with_wide_band",
+        "below_lower_band", "below_lower_with_narrow_band", "below_lower_with_wide_band",
+        "upper_half", "upper_half_narrow_band", "lower_half", "lower_half_narrow_band",
+    ),
+    "mass_status": ("mass_reversal_signal", "high_mass", "low_mass", "reversal_zone"),
+    "keltner_status": ("above_keltner_upper", "below_keltner_lower", "within_keltner_channel"),
+    "extreme_price_status": ("recent_new_high", "recent_new_low", "near_new_high", "no_extreme_price"),
+    "volatility_regime": ("elevated_volatility", "compression_before_breakout", "normal_volatility"),
+    "risk_warning": (
+        "high_short_term_risk", "high_short_term_opportunity", "low_risk_consolidation", "none",
+    ),
+}
+
+# 技术面综合画像：短回看规则集共用一份近期数据（估值部分另取自估值索引）
+PROFILE_FIELDS = list(dict.fromkeys([
+    *TREND_FIELDS, *SENTIMENT_FIELDS, *OSCILLATOR_FIELDS, *VOLATILITY_FIELDS,
+]))
+
+# 按价格量纲前复权的列：拼接不同时间拉取的截面时需要统一到同一复权基准
+_QFQ_PRICE_COLUMNS = [
+    "close_qfq", "high_qfq", "low_qfq", "ma_qfq_5", "ma_qfq_20",
+    "macd_dif_qfq", "macd_dea_qfq", "macd_qfq", "mtm_qfq", "atr_qfq",
+    "boll_upper_qfq", "boll_mid_qfq", "boll_lower_qfq", "ktn_upper_qfq", "ktn_down_qfq",
+]
+
+
+def _rebase_qfq(df: pd.DataFrame) -> pd.DataFrame:
+    """把各行的前复权价格统一到每只股票最后一行的复权基准。
+
+    本地缓存的历史截面是在不同时间拉取的，期间发生除权除息时前复权基准不同。
+    前复权价 = 原始价 × 复权因子 / 基准，因此基准可由 close、adj_factor、close_qfq 反推。
+    """
+    close, adj_factor, close_qfq = (_column(df, name) for name in ("close", "adj_factor", "close_qfq"))
+    lo, hi = _qfq_base_bounds(close, adj_factor, close_qfq)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        base = np.where(np.isnan(lo), np.nan, close * adj_factor / close_qfq)
+
+    def last(values: np.ndarray) -> np.ndarray:
+        return pd.Series(values, index=df.index).groupby(df["ts_code"], sort=False).transform("last").to_numpy()
+
+    latest_lo, latest_hi = last(lo), last(hi)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        factor = base / last(base)
+    # 只修正基准确实变化的行：close_qfq 只保留两位小数，反推的基准范围与最后一行相交时视为同一基准
+    stale = np.isfinite(factor) & ((lo > latest_hi) | (hi < latest_lo))
+    if not stale.any():
+        return df
+    df = df.copy()
+    for name in _QFQ_PRICE_COLUMNS:
+        if name in df.columns:
+            values = _column(df, name).copy()
+            values[stale] *= factor[stale]
+            df[name] = values
+    return df
+
+
+def _parse_codes(ts_code: Union[str, List[str]]) -> Tuple[List[str], bool]:
+    """解析 ts_code 参数：列表或逗号分隔的多个代码进入批量模式。"""
+    if isinstance(ts_code, str):
+        codes = [c.strip() for c in ts_code.split(",") if c.strip()]
+        return codes, len(codes) > 1
+    return [c.strip() for c in ts_code if c.strip()], True
+
+
+def _load_factors(
+    ts_codes: List[str],
+    start_date: str,
+    end_date: Optional[str],
+    fields: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """从本地存储批量读取因子数据（只读取 fields 指定的列），按 ts_code、trade_date 排列。"""
+    columns = None if fields is None else ["ts_code", "trade_date", *fields]
+    df = factor_store.load_many(ts_codes, start_date, end_date, columns=columns)
+    if df.empty:
+        return df
+    return df.sort_values(["ts_code", "trade_date"], kind="stable").reset_index(drop=True)
+
+
+def _load_recent(
+    ts_codes: List[str],
+    start_date: str,
+    trade_date: str,
+    fields: List[str],
+) -> pd.DataFrame:
+    """读取 [start_date, trade_date]（不超过 STATE_TAIL_DAYS 个交易日）的因子数据，结果与 _load_factors 相同。
+
+    数据取自增量状态的近期行，每个新交易日每只股票只从存储读取新增的一行；
+    查询历史日期等状态不适用的股票改为直接读取存储。
+    """
+    codes = list(dict.fromkeys(ts_codes))
+    states = indicator_state.load(codes, trade_date)
+    columns = ["ts_code", "trade_date", *fields]
+    frames = []
+    for code in codes:
+        state = states.get(code)
+        if state is None:
+            continue
+        dates = state.tail["trade_date"]
+        part = state.tail[(dates >= start_date) & (dates <= trade_date)]
+        if not part.empty:
+            frames.append(part[[c for c in columns if c in part.columns]])
+    rest = [code for code in codes if code not in states]
+    if rest:
+        df = _load_factors(rest, start_date, trade_date, fields)
+        if not df.empty:
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    return df.sort_values(["ts_code", "trade_date"], kind="stable").reset_index(drop=True)
+
+
+def _analyze_on_date(
+    ts_codes: List[str],
+    trade_date: str,
+    start_date: str,
+    compute: Callable[[pd.DataFrame, np.ndarray], Dict[str, np.ndarray]],
+    fields: List[str],
+    date_key: str = "trade_date",
+    load: Callable[[List[str], str, str, List[str]], pd.DataFrame] = _load_recent,
+) -> Dict[str, Dict[str, Any]]:
+    """批量读取 [start_date, trade_date] 的数据，对每只股票在 trade_date 当日应用规则集。"""
+    df = load(ts_codes, start_date, trade_date, fields)
+    results: Dict[str, Dict[str, Any]] = {
+        code: {"error": f"未获取到 {trade_date} 附近的数据"} for code in ts_codes
+    }
+    if df.empty:
+        return results
+    for code in df["ts_code"].unique():
+        results[str(code)] = {"error": f"未获取到 {trade_date} 的数据"}
+    rows = np.flatnonzero(df["trade_date"].to_numpy() == trade_date)
+    for record in _build_records(df, compute(df, rows), rows, date_key):
+        results[record["ts_code"]] = record
+    return results
+
+
+def _load_valuation(
+    ts_codes: List[str],
+    trade_date: str,
+) -> Tuple[Dict[str, Dict[str, Any]], List[TickerIndex], List[Tuple[int, int]], pd.DataFrame]:
+    """从估值索引取各股票 trade_date 当日的估值与近5年（1250个交易日）历史窗口。
+
+    返回 (初始结果, 当日有数据的股票的索引, 对应的历史窗口, 当日估值)；
+    没有数据的股票在初始结果中为错误信息，与 _analyze_on_date 一致。
+    """
+    start_date = trade_calendar.window_start(trade_date, VALUATION_LOOKBACK)
+    indexes = valuation_index.load(ts_codes, start_date, trade_date)
+    results: Dict[str, Dict[str, Any]] = {
+        code: {"error": f"未获取到 {trade_date} 附近的数据"} for code in ts_codes
+    }
+    served: List[TickerIndex] = []
+    windows: List[Tuple[int, int]] = []
+    current: Dict[str, List[Any]] = {"ts_code": [], "trade_date": [], **{f: [] for f in VALUATION_FIELDS}}
+    for code, index in indexes.items():
+        lo, hi = index.window(start_date, trade_date)
+        row = index.row(trade_date)
+        if row is None:
+            if hi > lo:
+                results[code] = {"error": f"未获取到 {trade_date} 的数据"}
+            continue
+        served.append(index)
+        windows.append((lo, hi))
+        current["ts_code"].append(code)
+        current["trade_date"].append(trade_date)
+        for name in VALUATION_FIELDS:
+            current[name].append(index.values[name][row])
+    return results, served, windows, pd.DataFrame(current)
+
+
+def _valuation_on_date(ts_codes: List[str], trade_date: str) -> Dict[str, Dict[str, Any]]:
+    """get_valuation_metrics 的批量计算：历史分位取自估值索引，任意日期都不再逐次读取多年历史。"""
+    results, indexes, windows, current = _load_valuation(ts_codes, trade_date)
+    if indexes:
+        percentiles = {
+            key: _index_percentiles(indexes, windows, primary, fallback)
+            for key, (primary, fallback) in _VALUATION_PERCENTILES.items()
+        }
+        rows = np.arange(len(current))
+        for record in _build_records(current, _valuation_labels(current, percentiles), rows):
+            results[record["ts_code"]] = record
+    return results
+
+
+def _percentile_ranks_on_date(ts_codes: List[str], trade_date: str) -> Dict[str, Dict[str, Any]]:
+    """get_valuation_percentiles 的批量计算：当日 PE/PB/PS 在各自近5年历史中的分位。
+
+    PE、PS 优先使用 TTM，当日缺失时回退到静态值；历史有效样本不足100个或当日值无效时分位为 None。
+    """
+    results, indexes, windows, current = _load_valuation(ts_codes, trade_date)
+    for k, (index, (lo, hi)) in enumerate(zip(indexes, windows)):
+        record: Dict[str, Any] = {"ts_code": current["ts_code"].iloc[k], "trade_date": trade_date}
+        for key, (primary, fallback) in _VALUATION_PERCENTILES.items():
+            name = primary
+            if fallback is not None and np.isnan(current[primary].iloc[k]):
+                name = fallback
+            value = float(current[name].iloc[k])
+            count, below = index.rank(name, value, lo, hi)
+            valid = not np.isnan(value) and (value >= 0 if VALUATION_RANKED[name] else value > 0)
+            record[key] = None if np.isnan(value) else value
+            record[f"{key}_percentile"] = round(below / count * 100, 1) if valid and count >= 100 else None
+            record[f"{key}_history"] = count
+        results[record["ts_code"]] = record
+    return results
+
+
+def _profile_sections(df: pd.DataFrame, rows: np.ndarray) -> Dict[str, np.ndarray]:
+    """在同一份数据上应用四套短回看规则集，每套规则的结果作为一个分组（每行一个字典）。"""
+    sections: Dict[str, np.ndarray] = {}
+    for section, compute in _SCAN_RULES.items():
+        fields = {name: values[rows] for name, values in compute(df).items()}
+        grouped = np.empty(len(rows), dtype=object)
+        for k in range(len(rows)):
+            grouped[k] = {name: values[k] for name, values in fields.items()}
+        sections[section] = grouped
+    return sections
+
+
+def _profile_on_date(ts_codes: List[str], trade_date: str) -> Dict[str, Dict[str, Any]]:
+    """get_technical_profile 的批量计算：一次读取各规则集回看窗口的并集，五套规则共用。"""
+    # 先建立估值索引：冷启动时存储一次补齐近5年数据，之后的近期数据读取不再请求 Tushare
+    valuation = _valuation_on_date(ts_codes, trade_date)
+    results = _analyze_on_date(
+        ts_codes,
+        trade_date,
+        start_date=trade_calendar.window_start(trade_date, STATE_TAIL_DAYS),
+        compute=_profile_sections,
+        fields=PROFILE_FIELDS,
+    )
+    for code, record in results.items():
+        if "error" in record:
+            continue
+        result = valuation[code]
+        record["valuation"] = result if "error" in result else {
+            name: value for name, value in result.items() if name not in ("ts_code", "trade_date")
+        }
+    return results
+
+
+def _on_rows(fields: Callable[[pd.DataFrame], Dict[str, np.ndarray]]):
+    """把逐行规则集包装为只取目标行的形式。"""
+    def compute(df: pd.DataFrame, rows: np.ndarray) -> Dict[str, np.ndarray]:
+        return {name: values[rows] for name, values in fields(df).items()}
+    return compute
+
+
+def _respond(results: Dict[str, Any], ts_codes: List[str], batch: bool) -> str:
+    """单只股票返回原格式；批量模式返回以 ts_code 为键的结果映射。"""
+    if batch:
+        return dumps(results)
+    result = results[ts_codes[0]]
+    if isinstance(result, dict) and "error" in result:
+        return json.dumps(result)
+    return dumps(result)
+
+
+def fetch_factor_pro(
+    ts_code: Optional[str] = None,
     trade_date: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-) -> str:
-    """获取股票趋势信号综合分析。
-    
-    基于 stk_factor_pro 数据，提供多维度的趋势信号分析：
-    - 价格与均线关系 (price_vs_ma5)
-    - 均线排列状态 (ma5_vs_ma20) 
-    - MACD信号 (macd_status)
-    - 综合趋势方向 (trend_direction)
-    - 趋势强度 (trend_strength)
-    - 动量变化 (momentum_change)
-    
-    参数说明：
-    - ts_code: 股票代码（必需），如 000001.SZ
-    - trade_date: 交易日期，格式 YYYYMMDD
-    - start_date/end_date: 开始/结束日期，格式 YYYYMMDD
-    
-    返回格式：
-    - 单日查询（使用trade_date）：返回单个JSON对象
-    - 多日查询（使用start_date/end_date）：返回JSON对象数组
-    
-    返回示例：
-    {
-      "ts_code": "000001.SZ",
-      "trade_date": "20240115",
-      "price_vs_ma5": "above",
-      "ma5_vs_ma20": "bullish_alignment",
-      "macd_status": "positive_momentum",
-      "trend_direction": "up",
-      "trend_strength": "strong",
-      "momentum_change": "accelerating"
-    }
+    fields: Optional[str] = None,
+) -> pd.DataFrame:
+    """原始 stk_factor_pro 工具的取数：返回结果与直接调用接口相同，同时写入分析工具的本地存储。
+
+    - 按股票查询（ts_code + trade_date 或 start_date）：多取 SCAN_LOOKBACK_DAYS 个交易日的回看历史，
+      之后对同一股票做趋势、情绪量能、震荡、波动率分析不再请求 Tushare
+    - 按交易日查询全市场（只传 trade_date）：写入截面存储，供 scan_market 复用
+    - 传入 fields 时额外拉取存储所需的字段，返回前再按 fields 裁剪
     """
-    try:
-        # 获取股票因子数据
+    fetch_fields = (
+        {} if fields is None
+        else {"fields": ",".join(dict.fromkeys([*fields.split(","), *(factor_store.fields or [])]))}
+    )
+    codes = _parse_codes(ts_code)[0] if ts_code else []
+    single_day = trade_date is not None and start_date is None and end_date is None
+
+    if codes and (single_day or (trade_date is None and start_date is not None)):
+        first = trade_date or cast(str, start_date)
+        last = trade_date or end_date
+        lookback_start = trade_calendar.window_start(first, SCAN_LOOKBACK_DAYS)
         df = pro.stk_factor_pro(
+            ts_code=",".join(codes), start_date=lookback_start, end_date=last, **fetch_fields
+        )
+        factor_store.ingest(codes, lookback_start, last, df)
+        if not df.empty:
+            if trade_date is not None:
+                df = df[df["trade_date"] == trade_date]
+            else:
+                df = df[df["trade_date"] >= first]
+            df = df.reset_index(drop=True)
+    elif not codes and single_day:
+        df = pro.stk_factor_pro(trade_date=trade_date, **fetch_fields)
+        factor_store.ingest_trade_date(trade_date, df)
+    else:
+        return pro.stk_factor_pro(
             ts_code=ts_code,
             trade_date=trade_date,
             start_date=start_date,
             end_date=end_date,
+            **({"fields": fields} if fields is not None else {}),
         )
-        
-        if df.empty:
-            return json.dumps({"error": "未获取到数据"})
-        
-        # 按日期排序，确保时间序列正确
-        df = df.sort_values('trade_date').reset_index(drop=True)
-        
-        results = []
-        
-        for i in range(len(df)):
-            current_data = df.iloc[i]
-            result = {
-                "ts_code": current_data['ts_code'],
-                "trade_date": current_data['trade_date']
-            }
-            
-            # 字段1: price_vs_ma5 - 价格与5日均线关系
-            if pd.notna(current_data.get('close_qfq')) and pd.notna(current_data.get('ma_qfq_5')):
-                close = current_data['close_qfq']
-                ma5 = current_data['ma_qfq_5']
-                
-                # 检查是否有前一日数据进行穿越判断
-                if i > 0:
-                    prev_close = df.iloc[i-1]['close_qfq']
-                    prev_ma5 = df.iloc[i-1]['ma_qfq_5']
-                    
-                    # 向上穿越：前一日close ≤ ma5，当日close > ma5
-                    if prev_close <= prev_ma5 and close > ma5:
-                        result["price_vs_ma5"] = "crossing_up"
-                    # 向下穿越：前一日close ≥ ma5，当日close < ma5  
-                    elif prev_close >= prev_ma5 and close < ma5:
-                        result["price_vs_ma5"] = "crossing_down"
-                    else:
-                        # 静态位置
-                        result["price_vs_ma5"] = "above" if close > ma5 else "below"
-                else:
-                    # 第一天数据，只能判断静态位置
-                    result["price_vs_ma5"] = "above" if close > ma5 else "below"
-            else:
-                result["price_vs_ma5"] = None
-            
-            # 字段2: ma5_vs_ma20 - 均线排列状态
-            if pd.notna(current_data.get('ma_qfq_5')) and pd.notna(current_data.get('ma_qfq_20')):
-                ma5 = current_data['ma_qfq_5']
-                ma20 = current_data['ma_qfq_20']
-                result["ma5_vs_ma20"] = "bullish_alignment" if ma5 > ma20 else "bearish_alignment"
-            else:
-                result["ma5_vs_ma20"] = None
-            
-            # 字段3: macd_status - MACD信号
-            if (pd.notna(current_data.get('macd_dif_qfq')) and 
-                pd.notna(current_data.get('macd_dea_qfq'))):
-                
-                dif = current_data['macd_dif_qfq']
-                dea = current_data['macd_dea_qfq']
-                
-                # 检查是否有前一日数据进行交叉判断
-                if i > 0:
-                    prev_dif = df.iloc[i-1]['macd_dif_qfq']
-                    prev_dea = df.iloc[i-1]['macd_dea_qfq']
-                    
-                    # 金叉：前一日dif ≤ dea，当日dif > dea
-                    if prev_dif <= prev_dea and dif > dea:
-                        result["macd_status"] = "golden_cross"
-                    # 死叉：前一日dif ≥ dea，当日dif < dea
-                    elif prev_dif >= prev_dea and dif < dea:
-                        result["macd_status"] = "death_cross"
-                    else:
-                        # 非交叉日
-                        if dif > dea and dif > 0:
-                            result["macd_status"] = "positive_momentum"
-                        elif dif < dea and dif < 0:
-                            result["macd_status"] = "negative_momentum"
-                        else:
-                            result["macd_status"] = "recovering"
-                else:
-                    # 第一天数据，只能判断静态状态
-                    if dif > dea and dif > 0:
-                        result["macd_status"] = "positive_momentum"
-                    elif dif < dea and dif < 0:
-                        result["macd_status"] = "negative_momentum"
-                    else:
-                        result["macd_status"] = "recovering"
-            else:
-                result["macd_status"] = None
-            
-            # 字段4: trend_direction - 综合趋势方向
-            # 重新获取原始值（避免依赖 result 字段）
-            close = current_data.get('close_qfq')
-            ma5 = current_data.get('ma_qfq_5')
-            ma20 = current_data.get('ma_qfq_20')
-            dif = current_data.get('macd_dif_qfq')
-            dea = current_data.get('macd_dea_qfq')
-            
-            valid_for_trend = all(pd.notna(x) for x in [close, ma5, ma20, dif, dea])
-            
-            if valid_for_trend:
-                # 上涨：ma5 > ma20, price > ma5, 且 dif >= dea（允许金叉或正动量）
-                if ma5 > ma20 and close > ma5 and dif >= dea:
-                    result["trend_direction"] = "up"
-                # 下跌：ma5 < ma20, price < ma5, 且 dif <= dea
-                elif ma5 < ma20 and close < ma5 and dif <= dea:
-                    result["trend_direction"] = "down"
-                else:
-                    result["trend_direction"] = "sideways"
-            else:
-                result["trend_direction"] = None
-            
-            # 字段5: trend_strength - 趋势强度
-            # 使用相对MACD值（MACD/收盘价）避免股价绝对值影响
-            if (pd.notna(current_data.get('macd_qfq')) and 
-                pd.notna(current_data.get('close_qfq')) and 
-                current_data.get('close_qfq', 0) != 0):
-                
-                macd_hist = current_data['macd_qfq']
-                close = current_data['close_qfq']
-                relative_macd = abs(macd_hist) / close  # 相对强度
-                
-                # 计算20日窗口内的强度（如果数据足够）
-                start_idx = max(0, i-19)
-                window_data = df.iloc[start_idx:i+1]
-                
-                if len(window_data) >= 10:  # 至少需要10天数据
-                    # 计算相对MACD的历史分位数
-                    valid_window = window_data[
-                        (window_data['macd_qfq'].notna()) & 
-                        (window_data['close_qfq'].notna()) & 
-                        (window_data['close_qfq'] != 0)
-                    ]
-                    
-                    if len(valid_window) > 0:
-                        window_relative_macd = (valid_window['macd_qfq'].abs() / 
-                                              valid_window['close_qfq'])
-                        current_relative = relative_macd
-                        
-                        if len(window_relative_macd) > 0:
-                            percentile = (window_relative_macd < current_relative).mean() * 100
-                            
-                            if percentile >= 75:
-                                result["trend_strength"] = "strong"
-                            elif percentile <= 25:
-                                result["trend_strength"] = "weak"
-                            else:
-                                result["trend_strength"] = "moderate"
-                        else:
-                            result["trend_strength"] = "moderate"
-                    else:
-                        result["trend_strength"] = "moderate"
-                else:
-                    # 数据不足，使用相对阈值判断
-                    # 基于经验：相对MACD > 1% 视为强趋势，< 0.1% 视为弱趋势
-                    if relative_macd > 0.01:  # 1%
-                        result["trend_strength"] = "strong"
-                    elif relative_macd < 0.001:  # 0.1%
-                        result["trend_strength"] = "weak"
-                    else:
-                        result["trend_strength"] = "moderate"
-            else:
-                result["trend_strength"] = None
-            
-            # 字段6: momentum_change - 动量变化
-            if pd.notna(current_data.get('mtm_qfq')):
-                current_mtm = current_data['mtm_qfq']
-                
-                if i > 0:
-                    prev_mtm = df.iloc[i-1]['mtm_qfq']
-                    
-                    # 先判断动量方向是否反转（优先级最高）
-                    if (prev_mtm <= 0 and current_mtm > 0) or (prev_mtm >= 0 and current_mtm < 0):
-                        result["momentum_change"] = "reversing"
-                    elif current_mtm > 0:  # 上涨动量
-                        result["momentum_change"] = "accelerating" if current_mtm > prev_mtm else "decelerating"
-                    else:  # 下跌动量
-                        result["momentum_change"] = "accelerating_down" if current_mtm < prev_mtm else "decelerating_down"
-                else:
-                    # 第一天数据，只能判断当前状态
-                    result["momentum_change"] = "accelerating" if current_mtm > 0 else "accelerating_down"
-            else:
-                result["momentum_change"] = None
-            
-            results.append(result)
+    return select_fields(df, fields)
+
+
+# 以下为分析工具的实现：工具注册在 server.py（与原始接口共用同一个 MCP 实例和客户端），
+# 调用时才导入本模块，服务器启动时不加载 numpy/pandas
+
+
+def get_trend_signals(
+    ts_code: Union[str, List[str]],
+    trade_date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> str:
+    """get_trend_signals 工具的实现，参数与返回格式见 server.get_trend_signals。"""
+    try:
+        codes, batch = _parse_codes(ts_code)
+
+        # 获取股票因子数据：有明确日期区间时走本地存储，只补拉缺失的日期；
+        # 在输出区间之前多取 TREND_LOOKBACK-1 个交易日，使首日的交叉与趋势强度判断也有完整历史
+        since: Optional[str] = None
+        if trade_date is None and start_date is not None:
+            since = start_date
+            lookback_start = trade_calendar.window_start(start_date, TREND_LOOKBACK)
+            df = _load_factors(codes, lookback_start, end_date, TREND_FIELDS)
+        elif trade_date is not None and start_date is None and end_date is None:
+            since = trade_date
+            lookback_start = trade_calendar.window_start(trade_date, TREND_LOOKBACK)
+            df = _load_recent(codes, lookback_start, trade_date, TREND_FIELDS)
+        else:
+            df = pro.stk_factor_pro(
+                ts_code=",".join(codes),
+                trade_date=trade_date,
+                start_date=start_date,
+                end_date=end_date,
+                fields=",".join(["ts_code", "trade_date", *TREND_FIELDS]),
+            )
+            # 按日期排序，确保时间序列正确
+            if not df.empty:
+                df = df.sort_values(["ts_code", "trade_date"], kind="stable").reset_index(drop=True)
+        
+        # 没有数据时各股票都返回“未获取到数据”：批量模式仍按 ts_code 返回映射
+        records = _trend_signal_records(df, since) if not df.empty else []
         
         # 根据输入参数决定返回格式：单日查询返回单个对象，多日查询返回列表
         is_single_day = (trade_date is not None) and (start_date is None) and (end_date is None)
         
-        if is_single_day and len(results) == 1:
-            return json.dumps(results[0], ensure_ascii=False, indent=2)
-        else:
-            return json.dumps(results, ensure_ascii=False, indent=2)
+        grouped: Dict[str, List[Dict[str, Any]]] = {code: [] for code in codes}
+        for record in records:
+            grouped.setdefault(record["ts_code"], []).append(record)
+        results: Dict[str, Any] = {}
+        for code, rows in grouped.items():
+            if not rows:
+                results[code] = {"error": "未获取到数据"}
+            elif is_single_day and len(rows) == 1:
+                results[code] = rows[0]
+            else:
+                results[code] = rows
+        return _respond(results, codes, batch)
         
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
-@mcp.tool()
 def get_sentiment_volume(
-    ts_code: str,
+    ts_code: Union[str, List[str]],
     trade_date: str,
 ) -> str:
-    """获取股票市场情绪与量能综合分析。
-    
-    基于 stk_factor_pro 数据，评估股票当前的市场参与度、资金流向与情绪倾向：
-    - 换手率状态 (turnover_status)：反映股票流动性和市场关注度
-    - 量比状态 (volume_status)：衡量当前成交量相对于近期均量的放大程度
-    - OBV趋势 (obv_trend)：通过累积成交量判断资金流向
-    - BRAR情绪 (brar_sentiment)：反映多空双方力量对比
-    - VR容量比率 (vr_status)：通过涨跌日成交量对比衡量买卖力量
-    - MFI和PSY状态 (mfi_psy_status)：综合资金流量指标和心理线指标
-    - 综合市场情绪 (market_sentiment)：融合多个指标给出总体情绪倾向
-    
-    参数说明：
-    - ts_code: 股票代码（必需），如 000001.SZ
-    - trade_date: 交易日期（必需），格式 YYYYMMDD
-    
-    返回示例：
-    {
-      "ts_code": "000001.SZ",
-      "trade_date": "20240115",
-      "turnover_status": "high_turnover",
-      "volume_status": "volume_surge",
-      "obv_trend": "rising",
-      "brar_sentiment": "bullish_sentiment",
-      "vr_status": "bullish_volume",
-      "mfi_psy_status": "mfi_neutral_psy_neutral",
-      "market_sentiment": "strongly_bullish"
-    }
-    """
+    """get_sentiment_volume 工具的实现，参数与返回格式见 server.get_sentiment_volume。"""
     try:
-        # 获取包含当前日及历史数据（用于OBV趋势判断）
-        df_hist = pro.stk_factor_pro(
-            ts_code=ts_code,
-            start_date=str(int(trade_date) - 10000),  # 往前推100天
-            end_date=trade_date,
-        )
-        
-        if df_hist.empty:
-            return json.dumps({"error": f"未获取到 {trade_date} 附近的数据"})
-        
-        # 按日期排序并重置索引
-        df_hist = df_hist.sort_values('trade_date').reset_index(drop=True)
-        
-        # 找到当前交易日的位置
-        current_idx = df_hist[df_hist['trade_date'] == trade_date].index
-        if len(current_idx) == 0:
-            return json.dumps({"error": f"未获取到 {trade_date} 的数据"})
-        
-        current_idx = current_idx[0]
-        current_row = df_hist.iloc[current_idx]
-        
-        result = {
-            "ts_code": current_row['ts_code'],
-            "trade_date": current_row['trade_date']
-        }
-        
-        # ==================== 字段1: 换手率状态分析 ====================
-        turnover_rate_f = current_row.get('turnover_rate_f')  # 自由流通换手率
-        turnover_rate = current_row.get('turnover_rate')      # 总换手率
-        
-        # 优先使用自由流通换手率，更真实反映可交易股份的活跃度
-        if pd.notna(turnover_rate_f):
-            if turnover_rate_f >= 5.0:
-                result["turnover_status"] = "high_turnover"
-            elif turnover_rate_f >= 1.0:
-                result["turnover_status"] = "normal_turnover"
-            else:
-                result["turnover_status"] = "low_turnover"
-        elif pd.notna(turnover_rate):
-            # 自由流通换手率缺失，回退到总换手率
-            if turnover_rate >= 5.0:
-                result["turnover_status"] = "high_turnover"
-            elif turnover_rate >= 1.0:
-                result["turnover_status"] = "normal_turnover"
-            else:
-                result["turnover_status"] = "low_turnover"
-        else:
-            result["turnover_status"] = None
-        
-        # ==================== 字段2: 量比状态分析 ====================
-        volume_ratio = current_row.get('volume_ratio')
-        
-        if pd.notna(volume_ratio):
-            if volume_ratio >= 2.0:
-                result["volume_status"] = "volume_surge"
-            elif volume_ratio >= 0.8:
-                result["volume_status"] = "normal_volume"
-            else:
-                # volume_ratio < 0.8 统一视为量能不足
-                result["volume_status"] = "volume_dry_up"
-        else:
-            result["volume_status"] = None
-        
-        # ==================== 字段3: OBV趋势分析 ====================
-        obv_current = current_row.get('obv_qfq')
-        
-        if pd.notna(obv_current):
-            if current_idx > 0:
-                prev_row = df_hist.iloc[current_idx - 1]
-                obv_previous = prev_row.get('obv_qfq')
-                
-                if pd.notna(obv_previous):
-                    if obv_current > obv_previous:
-                        result["obv_trend"] = "rising"
-                    elif obv_current < obv_previous:
-                        result["obv_trend"] = "falling"
-                    else:
-                        result["obv_trend"] = "flat"
-                else:
-                    result["obv_trend"] = "data_unavailable"
-            else:
-                result["obv_trend"] = "data_unavailable"
-        else:
-            result["obv_trend"] = "data_unavailable"
-        
-        # ==================== 字段4: BRAR情绪分析 ====================
-        ar_value = current_row.get('brar_ar_qfq')
-        br_value = current_row.get('brar_br_qfq')
-        
-        if pd.notna(ar_value) and pd.notna(br_value):
-            # 极端情绪判断
-            if ar_value > 150 and br_value < 100:
-                result["brar_sentiment"] = "overly_bullish"
-            elif br_value > 150 and ar_value < 100:
-                result["brar_sentiment"] = "overly_bearish"
-            else:
-                # 常规情绪判断
-                if abs(ar_value - br_value) < 5:
-                    result["brar_sentiment"] = "neutral_sentiment"
-                elif ar_value > br_value:
-                    result["brar_sentiment"] = "bullish_sentiment"
-                else:
-                    result["brar_sentiment"] = "bearish_sentiment"
-        else:
-            result["brar_sentiment"] = None
-        
-        # ==================== 字段5: VR容量比率分析 ====================
-        vr_value = current_row.get('vr_qfq')
-        
-        if pd.notna(vr_value):
-            if vr_value > 150:
-                result["vr_status"] = "bullish_volume"
-            elif vr_value < 70:
-                result["vr_status"] = "bearish_volume"
-            else:
-                result["vr_status"] = "neutral_volume"
-        else:
-            result["vr_status"] = None
-        
-        # ==================== 字段6: MFI和PSY状态分析 ====================
-        mfi_value = current_row.get('mfi_qfq')
-        psy_value = current_row.get('psy_qfq')
-        
-        mfi_status = ""
-        psy_status = ""
-        
-        # MFI状态判断
-        if pd.notna(mfi_value):
-            if mfi_value >= 80:
-                mfi_status = "mfi_overbought"
-            elif mfi_value <= 20:
-                mfi_status = "mfi_oversold"
-            else:
-                mfi_status = "mfi_neutral"
-        else:
-            mfi_status = "mfi_na"
-        
-        # PSY状态判断
-        if pd.notna(psy_value):
-            if psy_value >= 75:
-                psy_status = "psy_overbullish"
-            elif psy_value <= 25:
-                psy_status = "psy_oversold"
-            else:
-                psy_status = "psy_neutral"
-        else:
-            psy_status = "psy_na"
-        
-        # 处理缺失数据的情况，使输出更清晰
-        if mfi_status == "mfi_na" and psy_status == "psy_na":
-            result["mfi_psy_status"] = "mfi_psy_unavailable"
-        elif mfi_status == "mfi_na":
-            result["mfi_psy_status"] = f"mfi_na_{psy_status}"
-        elif psy_status == "psy_na":
-            result["mfi_psy_status"] = f"{mfi_status}_psy_na"
-        else:
-            result["mfi_psy_status"] = f"{mfi_status}_{psy_status}"
-        
-        # ==================== 字段7: 综合市场情绪判断 ====================
-        # 获取各字段状态
-        turnover_status = result.get("turnover_status")
-        volume_status = result.get("volume_status")
-        obv_trend = result.get("obv_trend")
-        brar_sentiment = result.get("brar_sentiment")
-        vr_status = result.get("vr_status")
-        
-        # 强烈看涨情绪判断
-        is_strongly_bullish = (
-            (turnover_status == "high_turnover" or volume_status == "volume_surge") and
-            obv_trend == "rising" and
-            brar_sentiment in ["bullish_sentiment", "overly_bullish"] and
-            vr_status == "bullish_volume"
+        codes, batch = _parse_codes(ts_code)
+        # 获取当前日及前一交易日数据（用于OBV趋势判断）
+        results = _analyze_on_date(
+            codes,
+            trade_date,
+            start_date=trade_calendar.window_start(trade_date, SENTIMENT_LOOKBACK),
+            compute=_on_rows(_sentiment_volume_fields),
+            fields=SENTIMENT_FIELDS,
         )
+        return _respond(results, codes, batch)
         
-        # 强烈看跌情绪判断
-        is_strongly_bearish = (
-            (turnover_status == "high_turnover" or volume_status == "volume_surge") and
-            obv_trend == "falling" and
-            brar_sentiment in ["bearish_sentiment", "overly_bearish"] and
-            vr_status == "bearish_volume"
-        )
-        
-        # 冷漠情绪判断（交投清淡）
-        is_apathetic = (
-            turnover_status == "low_turnover" and
-            volume_status == "volume_dry_up" and
-            (obv_trend == "flat" or obv_trend == "data_unavailable")
-        )
-        
-        # 综合情绪判断
-        if is_strongly_bullish:
-            result["market_sentiment"] = "strongly_bullish"
-        elif is_strongly_bearish:
-            result["market_sentiment"] = "strongly_bearish"
-        elif is_apathetic:
-            result["market_sentiment"] = "apathetic"
-        else:
-            result["market_sentiment"] = "neutral"
-        
-        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+def get_valuation_metrics(
+    ts_code: Union[str, List[str]],
+    trade_date: str,
+) -> str:
+    """get_valuation_metrics 工具的实现，参数与返回格式见 server.get_valuation_metrics。"""
+    try:
+        codes, batch = _parse_codes(ts_code)
+        # 当日估值与近5年（1250个交易日）历史分位均取自估值历史索引（ValuationIndex）
+        results = _valuation_on_date(codes, trade_date)
+        return _respond(results, codes, batch)
         
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
+def get_valuation_percentiles(
+    ts_code: Union[str, List[str]],
+    trade_date: str,
+) -> str:
+    """get_valuation_percentiles 工具的实现，参数与返回格式见 server.get_valuation_percentiles。"""
+    try:
+        codes, batch = _parse_codes(ts_code)
+        results = _percentile_ranks_on_date(codes, trade_date)
+        return _respond(results, codes, batch)
 
+    except Exception as e:
+        return json.dumps({"error": str(e)})
 
 
-@mcp.tool()
-def get_valuation_metrics(
-    ts_code: str,
+def get_technical_profile(
+    ts_code: Union[str, List[str]],
     trade_date: str,
 ) -> str:
-    """获取股票估值指标综合分析。
-    
-    基于 stk_factor_pro 数据，评估股票当前的估值水平与投资性价比：
-    - PE状态 (pe_status)：基于历史分位数判断市盈率高低
-    - PB状态 (pb_status)：基于历史分位数判断市净率水平
-    - 股息吸引力 (dividend_attractiveness)：股息率绝对水平评估
-    - PS状态 (ps_status)：基于历史分位数判断市销率水平
-    - 市值分类 (market_cap_category)：按总市值规模分类
-    - 综合估值结论 (valuation_summary)：融合多个指标给出投资建议
-    
-    参数说明：
-    - ts_code: 股票代码（必需），如 000001.SZ
-    - trade_date: 交易日期（必需），格式 YYYYMMDD
-    
-    返回示例：
-    {
-      "ts_code": "000001.SZ",
-      "trade_date": "20240115",
-      "pe_status": "cheap",
-      "pb_status": "reasonable",
-      "dividend_attractiveness": "attractive",
-      "ps_status": "fair_revenue",
-      "market_cap_category": "large_cap",
-      "valuation_summary": "undervalued"
-    }
-    """
+    """get_technical_profile 工具的实现，参数与返回格式见 server.get_technical_profile。"""
     try:
-        # 获取近5年历史数据用于分位数计算（约1250个交易日）
-        df_hist = pro.stk_factor_pro(
-            ts_code=ts_code,
-            start_date=str(int(trade_date) - 50000),  # 往前推约5年
-            end_date=trade_date,
-        )
-        
-        if df_hist.empty:
-            return json.dumps({"error": f"未获取到 {trade_date} 附近的数据"})
-        
-        # 按日期排序并重置索引
-        df_hist = df_hist.sort_values('trade_date').reset_index(drop=True)
-        
-        # 找到当前交易日的位置
-        current_idx = df_hist[df_hist['trade_date'] == trade_date].index
-        if len(current_idx) == 0:
-            return json.dumps({"error": f"未获取到 {trade_date} 的数据"})
-        
-        current_idx = current_idx[0]
-        current_row = df_hist.iloc[current_idx]
-        
-        result = {
-            "ts_code": current_row['ts_code'],
-            "trade_date": current_row['trade_date']
-        }
-        
-        # ==================== 字段1: PE状态分析 ====================
-        pe_ttm_current = current_row.get('pe_ttm')
-        pe_current = current_row.get('pe')
-        
-        # 优先使用pe_ttm，缺失时回退到pe
-        pe_to_use = pe_ttm_current if pd.notna(pe_ttm_current) else pe_current
-        
-        if pd.notna(pe_to_use):
-            # 检查是否为亏损股
-            if pe_to_use <= 0:
-                result["pe_status"] = "unprofitable"
-            else:
-                # 获取历史PE序列（排除当前日，只使用前一日及之前的数据）
-                if current_idx > 0:
-                    hist_data = df_hist.iloc[:current_idx]  # 0 到 current_idx-1
-                    hist_pe = hist_data[
-                        (hist_data['pe_ttm'].notna()) & (hist_data['pe_ttm'] > 0)
-                    ]['pe_ttm']
-                    
-                    # 如果pe_ttm历史数据不足，尝试使用pe
-                    if len(hist_pe) < 100:
-                        hist_pe = hist_data[
-                            (hist_data['pe'].notna()) & (hist_data['pe'] > 0)
-                        ]['pe']
-                else:
-                    hist_pe = pd.Series([], dtype=float)  # 当前日为第一天，无历史数据
-                
-                if len(hist_pe) >= 100:  # 有足够历史数据
-                    # 计算历史分位数
-                    percentile_30 = np.percentile(hist_pe, 30)
-                    percentile_70 = np.percentile(hist_pe, 70)
-                    
-                    if pe_to_use > percentile_70:
-                        result["pe_status"] = "expensive"
-                    elif pe_to_use < percentile_30:
-                        result["pe_status"] = "cheap"
-                    else:
-                        result["pe_status"] = "fair"
-                else:
-                    # 历史数据不足，使用绝对阈值
-                    if pe_to_use > 50:
-                        result["pe_status"] = "expensive"
-                    elif pe_to_use < 15:
-                        result["pe_status"] = "cheap"
-                    else:
-                        result["pe_status"] = "fair"
-        else:
-            result["pe_status"] = None  # 数据缺失，不判断
-        
-        # ==================== 字段2: PB状态分析 ====================
-        pb_current = current_row.get('pb')
-        
-        if pd.notna(pb_current):
-            # 获取历史PB序列（排除当前日，只使用前一日及之前的数据，并过滤负值）
-            if current_idx > 0:
-                hist_data = df_hist.iloc[:current_idx]  # 0 到 current_idx-1
-                hist_pb = hist_data[
-                    (hist_data['pb'].notna()) & (hist_data['pb'] >= 0)
-                ]['pb']
-            else:
-                hist_pb = pd.Series([], dtype=float)  # 当前日为第一天，无历史数据
-            
-            if len(hist_pb) >= 100:  # 有足够历史数据
-                # 计算历史分位数
-                percentile_30 = np.percentile(hist_pb, 30)
-                percentile_70 = np.percentile(hist_pb, 70)
-                
-                # 极端值处理
-                if pb_current < 0.5:
-                    result["pb_status"] = "deep_discount"
-                elif pb_current > 10:
-                    result["pb_status"] = "extreme_premium"
-                elif pb_current > percentile_70:
-                    result["pb_status"] = "high_premium"
-                elif pb_current < percentile_30:
-                    result["pb_status"] = "discount"
-                else:
-                    result["pb_status"] = "reasonable"
-            else:
-                # 历史数据不足，使用绝对阈值
-                if pb_current < 0.5:
-                    result["pb_status"] = "deep_discount"
-                elif pb_current > 5:
-                    result["pb_status"] = "high_premium"
-                elif pb_current < 1:
-                    result["pb_status"] = "discount"
-                else:
-                    result["pb_status"] = "reasonable"
-        else:
-            result["pb_status"] = None
-        
-        # ==================== 字段3: 股息吸引力分析 ====================
-        dv_ttm_current = current_row.get('dv_ttm')
-        dv_ratio_current = current_row.get('dv_ratio')
-        
-        # 优先使用dv_ttm，缺失时回退到dv_ratio
-        dividend_to_use = dv_ttm_current if pd.notna(dv_ttm_current) else dv_ratio_current
-        
-        if pd.notna(dividend_to_use):
-            if dividend_to_use >= 5.0:
-                result["dividend_attractiveness"] = "very_attractive"
-            elif dividend_to_use >= 3.0:
-                result["dividend_attractiveness"] = "attractive"
-            elif dividend_to_use >= 1.0:
-                result["dividend_attractiveness"] = "moderate"
-            else:
-                result["dividend_attractiveness"] = "low_yield"
-        else:
-            result["dividend_attractiveness"] = "no_dividend"
-        
-        # ==================== 字段4: PS状态分析 ====================
-        ps_ttm_current = current_row.get('ps_ttm')
-        ps_current = current_row.get('ps')
-        
-        # 优先使用ps_ttm，缺失时回退到ps
-        ps_to_use = ps_ttm_current if pd.notna(ps_ttm_current) else ps_current
-        
-        if pd.notna(ps_to_use):
-            # 获取历史PS序列（排除当前日，只使用前一日及之前的数据，并过滤负值）
-            if current_idx > 0:
-                hist_data = df_hist.iloc[:current_idx]  # 0 到 current_idx-1
-                hist_ps = hist_data[
-                    (hist_data['ps_ttm'].notna()) & (hist_data['ps_ttm'] >= 0)
-                ]['ps_ttm']
-                
-                # 如果ps_ttm历史数据不足，尝试使用ps
-                if len(hist_ps) < 100:
-                    hist_ps = hist_data[
-                        (hist_data['ps'].notna()) & (hist_data['ps'] >= 0)
-                    ]['ps']
-            else:
-                hist_ps = pd.Series([], dtype=float)  # 当前日为第一天，无历史数据
-            
-            if len(hist_ps) >= 100:  # 有足够历史数据
-                # 计算历史分位数
-                percentile_30 = np.percentile(hist_ps, 30)
-                percentile_70 = np.percentile(hist_ps, 70)
-                
-                if ps_to_use > percentile_70:
-                    result["ps_status"] = "overvalued_revenue"
-                elif ps_to_use < percentile_30:
-                    result["ps_status"] = "undervalued_revenue"
-                else:
-                    result["ps_status"] = "fair_revenue"
-            else:
-                # 历史数据不足，使用绝对阈值
-                if ps_to_use > 20:
-                    result["ps_status"] = "extremely_high"
-                elif ps_to_use < 2:
-                    result["ps_status"] = "reasonable_revenue"
-                else:
-                    result["ps_status"] = "fair_revenue"
-        else:
-            result["ps_status"] = None
-        
-        # ==================== 字段5: 市值分类 ====================
-        total_mv_current = current_row.get('total_mv')  # 单位：万元
-        
-        if pd.notna(total_mv_current):
-            if total_mv_current >= 10000000:  # 1000亿
-                result["market_cap_category"] = "large_cap"
-            elif total_mv_current >= 2000000:  # 200亿
-                result["market_cap_category"] = "mid_cap"
-            else:
-                result["market_cap_category"] = "small_cap"
-        else:
-            result["market_cap_category"] = "unknown"
-        
-        # ==================== 字段6: 综合估值结论 ====================
-        pe_status = result.get("pe_status")
-        pb_status = result.get("pb_status")
-        ps_status = result.get("ps_status")
-        dividend_status = result.get("dividend_attractiveness")
-        market_cap = result.get("market_cap_category")
-        
-        # 低估条件：PE/PB/PS任一低估 + 股息有吸引力（放宽要求） + 非小盘股
-        has_dividend = dividend_status in ["attractive", "very_attractive", "moderate"]
-        
-        is_undervalued = (
-            (pe_status == "cheap" or pb_status in ["discount", "deep_discount"] or 
-             ps_status == "undervalued_revenue") and
-            has_dividend and
-            market_cap != "small_cap"
-        )
-        
-        # 高估条件：PE和PB同时高估，或PS高估且为小盘股
-        is_overvalued = (
-            (pe_status == "expensive" and pb_status in ["high_premium", "extreme_premium"]) or
-            (ps_status == "overvalued_revenue" and market_cap == "small_cap")
-        )
-        
-        # 成长溢价：PE高但PS合理且为大中盘股
-        is_growth_priced = (
-            pe_status == "expensive" and
-            ps_status in ["fair_revenue", "reasonable_revenue"] and
-            market_cap in ["large_cap", "mid_cap"]
-        )
-        
-        # 投机性：小盘股 + PE高 + 股息低
-        is_speculative = (
-            market_cap == "small_cap" and
-            pe_status == "expensive" and
-            dividend_status in ["low_yield", "no_dividend"]
-        )
-        
-        # 亏损股特殊处理
-        is_unprofitable = pe_status == "unprofitable"
-        
-        # 估值结论优先级：亏损股 > 低估 > 高估 > 成长溢价 > 投机性 > 中性
-        if is_unprofitable:
-            result["valuation_summary"] = "unprofitable"
-        elif is_undervalued:
-            result["valuation_summary"] = "undervalued"
-        elif is_overvalued:
-            result["valuation_summary"] = "overvalued"
-        elif is_growth_priced:
-            result["valuation_summary"] = "growth_priced"
-        elif is_speculative:
-            result["valuation_summary"] = "speculative"
-        else:
-            result["valuation_summary"] = "neutral"
-        
-        return json.dumps(result, ensure_ascii=False, indent=2)
-        
+        codes, batch = _parse_codes(ts_code)
+        results = _profile_on_date(codes, trade_date)
+        return _respond(results, codes, batch)
+
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
-@mcp.tool()
 def get_oscillator_signals(
-    ts_code: str,
+    ts_code: Union[str, List[str]],
     trade_date: str,
 ) -> str:
-    """获取股票震荡指标信号分析。
-    
-    基于 Tushare 专业版提供的全量技术因子，对股票当前的超买、超卖状态及潜在反转信号进行结构化、语义化的判断：
-    - RSI超买超卖状态 (rsi_status)
-    - KDJ综合信号分析 (kdj_status)  
-    - 威廉指标状态 (williams_r_status)
-    - 乖离率偏离程度 (bias_status)
-    - CCI异常波动预警 (cci_status)
-    - 综合反转信号评估 (reversal_signal)
-    
-    参数说明：
-    - ts_code: 股票代码（必需），如 000001.SZ
-    - trade_date: 交易日期（必需），格式 YYYYMMDD
-    
-    返回示例：
-    {
-      "ts_code": "000001.SZ",
-      "trade_date": "20240115",
-      "rsi_status": "oversold",
-      "kdj_status": "bullish_crossover_in_oversold",
-      "williams_r_status": "oversold",
-      "bias_status": "high_negative_deviation", 
-      "cci_status": "oversold_or_breakdown",
-      "reversal_signal": "strong_bullish_reversal"
-    }
-    """
+    """get_oscillator_signals 工具的实现，参数与返回格式见 server.get_oscillator_signals。"""
     try:
-        # 获取包含当前日及历史数据（用于交叉信号判断）
-        # 使用历史窗口而非简单的日历日计算，避免月末/月初日期错误
-        df_hist = pro.stk_factor_pro(
-            ts_code=ts_code,
-            start_date=str(int(trade_date) - 10000),  # 往前推100天（足够获取多个交易日）
-            end_date=trade_date,
+        codes, batch = _parse_codes(ts_code)
+        # 获取当前日及前一交易日数据（用于交叉信号判断）
+        results = _analyze_on_date(
+            codes,
+            trade_date,
+            start_date=trade_calendar.window_start(trade_date, OSCILLATOR_LOOKBACK),
+            compute=_on_rows(_oscillator_fields),
+            fields=OSCILLATOR_FIELDS,
         )
-        
-        if df_hist.empty:
-            return json.dumps({"error": f"未获取到 {trade_date} 附近的数据"})
-        
-        # 按日期排序并重置索引
-        df_hist = df_hist.sort_values('trade_date').reset_index(drop=True)
-        
-        # 找到当前交易日的位置
-        current_idx = df_hist[df_hist['trade_date'] == trade_date].index
-        if len(current_idx) == 0:
-            return json.dumps({"error": f"未获取到 {trade_date} 的数据"})
-        
-        current_idx = current_idx[0]
-        current_row = df_hist.iloc[current_idx]
-        
-        result = {
-            "ts_code": current_row['ts_code'],
-            "trade_date": current_row['trade_date']
-        }
-        
-        # ==================== 字段1: RSI状态分析 ====================
-        rsi_6 = current_row.get('rsi_qfq_6')
-        rsi_12 = current_row.get('rsi_qfq_12')
-        
-        if pd.notna(rsi_6):
-            if rsi_6 >= 70:
-                result["rsi_status"] = "overbought"
-            elif rsi_6 <= 30:
-                result["rsi_status"] = "oversold"
-            else:
-                result["rsi_status"] = "neutral"
-        elif pd.notna(rsi_12):
-            # 回退到RSI12，阈值放宽
-            if rsi_12 >= 75:
-                result["rsi_status"] = "overbought"
-            elif rsi_12 <= 25:
-                result["rsi_status"] = "oversold"
-            else:
-                result["rsi_status"] = "neutral"
-        else:
-            result["rsi_status"] = None
-        
-        # ==================== 字段2: KDJ综合信号分析 ====================
-        k_val = current_row.get('kdj_k_qfq')
-        d_val = current_row.get('kdj_d_qfq')
-        
-        # 数据有效性检查：如果KDJ数据缺失，返回None而非"neutral"
-        if not (pd.notna(k_val) and pd.notna(d_val)):
-            result["kdj_status"] = None
-        else:
-            kdj_status = "neutral"  # 默认状态
-            
-            # 尝试获取前一日数据进行交叉判断
-            try:
-                # 使用历史数据中前一个交易日
-                if current_idx > 0:
-                    prev_row = df_hist.iloc[current_idx - 1]
-                    prev_k = prev_row.get('kdj_k_qfq')
-                    prev_d = prev_row.get('kdj_d_qfq')
-                    
-                    if pd.notna(prev_k) and pd.notna(prev_d):
-                        # 金叉：前一日 K ≤ D，当日 K > D
-                        if prev_k <= prev_d and k_val > d_val:
-                            if k_val < 50:
-                                kdj_status = "bullish_crossover_in_oversold"
-                            else:
-                                kdj_status = "bullish_crossover"
-                        # 死叉：前一日 K ≥ D，当日 K < D
-                        elif prev_k >= prev_d and k_val < d_val:
-                            if k_val > 50:
-                                kdj_status = "bearish_crossover_in_overbought"
-                            else:
-                                kdj_status = "bearish_crossover"
-                        else:
-                            # 非交叉日，判断超买超卖风险
-                            if k_val > 80:
-                                kdj_status = "overbought_risk"
-                            elif k_val < 20:
-                                kdj_status = "oversold_opportunity"
-                            else:
-                                kdj_status = "neutral"
-                    else:
-                        # 前一日数据缺失，仅判断当前状态
-                        if k_val > 80:
-                            kdj_status = "overbought_risk"
-                        elif k_val < 20:
-                            kdj_status = "oversold_opportunity"
-                else:
-                    # 当前日为序列第一个，仅判断当前状态
-                    if k_val > 80:
-                        kdj_status = "overbought_risk"
-                    elif k_val < 20:
-                        kdj_status = "oversold_opportunity"
-            except Exception:
-                # 异常情况下，仅判断当前状态
-                if k_val > 80:
-                    kdj_status = "overbought_risk"
-                elif k_val < 20:
-                    kdj_status = "oversold_opportunity"
-            
-            result["kdj_status"] = kdj_status
-        
-        # ==================== 字段3: 威廉指标状态 ====================
-        wr1 = current_row.get('wr1_qfq')  # N=6，更敏感
-        wr = current_row.get('wr_qfq')    # N=10
-        
-        if pd.notna(wr1):
-            if wr1 >= -20:
-                result["williams_r_status"] = "overbought"
-            elif wr1 <= -80:
-                result["williams_r_status"] = "oversold"
-            else:
-                result["williams_r_status"] = "neutral"
-        elif pd.notna(wr):
-            if wr >= -20:
-                result["williams_r_status"] = "overbought"
-            elif wr <= -80:
-                result["williams_r_status"] = "oversold"
-            else:
-                result["williams_r_status"] = "neutral"
-        else:
-            result["williams_r_status"] = None
-        
-        # ==================== 字段4: BIAS乖离率状态 ====================
-        bias1 = current_row.get('bias1_qfq')  # 6日乖离率
-        bias2 = current_row.get('bias2_qfq')  # 12日乖离率
-        bias3 = current_row.get('bias3_qfq')  # 24日乖离率
-        
-        bias_status = "normal_deviation"
-        
-        if pd.notna(bias1):
-            if bias1 > 5.0:
-                bias_status = "high_positive_deviation"
-            elif bias1 < -5.0:
-                bias_status = "high_negative_deviation"
-        elif pd.notna(bias2):
-            if bias2 > 6.0:
-                bias_status = "high_positive_deviation"
-            elif bias2 < -6.0:
-                bias_status = "high_negative_deviation"
-        elif pd.notna(bias3):
-            if bias3 > 7.0:
-                bias_status = "high_positive_deviation"
-            elif bias3 < -7.0:
-                bias_status = "high_negative_deviation"
-        
-        result["bias_status"] = bias_status
-        
-        # ==================== 字段5: CCI状态分析 ====================
-        cci = current_row.get('cci_qfq')
-        
-        if pd.notna(cci):
-            if cci > 100:
-                result["cci_status"] = "overbought_or_breakout"
-            elif cci < -100:
-                result["cci_status"] = "oversold_or_breakdown"
-            else:
-                result["cci_status"] = "normal_range"
-        else:
-            result["cci_status"] = None
-        
-        # ==================== 字段6: 综合反转信号判断 ====================
-        # 统计极端指标数量（超买或超卖）
-        extreme_indicators = 0
-        bullish_signals = 0
-        bearish_signals = 0
-        
-        # 获取当前指标状态
-        rsi_status = result.get("rsi_status")
-        williams_r_status = result.get("williams_r_status")
-        cci_status = result.get("cci_status")
-        
-        # 重新定义KDJ状态（从 result 字典获取）
-        kdj_status = result.get("kdj_status")
-        
-        if rsi_status in ['oversold']:
-            extreme_indicators += 1
-            bullish_signals += 1
-        elif rsi_status in ['overbought']:
-            extreme_indicators += 1
-            bearish_signals += 1
-            
-        if kdj_status in ['oversold_opportunity', 'bullish_crossover_in_oversold', 'bullish_crossover']:
-            extreme_indicators += 1
-            bullish_signals += 1
-        elif kdj_status in ['overbought_risk', 'bearish_crossover_in_overbought', 'bearish_crossover']:
-            extreme_indicators += 1
-            bearish_signals += 1
-            
-        if williams_r_status in ['oversold']:
-            extreme_indicators += 1
-            bullish_signals += 1
-        elif williams_r_status in ['overbought']:
-            extreme_indicators += 1
-            bearish_signals += 1
-            
-        if bias_status in ['high_negative_deviation']:
-            extreme_indicators += 1
-            bullish_signals += 1
-        elif bias_status in ['high_positive_deviation']:
-            extreme_indicators += 1
-            bearish_signals += 1
-            
-        if cci_status in ['oversold_or_breakdown']:
-            extreme_indicators += 1
-            bullish_signals += 1
-        elif cci_status in ['overbought_or_breakout']:
-            extreme_indicators += 1
-            bearish_signals += 1
-        
-        # 获取BIAS当前值用于强信号判断
-        bias_current = None
-        if bias1 is not None:
-            bias_current = bias1
-        elif bias2 is not None:
-            bias_current = bias2
-        elif bias3 is not None:
-            bias_current = bias3
-        
-        # 综合判断逻辑：强化条件避免过度敏感
-        if extreme_indicators >= 2:
-            # 检查是否有金叉信号（看涨）
-            has_bullish_crossover = any([
-                kdj_status in ['bullish_crossover', 'bullish_crossover_in_oversold']
-            ])
-            
-            # 检查乖离率极端条件（价格已回调）
-            is_bias_extreme = (bias_current is not None) and (bias_current <= -4.0)
-            
-            # 强烈看涨反转需要：至少2个极端指标 + 金叉/连续上升 + 乖离率支持
-            if has_bullish_crossover and is_bias_extreme:
-                reversal_signal = "strong_bullish_reversal"
-            elif bullish_signals >= 2 and is_bias_extreme:
-                reversal_signal = "moderate_reversal_risk"  # 避免过度强烈判断
-            elif bearish_signals >= 2:
-                # 强烈看跌信号
-                has_bearish_crossover = any([
-                    kdj_status in ['bearish_crossover', 'bearish_crossover_in_overbought']
-                ])
-                
-                if has_bearish_crossover:
-                    reversal_signal = "strong_bearish_reversal"
-                else:
-                    reversal_signal = "moderate_reversal_risk"
-            else:
-                reversal_signal = "moderate_reversal_risk"
-        else:
-            reversal_signal = "no_significant_signal"
-        
-        result["reversal_signal"] = reversal_signal
-        
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return _respond(results, codes, batch)
         
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
-@mcp.tool()
 def get_volatility_profile(
-    ts_code: str,
+    ts_code: Union[str, List[str]],
     date: str,
 ) -> str:
-    """获取股票波动性分析。
-    
-    基于 Tushare 专业版技术因子数据，评估股票当前的波动水平、风险状态及潜在变盘信号。
-    专门设计用于回答"这只股票最近波动大吗？"、"当前是高风险还是低风险状态？"等问题。
-    
-    核心分析维度：
-    - ATR波动率状态 (atr_status)
-    - 布林带位置与带宽分析 (bollinger_status)  
-    - MASS梅斯指标波动压缩状态 (mass_status)
-    - 肯特纳通道趋势位置 (keltner_status)
-    - 价格极值新鲜度 (extreme_price_status)
-    - 综合波动状态评估 (volatility_regime)
-    - 风险预警信号 (risk_warning)
-    
-    参数说明：
-    - ts_code: 股票代码（必需），如 000001.SZ
-    - date: 分析日期（必需），格式 YYYYMMDD
-    
-    返回示例：
-    {
-      "ts_code": "000001.SZ",
-      "date": "20240115",
-      "atr_status": "normal_volatility",
-      "bollinger_status": "upper_half",
-      "mass_status": "normal_range", 
-      "keltner_status": "within_keltner_channel",
-      "extreme_price_status": "no_extreme_price",
-      "volatility_regime": "normal_volatility",
-      "risk_warning": "none"
-    }
-    """
+    """get_volatility_profile 工具的实现，参数与返回格式见 server.get_volatility_profile。"""
     try:
-        # 获取包含当前日及历史数据（用于历史窗口计算）
-        df_hist = pro.stk_factor_pro(
-            ts_code=ts_code,
-            start_date=str(int(date) - 10000),  # 往前推100天（足够获取历史窗口）
-            end_date=date,
+        codes, batch = _parse_codes(ts_code)
+        # 获取当前日及前20个交易日数据（用于ATR均值与前20日高低点）
+        results = _analyze_on_date(
+            codes,
+            date,
+            start_date=trade_calendar.window_start(date, VOLATILITY_LOOKBACK),
+            compute=_on_rows(_volatility_fields),
+            fields=VOLATILITY_FIELDS,
+            date_key="date",
         )
+        return _respond(results, codes, batch)
         
-        if df_hist.empty:
-            return json.dumps({"error": f"未获取到 {date} 附近的数据"})
-        
-        # 按日期排序并重置索引
-        df_hist = df_hist.sort_values('trade_date').reset_index(drop=True)
-        
-        # 找到当前交易日的位置
-        current_idx = df_hist[df_hist['trade_date'] == date].index
-        if len(current_idx) == 0:
-            return json.dumps({"error": f"未获取到 {date} 的数据"})
-        
-        current_idx = current_idx[0]
-        current_row = df_hist.iloc[current_idx]
-        
-        result = {
-            "ts_code": current_row['ts_code'],
-            "date": current_row['trade_date']
-        }
-        
-        # ==================== 字段1: ATR状态分析 ====================
-        atr_val = current_row.get('atr_qfq')
-        
-        if pd.notna(atr_val):
-            # 计算近20日ATR均值（如果数据足够）
-            if current_idx >= 19:  # 有足够的20天历史数据
-                hist_data = df_hist.iloc[current_idx-19:current_idx+1]
-                valid_atr = hist_data['atr_qfq'].dropna()
-                
-                if len(valid_atr) >= 15:  # 至少需要15个有效数据点
-                    avg_atr_20 = valid_atr.mean()
-                    
-                    if atr_val > 1.5 * avg_atr_20:
-                        result["atr_status"] = "high_volatility"
-                    elif atr_val < 0.7 * avg_atr_20:
-                        result["atr_status"] = "low_volatility"
-                    else:
-                        result["atr_status"] = "normal_volatility"
-                else:
-                    # 数据不足，使用绝对阈值
-                    if atr_val > 2.0:
-                        result["atr_status"] = "high_volatility"
-                    elif atr_val < 0.5:
-                        result["atr_status"] = "low_volatility"
-                    else:
-                        result["atr_status"] = "normal_volatility"
-            else:
-                # 历史数据不足20天，使用绝对阈值
-                if atr_val > 2.0:
-                    result["atr_status"] = "high_volatility"
-                elif atr_val < 0.5:
-                    result["atr_status"] = "low_volatility"
-                else:
-                    result["atr_status"] = "normal_volatility"
-        else:
-            result["atr_status"] = None
-        
-        # ==================== 字段2: 布林带状态分析 ====================
-        close = current_row.get('close_qfq')
-        boll_upper = current_row.get('boll_upper_qfq')
-        boll_lower = current_row.get('boll_lower_qfq')
-        boll_mid = current_row.get('boll_mid_qfq')
-        
-        if all(pd.notna(val) for val in [close, boll_upper, boll_lower, boll_mid]):
-            bollinger_status_parts = []
-            
-            # 价格位置判断
-            if close >= boll_upper:
-                bollinger_status_parts.append("above_upper_band")
-            elif close <= boll_lower:
-                bollinger_status_parts.append("below_lower_band")
-            elif close > boll_mid:
-                bollinger_status_parts.append("upper_half")
-            else:
-                bollinger_status_parts.append("lower_half")
-            
-            # 带宽状态判断（波动压缩/扩张）
-            band_width = (boll_upper - boll_lower) / boll_mid
-            
-            if band_width > 0.15:
-                bollinger_status_parts.append("wide_band")
-            elif band_width < 0.08:
-                bollinger_status_parts.append("narrow_band")
-            # 移除normal_band状态，只有宽和窄两种状态有分析价值
-            
-            # 合并状态（主要位置状态 + 带宽状态）
-            if "above_upper_band" in bollinger_status_parts:
-                if "wide_band" in bollinger_status_parts:
-                    result["bollinger_status"] = "above_upper_with_wide_band"
-                elif "narrow_band" in bollinger_status_parts:
-                    result["bollinger_status"] = "above_upper_with_narrow_band"
-                else:
-                    result["bollinger_status"] = "above_upper_band"
-            elif "below_lower_band" in bollinger_status_parts:
-                if "wide_band" in bollinger_status_parts:
-                    result["bollinger_status"] = "below_lower_with_wide_band"
-                elif "narrow_band" in bollinger_status_parts:
-                    result["bollinger_status"] = "below_lower_with_narrow_band"
-                else:
-                    result["bollinger_status"] = "below_lower_band"
-            elif "upper_half" in bollinger_status_parts:
-                if "narrow_band" in bollinger_status_parts:
-                    result["bollinger_status"] = "upper_half_narrow_band"
-                else:
-                    result["bollinger_status"] = "upper_half"
-            else:  # lower_half
-                if "narrow_band" in bollinger_status_parts:
-                    result["bollinger_status"] = "lower_half_narrow_band"
-                else:
-                    result["bollinger_status"] = "lower_half"
-        else:
-            result["bollinger_status"] = None
-        
-        # ==================== 字段3: MASS梅斯指标状态分析 ====================
-        mass_val = current_row.get('mass_qfq')
-        
-        if pd.notna(mass_val):
-            # 检查前一日数据用于反转信号判断
-            if current_idx > 0:
-                prev_mass = df_hist.iloc[current_idx - 1]['mass_qfq']
-                
-                if pd.notna(prev_mass):
-                    # 梅斯反转信号：今日 < 27 且 前日 >= 27
-                    if mass_val < 27 and prev_mass >= 27:
-                        result["mass_status"] = "mass_reversal_signal"
-                    else:
-                        # 经典阈值判断
-                        if mass_val > 27:
-                            result["mass_status"] = "high_mass"
-                        elif mass_val < 26.5:
-                            result["mass_status"] = "low_mass"
-                        else:
-                            result["mass_status"] = "reversal_zone"
-                else:
-                    # 前一日数据缺失，仅进行阈值判断
-                    if mass_val > 27:
-                        result["mass_status"] = "high_mass"
-                    elif mass_val < 26.5:
-                        result["mass_status"] = "low_mass"
-                    else:
-                        result["mass_status"] = "reversal_zone"
-            else:
-                # 当前日为序列第一个，仅进行阈值判断
-                if mass_val > 27:
-                    result["mass_status"] = "high_mass"
-                elif mass_val < 26.5:
-                    result["mass_status"] = "low_mass"
-                else:
-                    result["mass_status"] = "reversal_zone"
-        else:
-            result["mass_status"] = None
-        
-        # ==================== 字段4: 肯特纳通道状态分析 ====================
-        ktn_upper = current_row.get('ktn_upper_qfq')
-        ktn_down = current_row.get('ktn_down_qfq')
-        
-        if pd.notna(close) and pd.notna(ktn_upper) and pd.notna(ktn_down):
-            if close >= ktn_upper:
-                result["keltner_status"] = "above_keltner_upper"
-            elif close <= ktn_down:
-                result["keltner_status"] = "below_keltner_lower"
-            else:
-                result["keltner_status"] = "within_keltner_channel"
-        else:
-            result["keltner_status"] = None
-        
-        # ==================== 字段5: 价格极值状态分析 ====================
-        topdays = current_row.get('topdays')
-        lowdays = current_row.get('lowdays')
-        
-        # 重新获取价格用于综合判断
-        current_high = current_row.get('high_qfq')
-        current_low = current_row.get('low_qfq')
-        
-        # 首先检查是否有极值数据
-        if pd.notna(topdays) or pd.notna(lowdays):
-            if topdays is not None and topdays >= 20:
-                extreme_status = "recent_new_high"
-            elif lowdays is not None and lowdays >= 20:
-                extreme_status = "recent_new_low"
-            else:
-                extreme_status = "no_extreme_price"
-        else:
-            # 如果没有极值数据，使用价格位置替代判断
-            if current_idx >= 20:  # 有足够历史数据（排除当前日）
-                # 前20天（不含当前日）
-                hist_data = df_hist.iloc[current_idx-20:current_idx]
-                hist_high = hist_data['high_qfq'].max()
-                hist_low = hist_data['low_qfq'].min()
-                
-                if pd.notna(current_high) and pd.notna(hist_high) and current_high > hist_high:
-                    extreme_status = "recent_new_high"
-                elif pd.notna(current_low) and pd.notna(hist_low) and current_low < hist_low:
-                    extreme_status = "recent_new_low"
-                elif pd.notna(current_high) and pd.notna(hist_high) and current_high >= hist_high * 0.98:  # 接近新高
-                    extreme_status = "near_new_high"
-                else:
-                    extreme_status = "no_extreme_price"
-            else:
-                extreme_status = "no_extreme_price"
-        
-        result["extreme_price_status"] = extreme_status
-        
-        # ==================== 字段6: 综合波动状态评估 ====================
-        atr_status = result.get("atr_status")
-        bollinger_status = result.get("bollinger_status")
-        mass_status = result.get("mass_status")
-        
-        # 高波动风险：ATR高 + 布林带宽 + 价格极端
-        is_high_vol = atr_status == "high_volatility"
-        is_wide_band = "wide_band" in bollinger_status if bollinger_status else False
-        is_extreme_price = extreme_status in ["recent_new_high", "recent_new_low"]
-        
-        if is_high_vol and is_wide_band and is_extreme_price:
-            volatility_regime = "elevated_volatility"
-        
-        # 变盘预警：布林带窄或MASS低位且ATR低
-        elif (("narrow_band" in bollinger_status) or 
-              (mass_status == "low_mass")) and atr_status == "low_volatility":
-            volatility_regime = "compression_before_breakout"
-        
-        else:
-            volatility_regime = "normal_volatility"
-        
-        result["volatility_regime"] = volatility_regime
-        
-        # ==================== 字段7: 风险预警信号 ====================
-        # 高位高波动风险：价格在上轨外 + 新高 + 高ATR
-        if (bollinger_status and "above_upper" in bollinger_status and 
-            extreme_status == "recent_new_high" and atr_status == "high_volatility"):
-            risk_warning = "high_short_term_risk"
-        
-        # 低位高波动机会：价格在下轨外 + 新低 + 高ATR
-        elif (bollinger_status and "below_lower" in bollinger_status and 
-              extreme_status == "recent_new_low" and atr_status == "high_volatility"):
-            risk_warning = "high_short_term_opportunity"
-        
-        # 低风险盘整：布林带窄 + 低ATR
-        elif (bollinger_status and "narrow_band" in bollinger_status and 
-              atr_status == "low_volatility"):
-            risk_warning = "low_risk_consolidation"
-        
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+def scan_market(
+    trade_date: str,
+    conditions: Optional[Dict[str, Union[str, List[str]]]] = None,
+    rank_by: str = "pct_chg",
+    ascending: bool = False,
+    limit: int = 50,
+) -> str:
+    """scan_market 工具的实现，参数与返回格式见 server.scan_market。"""
+    try:
+        if rank_by not in FACTOR_FIELDS:
+            return json.dumps({"error": f"不支持的排序字段: {rank_by}，可选: {', '.join(RANK_FIELDS)}"})
+
+        # 校验筛选条件：不存在的取值直接报错，而不是返回 0 只匹配的股票
+        allowed_values: Dict[str, List[str]] = {}
+        for name, allowed in (conditions or {}).items():
+            if name not in SIGNAL_LABELS:
+                return json.dumps({"error": f"不支持的筛选字段: {name}，可用字段: {', '.join(SIGNAL_LABELS)}"})
+            allowed = [allowed] if isinstance(allowed, str) else list(allowed)
+            unknown = [v for v in allowed if v not in SIGNAL_LABELS[name]]
+            if unknown:
+                return json.dumps({
+                    "error": f"{name} 不支持的取值: {', '.join(map(str, unknown))}，"
+                             f"可选: {', '.join(SIGNAL_LABELS[name])}"
+                })
+            allowed_values[name] = allowed
+
+        # 目标日及之前的交易日列表
+        if not trade_calendar.is_open(trade_date):
+            return json.dumps({"error": f"{trade_date} 不是交易日"})
+        dates = trade_calendar.between(
+            trade_calendar.window_start(trade_date, SCAN_LOOKBACK_DAYS), trade_date
+        )
+
+        # 冷启动需要拉取多个全市场截面，以低优先级排队，不挤占单股查询的配额
+        with priority(PRIORITY_BULK):
+            df = factor_store.load_trade_dates(
+                dates,
+                columns=list(dict.fromkeys([
+                    "close", "adj_factor", rank_by,
+                    *TREND_FIELDS, *SENTIMENT_FIELDS, *OSCILLATOR_FIELDS, *VOLATILITY_FIELDS,
+                ])),
+            )
+        if df.empty or not (df["trade_date"] == trade_date).any():
+            return json.dumps({"error": f"未获取到 {trade_date} 的数据"})
+        if rank_by not in df.columns:
+            return json.dumps({"error": f"不支持的排序字段: {rank_by}，可选: {', '.join(RANK_FIELDS)}"})
+
+        df = df.sort_values(["ts_code", "trade_date"], kind="stable").reset_index(drop=True)
+        df = _rebase_qfq(df)
+        rows = np.flatnonzero(df["trade_date"].to_numpy() == trade_date)
+
+        fields: Dict[str, np.ndarray] = {}
+        for compute in _SCAN_RULES.values():
+            fields.update({name: values[rows] for name, values in compute(df).items()})
+
+        # 按条件筛选
+        matched = np.ones(len(rows), dtype=bool)
+        for name, allowed in allowed_values.items():
+            matched &= pd.Series(fields[name]).isin(allowed).to_numpy()
+
+        # 排序：缺失值排在最后
+        score = _column(df, rank_by)[rows]
+        order = np.flatnonzero(matched)
+        key = score[order] if ascending else -score[order]
+        order = order[np.argsort(np.where(np.isnan(key), np.inf, key), kind="stable")][:max(limit, 0)]
+
+        results = []
+        for record, k in zip(
+            _build_records(df, {name: values[order] for name, values in fields.items()}, rows[order]),
+            order,
+        ):
+            value = score[k]
+            results.append({
+                "ts_code": record.pop("ts_code"),
+                "trade_date": record.pop("trade_date"),
+                rank_by: None if np.isnan(value) else float(value),
+                **record,
+            })
+
+        return dumps(
+            {
+                "trade_date": trade_date,
+                "total": int(len(rows)),
+                "matched": int(matched.sum()),
+                "rank_by": rank_by,
+                "results": results,
+            }
+        )
+
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
+def _industry_records(df: pd.DataFrame, level: str, with_industry: bool) -> List[Dict[str, Any]]:
+    """行业排名结果转为记录列表：<指标>_rank 为所选层级的行业内分位，缺失值为 None。"""
+    columns = {"ts_code": "ts_code", "name": "name", "close": "close"}
+    if with_industry:
+        columns.update({
+            f"{level}_code": "industry_code",
+            f"{level}_name": "industry_name",
+            f"{level}_size": "industry_size",
+        })
+    for metric in RANK_METRICS:
+        columns.update({metric: metric, f"{metric}_{level}_rank": f"{metric}_rank"})
+    columns["total_mv"] = "total_mv"
+    out = df[list(columns)].rename(columns=columns)
+    return out.astype(object).where(out.notna(), None).to_dict("records")
+
+
+def get_industry_valuation(
+    trade_date: str,
+    level: str = "l1",
+    ts_code: Optional[Union[str, List[str]]] = None,
+    industry: Optional[str] = None,
+    rank_by: str = "pe_ttm",
+    ascending: bool = True,
+    limit: int = 5,
+) -> str:
+    """get_industry_valuation 工具的实现，参数与返回格式见 server.get_industry_valuation。"""
+    try:
+        if level not in INDUSTRY_LEVELS:
+            return json.dumps({"error": f"不支持的行业层级: {level}，可选: {', '.join(INDUSTRY_LEVELS)}"})
+        if rank_by not in RANK_METRICS:
+            return json.dumps({"error": f"不支持的排序字段: {rank_by}，可选: {', '.join(RANK_METRICS)}"})
+
+        df = industry_ranks.ranks(trade_date)
+        code_col, name_col = f"{level}_code", f"{level}_name"
+
+        # 指定股票：返回这些股票在所属行业内的排名
+        if ts_code:
+            codes, batch = _parse_codes(ts_code)
+            found = df[df["ts_code"].isin(codes)]
+            results: Dict[str, Any] = {
+                code: {"error": f"未获取到 {code} 在 {trade_date} 的数据"} for code in codes
+            }
+            for record in _industry_records(found, level, with_industry=True):
+                results[record["ts_code"]] = {**record, "trade_date": trade_date}
+            return _respond(results, codes, batch)
+
+        df = df[df[code_col].notna()]
+        if industry:
+            df = df[(df[code_col] == industry) | (df[name_col] == industry)]
+            if df.empty:
+                return json.dumps({"error": f"未找到行业: {industry}"})
+
+        # 每个行业按 rank_by 排序取前 limit 只，缺失值排在最后
+        key = pd.to_numeric(df[rank_by], errors="coerce")
+        if RANK_METRICS[rank_by]:
+            key = key.where(key >= 0)
         else:
-            risk_warning = "none"
-        
-        result["risk_warning"] = risk_warning
-        
-        return json.dumps(result, ensure_ascii=False, indent=2)
-        
+            key = key.where(key > 0)
+        key = key if ascending else -key
+        ordered = df.assign(_key=key.fillna(np.inf)).sort_values(
+            [code_col, "_key"], kind="stable"
+        )
+        top = ordered.groupby(code_col, sort=False).head(max(limit, 0))
+
+        # 一次转换全部入选股票，再按行业（已按行业代码排序）归组
+        industries: Dict[str, Dict[str, Any]] = {}
+        for record in _industry_records(top, level, with_industry=True):
+            code = record.pop("industry_code")
+            entry = industries.setdefault(code, {
+                "industry_code": code,
+                "industry_name": record.pop("industry_name"),
+                "size": record.pop("industry_size"),
+                "stocks": [],
+            })
+            entry["stocks"].append(record)
+        return dumps(
+            {
+                "trade_date": trade_date,
+                "level": level,
+                "rank_by": rank_by,
+                "total": int(len(df)),
+                "industries": list(industries.values()),
+            }
+        )
+
     except Exception as e:
         return json.dumps({"error": str(e)})
 
-if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+
+def get_stock_dossier(ts_code: str, trade_date: Optional[str] = None) -> str:
+    """get_stock_dossier 工具的实现，参数与返回格式见 server.get_stock_dossier。"""
+    try:
+        code = ts_code.strip()
+        trade_date = trade_calendar.latest(trade_date or cn_today())
+        sections = dossier_sections(
+            pro, code, trade_date, trade_calendar.window_start(trade_date, DOSSIER_DAYS)
+        )
+
+        def technical() -> Dict[str, Any]:
+            # 技术面取自本地存储的 stk_factor_pro 数据，与其他接口并发执行
+            record = _profile_on_date([code], trade_date)[code]
+            return {name: value for name, value in record.items() if name not in ("ts_code", "trade_date")}
+
+        sections["technical"] = technical
+        return dumps({"ts_code": code, "trade_date": trade_date, **gather(sections)})
+
+    except Exception as e:
+        return json.dumps({"error": str(e)})
@@ -0,0 +1,134 @@
+import os
+import json
+import bisect
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from tushare_mcp_server.common import atomic_write, cn_today
+
+
+# 交易日历缓存目录：可通过环境变量 TUSHARE_CACHE_DIR 覆盖
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tushare_mcp_server")
+
+# Tushare 交易日历最早从 1990 年开始
+_FIRST_DATE = "19900101"
+
+
+class TradingCalendar:
+    """交易日历索引：从 trade_cal 加载一次并缓存到磁盘，按交易日做 O(log n) 偏移查询。
+
+    - fetch: trade_cal 拉取函数，签名为 ``fetch(exchange=..., start_date=..., end_date=...)``
+    - exchange: 交易所代码，默认 SSE
+    - cache_dir: 缓存目录，默认 ``~/.cache/tushare_mcp_server``
+
+    查询日期超出已加载范围时（如跨年后 Tushare 发布了新一年的日历），每天最多重新拉取一次。
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., Any],
+        exchange: str = "SSE",
+        cache_dir: Optional[str] = None,
+    ) -> None:
+        self.fetch = fetch
+        self.exchange = exchange
+        self.path = os.path.join(
+            cache_dir or os.getenv("TUSHARE_CACHE_DIR") or DEFAULT_CACHE_DIR,
+            f"trade_cal_{exchange}.json",
+        )
+        self._dates: List[str] = []
+        self._end = ""
+        self._fetched_on = ""
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ 加载
+
+    def _load_disk(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._dates = data.get("open", [])
+        self._end = data.get("end", "")
+        self._fetched_on = data.get("fetched_on", "")
+
+    def _refresh(self) -> None:
+        today = cn_today()
+        df = self.fetch(
+            exchange=self.exchange,
+            start_date=_FIRST_DATE,
+            end_date=f"{int(today[:4]) + 1}1231",
+        )
+        if df is None or df.empty:
+            raise RuntimeError("未获取到交易日历数据")
+        cal_dates = df["cal_date"].astype(str)
+        self._dates = sorted(cal_dates[df["is_open"].astype(int) == 1])
+        self._end = cal_dates.max()
+        self._fetched_on = today
+
+        def dump(tmp_path: str) -> None:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"end": self._end, "fetched_on": self._fetched_on, "open": self._dates}, f
+                )
+
+        atomic_write(self.path, dump)
+
+    def _ensure(self, date: str) -> List[str]:
+        """保证日历覆盖 date，返回升序的交易日列表。"""
+        with self._lock:
+            if not self._dates:
+                self._load_disk()
+            if not self._dates or (date > self._end and self._fetched_on < cn_today()):
+                self._refresh()
+            if date > self._end:
+                raise ValueError(f"{date} 超出交易日历范围（最晚 {self._end}）")
+            return self._dates
+
+    # ------------------------------------------------------------------ 查询
+
+    def is_open(self, date: str) -> bool:
+        """date 是否为交易日。"""
+        dates = self._ensure(date)
+        i = bisect.bisect_left(dates, date)
+        return i < len(dates) and dates[i] == date
+
+    def latest(self, date: str) -> str:
+        """不晚于 date 的最近一个交易日（非交易日向前顺延）。"""
+        dates = self._ensure(date)
+        i = bisect.bisect_right(dates, date) - 1
+        if i < 0:
+            raise ValueError(f"{date} 之前没有交易日")
+        return dates[i]
+
+    def shift(self, date: str, n: int) -> str:
+        """从不晚于 date 的最近交易日起，向后（n > 0）或向前（n < 0）偏移 n 个交易日。"""
+        dates = self._ensure(date)
+        i = bisect.bisect_right(dates, date) - 1 + n
+        if i < 0 or i >= len(dates):
+            raise ValueError(f"{date} 偏移 {n} 个交易日超出交易日历范围")
+        return dates[i]
+
+    def window_start(self, end_date: str, n: int) -> str:
+        """以 end_date（非交易日时取之前最近的交易日）结尾、共 n 个交易日的窗口的起始日。
+
+        历史不足 n 个交易日时返回日历中的第一个交易日。
+        """
+        dates = self._ensure(end_date)
+        i = bisect.bisect_right(dates, end_date) - 1
+        return dates[max(0, i - (n - 1))]
+
+    def between(self, start_date: str, end_date: str) -> List[str]:
+        """[start_date, end_date] 之间的全部交易日。"""
+        dates = self._ensure(end_date)
+        return dates[bisect.bisect_left(dates, start_date):bisect.bisect_right(dates, end_date)]
+
+    def describe(self, date: str, offsets: List[int]) -> Dict[str, Any]:
+        """一次性返回 date 是否为交易日、最近交易日及各偏移量对应的交易日。"""
+        return {
+            "date": date,
+            "is_open": self.is_open(date),
+            "latest_trade_date": self.latest(date),
+            "offsets": {str(n): self.shift(date, n) for n in offsets},
+        }
@@ -0,0 +1,267 @@
+import os
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tushare_mcp_server import stats
+from tushare_mcp_server.common import cn_today
+from tushare_mcp_server.store import FactorStore, _shift_day
+
+
+# 内存中保留多少只股票的估值索引：可通过环境变量 TUSHARE_VALUATION_INDEX_SIZE 覆盖
+VALUATION_INDEX_SIZE = int(os.getenv("TUSHARE_VALUATION_INDEX_SIZE", "2000"))
+
+# 每个块的行数：窗口内的整块直接二分查找，只有首尾两个不完整的块需要逐个比较
+BLOCK_SIZE = 256
+
+
+def sorted_percentile(values: np.ndarray, q: float) -> float:
+    """已升序排列的 values 的第 q 百分位数，与 np.percentile（linear 插值）的结果逐位一致。
+
+    np.percentile 每次都要重新做一遍 O(n) 的划分；有序数组直接按下标插值。
+    """
+    n = len(values)
+    index = (n - 1) * (q / 100)
+    if index >= n - 1:
+        return float(values[-1])
+    lo = math.floor(index)
+    gamma = index - lo
+    a, b = float(values[lo]), float(values[lo + 1])
+    diff = b - a
+    return b - diff * (1 - gamma) if gamma >= 0.5 else a + diff * gamma
+
+
+def _valid(values: np.ndarray, allow_zero: bool) -> np.ndarray:
+    """非 NaN，且大于 0（allow_zero 时大于等于 0）的取值。"""
+    return values[~np.isnan(values) & ((values >= 0) if allow_zero else (values > 0))]
+
+
+class TickerIndex:
+    """一只股票 [start, end] 期间的估值历史索引。
+
+    各字段的原始取值按日期排列；ranked 中的字段另按 BLOCK_SIZE 行分块，块内有效值预先排序：
+    任意 [since, before) 窗口中有多少历史值不高于某个值，只需在整块上二分查找、在首尾两块上逐个比较，
+    不再对整段历史做布尔筛选和排序。对象创建后不再修改，追加新行时返回新对象。
+
+    - dates: 交易日（YYYYMMDD 整数），升序
+    - values: 字段名 -> 与 dates 对齐的取值
+    - ranked: 建立分块索引的字段 -> 是否允许 0（PE 只统计正值，PB/PS 统计非负值）
+    - start/end: 已从存储读入的日期区间
+    """
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        values: Dict[str, np.ndarray],
+        ranked: Dict[str, bool],
+        start: str,
+        end: str,
+        blocks: Optional[Dict[str, List[np.ndarray]]] = None,
+    ) -> None:
+        self.dates = dates
+        self.values = values
+        self.ranked = ranked
+        self.start = start
+        self.end = end
+        self.blocks = blocks if blocks is not None else {}
+        n_blocks = math.ceil(len(dates) / BLOCK_SIZE)
+        for name, allow_zero in ranked.items():
+            built = self.blocks.setdefault(name, [])
+            # 最后一个块可能在追加新行后变长，从它开始重新排序
+            del built[max(0, len(built) - 1):]
+            for b in range(len(built), n_blocks):
+                block = values[name][b * BLOCK_SIZE:(b + 1) * BLOCK_SIZE]
+                built.append(np.sort(_valid(block, allow_zero)))
+        self._merged: Dict[str, Tuple[int, int, np.ndarray]] = {}
+        self._merged_lock = threading.Lock()
+
+    def extend(self, dates: np.ndarray, values: Dict[str, np.ndarray], end: str) -> "TickerIndex":
+        """返回追加了 end 之前新行的索引：只重新排序最后一个块和新增的块。"""
+        return TickerIndex(
+            np.concatenate([self.dates, dates]),
+            {name: np.concatenate([self.values[name], values[name]]) for name in self.values},
+            self.ranked,
+            self.start,
+            end,
+            {name: list(blocks) for name, blocks in self.blocks.items()},
+        )
+
+    def row(self, date: str) -> Optional[int]:
+        """date 当日所在的行，没有数据时返回 None。"""
+        i = int(np.searchsorted(self.dates, int(date)))
+        return i if i < len(self.dates) and self.dates[i] == int(date) else None
+
+    def window(self, since: str, before: str) -> Tuple[int, int]:
+        """[since, before) 期间的行号范围 [lo, hi)。"""
+        return (
+            int(np.searchsorted(self.dates, int(since))),
+            int(np.searchsorted(self.dates, int(before))),
+        )
+
+    def _parts(self, name: str, lo: int, hi: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """把 [lo, hi) 拆成已排序的整块和首尾两段未排序的有效值。"""
+        allow_zero = self.ranked[name]
+        raw = self.values[name]
+        first, last = -(-lo // BLOCK_SIZE), hi // BLOCK_SIZE
+        if first >= last:
+            return [], [_valid(raw[lo:hi], allow_zero)]
+        edges = [
+            _valid(raw[lo:first * BLOCK_SIZE], allow_zero),
+            _valid(raw[last * BLOCK_SIZE:hi], allow_zero),
+        ]
+        return self.blocks[name][first:last], edges
+
+    def count(self, name: str, lo: int, hi: int) -> int:
+        """[lo, hi) 行中 name 的有效历史值个数。"""
+        blocks, edges = self._parts(name, lo, hi)
+        return sum(len(b) for b in blocks) + sum(len(e) for e in edges)
+
+    def rank(self, name: str, value: float, lo: int, hi: int) -> Tuple[int, int]:
+        """返回 (有效历史值个数, 其中不高于 value 的个数)。"""
+        blocks, edges = self._parts(name, lo, hi)
+        count = sum(len(b) for b in blocks) + sum(len(e) for e in edges)
+        below = sum(int(np.searchsorted(b, value, side="right")) for b in blocks)
+        below += sum(int(np.count_nonzero(e <= value)) for e in edges)
+        return count, below
+
+    def sorted_values(self, name: str, lo: int, hi: int) -> np.ndarray:
+        """[lo, hi) 行中 name 的有效历史值，升序（由各块的有序结果归并得到，按字段缓存最近一次）。"""
+        with self._merged_lock:
+            cached = self._merged.get(name)
+            if cached is not None and cached[:2] == (lo, hi):
+                return cached[2]
+        blocks, edges = self._parts(name, lo, hi)
+        # 各段已有序（首尾两段很短），稳定排序按有序段归并
+        merged = np.sort(np.concatenate([*blocks, *(np.sort(e) for e in edges)]), kind="stable")
+        with self._merged_lock:
+            self._merged[name] = (lo, hi, merged)
+        return merged
+
+
+def _covered_end(trade_date: str, last: Optional[str]) -> str:
+    """本次读入后可视为已覆盖的最后一天：当日数据盘后才发布，未拿到当日行时不把今天记为已覆盖。"""
+    today = cn_today()
+    if trade_date < today:
+        return trade_date
+    return min(trade_date, max(_shift_day(today, -1), last or ""))
+
+
+class ValuationIndex:
+    """按股票缓存的估值历史索引，建立在 FactorStore 之上。
+
+    第一次查询某只股票时从本地存储读取所需区间建立 TickerIndex；之后查询更晚的日期只读取新增的行，
+    查询更早的日期时向前重建。任意日期、任意数量股票的分位查询都在内存中完成，不再逐次读取、筛选多年历史。
+    最近使用的 cache_size 只股票保留在内存中（约每只 100KB）。
+
+    - store: 因子存储
+    - fields: 需要保留原始取值的字段（当日估值、股息率、市值等）
+    - ranked: 建立分块索引的字段 -> 是否允许 0
+    - cache_size: 内存中保留的股票数，默认 VALUATION_INDEX_SIZE
+    """
+
+    def __init__(
+        self,
+        store: FactorStore,
+        fields: List[str],
+        ranked: Dict[str, bool],
+        cache_size: Optional[int] = None,
+    ) -> None:
+        self.store = store
+        self.fields = list(dict.fromkeys([*fields, *ranked]))
+        self.ranked = ranked
+        self.cache_size = VALUATION_INDEX_SIZE if cache_size is None else cache_size
+        self._cache: "OrderedDict[Tuple[str, str], TickerIndex]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _get(self, ts_code: str) -> Optional[TickerIndex]:
+        with self._cache_lock:
+            key = (self.store.root, ts_code)
+            index = self._cache.get(key)
+            if index is not None:
+                self._cache.move_to_end(key)
+            return index
+
+    def _remember(self, ts_code: str, index: TickerIndex) -> TickerIndex:
+        with self._cache_lock:
+            key = (self.store.root, ts_code)
+            self._cache[key] = index
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return index
+
+    def invalidate(self, ts_code: str) -> None:
+        """丢弃某只股票的索引（下次查询时从存储重建）。"""
+        with self._cache_lock:
+            self._cache.pop((self.store.root, ts_code), None)
+
+    def _read(
+        self, ts_codes: List[str], start_date: str, end_date: str
+    ) -> Dict[str, Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """从存储批量读取 [start_date, end_date]，返回每只股票按日期排列的 (dates, values)。"""
+        df = self.store.load_many(
+            ts_codes, start_date, end_date, columns=["ts_code", "trade_date", *self.fields]
+        )
+        if df.empty:
+            return {}
+        df = df.sort_values(["ts_code", "trade_date"], kind="stable")
+        parts: Dict[str, Tuple[np.ndarray, Dict[str, np.ndarray]]] = {}
+        for code, part in df.groupby("ts_code", sort=False):
+            dates = part["trade_date"].astype("int64").to_numpy()
+            values = {
+                name: (
+                    pd.to_numeric(part[name], errors="coerce").to_numpy(dtype=float)
+                    if name in part.columns else np.full(len(part), np.nan)
+                )
+                for name in self.fields
+            }
+            parts[str(code)] = (dates, values)
+        return parts
+
+    def load(self, ts_codes: List[str], start_date: str, trade_date: str) -> Dict[str, TickerIndex]:
+        """返回覆盖 [start_date, trade_date] 的各股票索引；存储中没有数据的股票不在返回结果中。"""
+        ts_codes = list(dict.fromkeys(ts_codes))
+        indexes: Dict[str, TickerIndex] = {}
+        rebuild: Dict[Tuple[str, str], List[str]] = {}
+        updates: Dict[str, List[str]] = {}
+        for code in ts_codes:
+            index = self._get(code)
+            if index is None or index.start > start_date:
+                end = trade_date if index is None else max(trade_date, index.end)
+                rebuild.setdefault((start_date, end), []).append(code)
+                continue
+            indexes[code] = index
+            if index.end < trade_date:
+                updates.setdefault(index.end, []).append(code)
+        misses = sum(len(codes) for codes in rebuild.values())
+        stats.record_cache("valuation_index", len(ts_codes) - misses, misses)
+
+        # 增量更新：已覆盖到同一天的股票合并为一次存储读取，只读取之后的新行
+        for end, codes in updates.items():
+            parts = self._read(codes, _shift_day(end, 1), trade_date)
+            for code in codes:
+                index = indexes[code]
+                dates, values = parts.get(
+                    code, (np.empty(0, dtype="int64"), {name: np.empty(0) for name in self.fields})
+                )
+                last = str(dates[-1]) if len(dates) else index.end
+                indexes[code] = self._remember(
+                    code, index.extend(dates, values, max(index.end, _covered_end(trade_date, last)))
+                )
+
+        # 重建：区间相同的股票合并为一次存储读取
+        for (start, end), codes in rebuild.items():
+            parts = self._read(codes, start, end)
+            for code in codes:
+                if code not in parts:
+                    continue
+                dates, values = parts[code]
+                index = TickerIndex(
+                    dates, values, self.ranked, start, _covered_end(end, str(dates[-1]))
+                )
+                indexes[code] = self._remember(code, index)
+        return indexes
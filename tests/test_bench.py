@@ -0,0 +1,24 @@
+import json
+import os
+import subprocess
+import sys
+from typing import Any
+
+
+BENCH = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "bench_tools.py")
+
+
+def test_bench_tools_smoke(tmp_path: Any) -> None:
+    """小规模跑一遍全部基准场景：各工具在模拟 Tushare 上都能返回结果（不检查耗时）。"""
+    out = tmp_path / "bench.json"
+    proc = subprocess.run(
+        [sys.executable, BENCH, "--market", "50", "--repeat", "1", "--json", str(out)],
+        capture_output=True, text=True, timeout=600,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+
+    results = json.loads(out.read_text(encoding="utf-8"))["results"]
+    assert results
+    for name, row in results.items():
+        assert row["error"] is None, name
+        assert row["payload_bytes"] > 0, name
@@ -0,0 +1,171 @@
+import time
+from typing import Any, Dict, List
+
+import pandas as pd
+import pytest
+
+from fake_tushare import FakeProApi
+from tushare_mcp_server.cache import FrameCache
+from tushare_mcp_server.client import TushareClient
+
+
+DATES = ["20261012", "20261013", "20261014", "20261015", "20261016"]
+
+
+def daily(ts_code: str = "000001.SZ") -> pd.DataFrame:
+    return pd.DataFrame({
+        "ts_code": ts_code,
+        "trade_date": DATES,
+        "open": [10.0, 10.1, 10.2, 10.3, 10.4],
+        "close": [10.1, 10.2, 10.3, 10.4, 10.5],
+    })
+
+
+def make_cache(**kwargs: Any) -> FrameCache:
+    options: Dict[str, Any] = {"max_bytes": 1 << 20, "ttls": {}, "default_ttl": 60, "policy": None, "shared": None}
+    options.update(kwargs)
+    return FrameCache(**options)
+
+
+def week(**kwargs: Any) -> Dict[str, Any]:
+    return {"ts_code": "000001.SZ", "start_date": "20261012", "end_date": "20261016", **kwargs}
+
+
+def test_exact_hit_returns_copy() -> None:
+    cache = make_cache()
+    cache.put("daily", week(), daily())
+    df = cache.get("daily", week())
+    pd.testing.assert_frame_equal(df, daily())
+    df.loc[0, "close"] = 0
+    assert cache.get("daily", week()).loc[0, "close"] == 10.1
+
+
+def test_narrower_range_is_sliced() -> None:
+    cache = make_cache()
+    cache.put("daily", week(), daily())
+
+    df = cache.get("daily", week(start_date="20261013", end_date="20261015"))
+    assert list(df["trade_date"]) == DATES[1:4]
+    assert list(df.index) == [0, 1, 2]
+
+    df = cache.get("daily", {"ts_code": "000001.SZ", "trade_date": "20261014"})
+    assert list(df["trade_date"]) == ["20261014"]
+
+
+@pytest.mark.parametrize("kwargs", [
+    week(start_date="20261009"),  # 超出缓存的区间
+    week(end_date="20261019"),
+    week(ts_code="600000.SH"),  # 其余参数不同
+    week(adj="qfq"),
+    {"ts_code": "000001.SZ"},  # 未指定区间
+])
+def test_uncovered_queries_miss(kwargs: Dict[str, Any]) -> None:
+    cache = make_cache()
+    cache.put("daily", week(), daily())
+    assert cache.get("daily", kwargs) is None
+
+
+def test_fields_subset() -> None:
+    cache = make_cache()
+    cache.put("daily", week(fields="ts_code,trade_date,close"), daily()[["ts_code", "trade_date", "close"]])
+
+    df = cache.get("daily", week(start_date="20261014", fields="trade_date,close"))
+    assert list(df.columns) == ["trade_date", "close"]
+    assert list(df["trade_date"]) == DATES[2:]
+    # 缓存中没有的字段、或未指定字段（接口默认返回全部字段）时不能回答
+    assert cache.get("daily", week(start_date="20261014", fields="trade_date,open")) is None
+    assert cache.get("daily", week(start_date="20261014")) is None
+
+
+def test_range_column_per_api() -> None:
+    cache = make_cache()
+    # fina_indicator 的 start_date/end_date 是报告期：按 end_date 列切片，不按公告日
+    frame = pd.DataFrame({
+        "ts_code": "000001.SZ",
+        "ann_date": ["20260428", "20260830"],
+        "end_date": ["20260331", "20260630"],
+        "roe": [1.0, 2.0],
+    })
+    kwargs = {"ts_code": "000001.SZ", "start_date": "20260101", "end_date": "20261231"}
+    cache.put("fina_indicator", kwargs, frame)
+    df = cache.get("fina_indicator", {**kwargs, "start_date": "20260401"})
+    assert list(df["end_date"]) == ["20260630"]
+
+    # balancesheet 的 start_date/end_date 是公告日
+    cache.put("balancesheet", kwargs, frame)
+    df = cache.get("balancesheet", {**kwargs, "start_date": "20260701"})
+    assert list(df["ann_date"]) == ["20260830"]
+
+
+def test_fetch_loads_once_for_contained_ranges() -> None:
+    cache = make_cache()
+    loads: List[str] = []
+
+    def load() -> pd.DataFrame:
+        loads.append("daily")
+        return daily()
+
+    cache.fetch("daily", week(), load)
+    cache.fetch("daily", week(start_date="20261014"), load)
+    cache.fetch("daily", {"ts_code": "000001.SZ", "trade_date": "20261016"}, load)
+    assert loads == ["daily"]
+
+
+@pytest.mark.parametrize("paging", [{"limit": 100}, {"offset": 100}])
+def test_limit_and_offset_bypass(paging: Dict[str, int]) -> None:
+    fake = FakeProApi(market_size=10, today=DATES[-1])
+    client = TushareClient(pro=fake, cache=make_cache())
+    assert not client.cache.enabled("moneyflow", week(**paging))
+
+    for _ in range(2):
+        client.moneyflow(**week(**paging))
+    assert fake.calls["moneyflow"] == 2
+    assert client.cache.snapshot()["entries"] == 0
+
+    for _ in range(2):
+        client.moneyflow(**week())
+    assert fake.calls["moneyflow"] == 3
+
+
+def test_zero_ttl_disables_api() -> None:
+    cache = make_cache(ttls={"stk_factor_pro": 0})
+    assert not cache.enabled("stk_factor_pro", week())
+    assert cache.ttl("daily") == 60
+
+
+def test_ttl_expiry(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = make_cache(ttls={"daily": 60})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.put("daily", week(), daily())
+
+    monkeypatch.setattr(time, "time", lambda: now + 59)
+    assert cache.get("daily", week()) is not None
+    assert cache.get("daily", week(start_date="20261014")) is not None
+
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    assert cache.get("daily", week(start_date="20261014")) is None
+    assert cache.get("daily", week()) is None
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted() -> None:
+    size = int(daily().memory_usage(index=True, deep=True).sum())
+    cache = make_cache(max_bytes=size * 2)
+    for code in ("000001.SZ", "000002.SZ"):
+        cache.put("daily", week(ts_code=code), daily(code))
+    assert cache.get("daily", week(ts_code="000001.SZ")) is not None  # 000001 变为最近使用
+
+    cache.put("daily", week(ts_code="000003.SZ"), daily("000003.SZ"))
+    assert cache.get("daily", week(ts_code="000002.SZ")) is None
+    assert cache.get("daily", week(ts_code="000001.SZ")) is not None
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_invalidate_by_api() -> None:
+    cache = make_cache()
+    cache.put("daily", week(), daily())
+    cache.put("weekly", week(), daily())
+    cache.invalidate("daily")
+    assert cache.get("daily", week()) is None
+    assert cache.get("weekly", week()) is not None
@@ -0,0 +1,134 @@
+from typing import Hashable, List
+
+import anyio
+import pytest
+
+from tushare_mcp_server.concurrency import FairLimiter
+
+
+async def _queue(
+    tg: anyio.abc.TaskGroup, limiter: FairLimiter, client: Hashable, name: str, granted: List[str]
+) -> None:
+    """排入一个调用：放行后记录 name，不自动归还名额。等到该调用进入等待后才返回，保证排队顺序。"""
+
+    async def waiter() -> None:
+        await limiter.acquire(client)
+        granted.append(name)
+
+    tg.start_soon(waiter)
+    await anyio.wait_all_tasks_blocked()
+
+
+def test_idle_calls_run_immediately() -> None:
+    async def main() -> None:
+        limiter = FairLimiter(2)
+        await limiter.acquire("a")
+        await limiter.acquire("b")
+        assert limiter.snapshot()["running"] == 2
+        limiter.release("a")
+        limiter.release("b")
+        assert limiter.snapshot() == {
+            "max_workers": 2, "client_max_workers": 2, "running": 0, "waiting": 0, "clients": 0,
+        }
+
+    anyio.run(main)
+
+
+def test_other_client_is_served_before_a_backlog() -> None:
+    async def main() -> None:
+        limiter = FairLimiter(2)
+        granted: List[str] = []
+        await limiter.acquire("a")
+        await limiter.acquire("a")
+        async with anyio.create_task_group() as tg:
+            for i in range(3):
+                await _queue(tg, limiter, "a", f"a{i}", granted)
+            await _queue(tg, limiter, "b", "b0", granted)
+            assert limiter.snapshot()["waiting"] == 4
+
+            # b 当前没有执行中的调用，空出的第一个名额给 b，而不是 a 排在前面的调用
+            limiter.release("a")
+            await anyio.wait_all_tasks_blocked()
+            assert granted == ["b0"]
+
+            # 之后 a 的调用按先后顺序放行
+            for _ in range(3):
+                limiter.release("a")
+                await anyio.wait_all_tasks_blocked()
+            assert granted == ["b0", "a0", "a1", "a2"]
+
+    anyio.run(main)
+
+
+def test_fewest_active_client_first_ties_by_queue_order() -> None:
+    async def main() -> None:
+        limiter = FairLimiter(3)
+        granted: List[str] = []
+        for client in ("a", "a", "b"):
+            await limiter.acquire(client)
+        async with anyio.create_task_group() as tg:
+            await _queue(tg, limiter, "b", "b0", granted)
+            await _queue(tg, limiter, "c", "c0", granted)
+            await _queue(tg, limiter, "a", "a0", granted)
+
+            # a、b、c 执行数为 1、1、0：先给 c
+            limiter.release("a")
+            await anyio.wait_all_tasks_blocked()
+            # a、b、c 执行数为 0、1、1：再给 a
+            limiter.release("a")
+            await anyio.wait_all_tasks_blocked()
+            # 执行数相同时给最早排队的 b
+            limiter.release("c")
+            await anyio.wait_all_tasks_blocked()
+            assert granted == ["c0", "a0", "b0"]
+
+    anyio.run(main)
+
+
+def test_per_client_cap_leaves_room_for_others() -> None:
+    async def main() -> None:
+        limiter = FairLimiter(4, per_client=2)
+        granted: List[str] = []
+        await limiter.acquire("a")
+        await limiter.acquire("a")
+        async with anyio.create_task_group() as tg:
+            # a 已达上限，即使还有空闲名额也要排队
+            await _queue(tg, limiter, "a", "a0", granted)
+            assert granted == []
+            # 其他客户端不受 a 排队的影响，直接使用空闲名额
+            await _queue(tg, limiter, "b", "b0", granted)
+            await _queue(tg, limiter, "b", "b1", granted)
+            assert granted == ["b0", "b1"]
+            assert limiter.snapshot()["running"] == 4
+
+            limiter.release("b")
+            await anyio.wait_all_tasks_blocked()
+            assert granted == ["b0", "b1"]  # 空出的名额不能给已达上限的 a
+            limiter.release("a")
+            await anyio.wait_all_tasks_blocked()
+            assert granted == ["b0", "b1", "a0"]
+
+    anyio.run(main)
+
+
+def test_cancelled_waiter_leaves_queue() -> None:
+    async def main() -> None:
+        limiter = FairLimiter(1)
+        granted: List[str] = []
+        await limiter.acquire("a")
+        async with anyio.create_task_group() as tg:
+            await _queue(tg, limiter, "b", "b0", granted)
+            assert limiter.snapshot()["waiting"] == 1
+            tg.cancel_scope.cancel()
+        assert limiter.snapshot()["waiting"] == 0
+        limiter.release("a")
+        assert granted == []
+        assert limiter.snapshot()["running"] == 0
+
+    anyio.run(main)
+
+
+@pytest.mark.parametrize("total, per_client, expected", [(0, None, (1, 1)), (4, 8, (4, 4)), (4, 0, (4, 4))])
+def test_limits_are_clamped(total: int, per_client: int, expected: tuple) -> None:
+    limiter = FairLimiter(total, per_client)
+    assert (limiter.total, limiter.per_client) == expected
@@ -0,0 +1,124 @@
+import math
+from datetime import datetime
+from typing import Any, List
+
+import pandas as pd
+import pytest
+
+from tushare_mcp_server.common import CN_TZ
+from tushare_mcp_server.freshness import FreshnessPolicy, publish_at, published
+from tushare_mcp_server.trade_calendar import TradingCalendar
+
+
+TTL = 300
+
+
+def at(day: str, hhmm: str) -> float:
+    """北京时间 day hh:mm 的时间戳。"""
+    return datetime.strptime(day + hhmm, "%Y%m%d%H:%M").replace(tzinfo=CN_TZ).timestamp()
+
+
+def trade_cal(**kwargs: Any) -> pd.DataFrame:
+    # 2026 年的工作日都是交易日
+    days = pd.date_range("20260101", "20261231")
+    return pd.DataFrame({
+        "cal_date": days.strftime("%Y%m%d"),
+        "is_open": (days.dayofweek < 5).astype(int),
+    })
+
+
+@pytest.fixture
+def policy(tmp_path: Any) -> FreshnessPolicy:
+    return FreshnessPolicy(TradingCalendar(trade_cal, cache_dir=str(tmp_path)))
+
+
+def frame(dates: List[str]) -> pd.DataFrame:
+    return pd.DataFrame({"ts_code": "000001.SZ", "trade_date": dates})
+
+
+def test_publish_at_uses_beijing_time() -> None:
+    assert publish_at("daily_basic", "20261014") == at("20261014", "17:00")
+    assert publish_at("moneyflow_hsgt", "20261014") == at("20261014", "20:00")
+    assert publish_at("not_listed", "20261014") == at("20261014", "18:00")
+    assert not published("daily_basic", "20261014", now=at("20261014", "16:59"))
+    assert published("daily_basic", "20261014", now=at("20261014", "17:00"))
+    assert published("daily_basic", "20261013", now=at("20261014", "09:00"))
+
+
+@pytest.mark.parametrize("now, expected", [
+    (at("20261014", "12:00"), ("20261013", "20261014")),  # 交易日、发布前
+    (at("20261014", "17:30"), ("20261014", "20261015")),  # 交易日、发布后
+    (at("20261017", "12:00"), ("20261016", "20261019")),  # 周六
+])
+def test_settled(policy: FreshnessPolicy, now: float, expected: tuple) -> None:
+    assert policy.settled("daily_basic", now) == expected
+
+
+def test_settled_range_never_expires(policy: FreshnessPolicy) -> None:
+    now = at("20261014", "12:00")
+    df = frame(["20261012", "20261013"])
+    assert policy.expires("daily_basic", ("20261012", "20261013"), df, now, TTL) == math.inf
+    # 周末查询上一周
+    now = at("20261017", "12:00")
+    df = frame(["20261012", "20261016"])
+    assert policy.expires("daily_basic", ("20261012", "20261016"), df, now, TTL) == math.inf
+
+
+def test_pending_day_expires_at_next_publish(policy: FreshnessPolicy) -> None:
+    now = at("20261014", "12:00")
+    df = frame(["20261012", "20261013"])
+    expected = at("20261014", "17:00")
+    assert policy.expires("daily_basic", ("20261012", "20261014"), df, now, TTL) == expected
+    assert policy.expires("daily_basic", None, df, now, TTL) == expected
+    assert policy.expires("moneyflow", ("20261012", "20261014"), df, now, TTL) == at("20261014", "19:00")
+
+    # 周五发布后：下一个交易日是下周一
+    now = at("20261016", "18:00")
+    df = frame(["20261016"])
+    assert policy.expires("daily_basic", ("20261016", "20261016"), df, now, TTL) == math.inf
+    assert policy.expires("daily_basic", ("20261016", "20261019"), df, now, TTL) == at("20261019", "17:00")
+
+
+def test_missing_settled_row_falls_back_to_ttl(policy: FreshnessPolicy) -> None:
+    now = at("20261014", "12:00")
+    late = frame(["20261012"])  # 缺少已发布的 20261013
+    assert policy.expires("daily_basic", ("20261012", "20261013"), late, now, TTL) == now + TTL
+    assert policy.expires("daily_basic", ("20261012", "20261014"), late, now, TTL) == now + TTL
+    # 最近已发布交易日不在区间内时不判断
+    assert policy.expires("daily_basic", ("20261001", "20261012"), late, now, TTL) == math.inf
+    # 周线等不是每个交易日都有行的接口不判断
+    assert policy.expires("index_weekly", ("20261012", "20261013"), late, now, TTL) == math.inf
+
+
+def test_announcement_apis(policy: FreshnessPolicy) -> None:
+    now = at("20261014", "12:00")  # 最后一个已发布的交易日为 20261013
+    df = pd.DataFrame({"ts_code": ["000001.SZ"], "ann_date": ["20260830"]})
+    assert policy.expires("stk_holdernumber", ("20260101", "20261012"), df, now, TTL) == math.inf
+    # 最后一个已发布交易日当天的公告可能尚未入库
+    assert policy.expires("stk_holdernumber", ("20260101", "20261013"), df, now, TTL) == now + TTL
+    assert policy.expires("top10_floatholders", None, df, now, TTL) == now + TTL
+
+
+@pytest.mark.parametrize("api", ["fina_indicator", "income", "balancesheet", "cashflow"])
+def test_statements_use_ttl(policy: FreshnessPolicy, api: str) -> None:
+    # fina_indicator/income 的 end_date 是报告期：已过去的报告期仍会公告，更正公告沿用原公告日
+    now = at("20261014", "12:00")
+    df = pd.DataFrame({"ts_code": ["000001.SZ"], "ann_date": ["20260830"], "end_date": ["20260630"]})
+    assert policy.expires(api, ("20250101", "20250930"), df, now, TTL) == now + TTL
+
+
+def test_reference_apis_use_ttl(policy: FreshnessPolicy) -> None:
+    now = at("20261014", "12:00")
+    df = pd.DataFrame({"cal_date": ["20261012"], "is_open": [1]})
+    assert policy.expires("trade_cal", ("20261001", "20261012"), df, now, 86400) == now + 86400
+    assert policy.expires("stock_basic", None, df, now, TTL) == now + TTL
+
+
+def test_unavailable_calendar_falls_back_to_ttl(tmp_path: Any) -> None:
+    def fail(**kwargs: Any) -> pd.DataFrame:
+        raise ConnectionError("trade_cal unavailable")
+
+    policy = FreshnessPolicy(TradingCalendar(fail, cache_dir=str(tmp_path)))
+    now = at("20261014", "12:00")
+    df = frame(["20261012", "20261013"])
+    assert policy.expires("daily_basic", ("20261012", "20261013"), df, now, TTL) == now + TTL
@@ -0,0 +1,144 @@
+import asyncio
+import json
+from typing import Any, Callable, Dict, List
+
+import httpx
+import pandas as pd
+import pytest
+
+from fake_tushare import FakeProApi
+from tushare_mcp_server.client import classify_error
+from tushare_mcp_server.http_client import AsyncDataApi, SyncDataApi
+
+
+URL = "http://tushare.test/dataapi"
+
+
+def make_api(handler: Callable[[httpx.Request], httpx.Response]) -> AsyncDataApi:
+    return AsyncDataApi("token", url=URL, transport=httpx.MockTransport(handler))
+
+
+def query(api: AsyncDataApi, api_name: str, **kwargs: Any) -> pd.DataFrame:
+    async def run() -> pd.DataFrame:
+        try:
+            return await api.query(api_name, **kwargs)
+        finally:
+            await api.aclose()
+
+    return asyncio.run(run())
+
+
+def ok(fields: List[str], items: List[List[Any]]) -> httpx.Response:
+    data = {"fields": fields, "items": items}
+    return httpx.Response(200, json={"code": 0, "msg": "", "data": data})
+
+
+def test_decodes_fields_and_items() -> None:
+    requests: List[Dict[str, Any]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append({"url": str(request.url), **json.loads(request.content)})
+        return ok(
+            ["ts_code", "trade_date", "pe_ttm"],
+            [["000001.SZ", "20240115", 4.5], ["600000.SH", "20240115", None]],
+        )
+
+    df = query(make_api(handler), "daily_basic", fields="ts_code,trade_date,pe_ttm", trade_date="20240115")
+
+    assert list(df.columns) == ["ts_code", "trade_date", "pe_ttm"]
+    assert df["ts_code"].tolist() == ["000001.SZ", "600000.SH"]
+    assert df["pe_ttm"].iloc[0] == 4.5 and pd.isna(df["pe_ttm"].iloc[1])
+    # 请求格式与 ts.pro_api() 相同
+    (sent,) = requests
+    assert sent["url"] == f"{URL}/daily_basic"
+    assert sent["api_name"] == "daily_basic"
+    assert sent["token"] == "token"
+    assert sent["fields"] == "ts_code,trade_date,pe_ttm"
+    assert sent["params"]["trade_date"] == "20240115"
+
+
+def test_matches_fake_backend() -> None:
+    fake = FakeProApi(market_size=20, today="20241231")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        params = {k: v for k, v in payload["params"].items() if k != "ts_type_name"}
+        df = fake.query(payload["api_name"], fields=payload["fields"], **params)
+        items = df.astype(object).where(df.notna(), None).values.tolist()
+        return ok(list(df.columns), items)
+
+    fields = "ts_code,trade_date,close,pe_ttm,total_mv"
+    df = query(make_api(handler), "daily_basic", fields=fields, trade_date="20241220")
+    expected = fake.query("daily_basic", fields=fields, trade_date="20241220")
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+def test_empty_result() -> None:
+    api = make_api(lambda request: ok(["ts_code", "trade_date"], []))
+    df = query(api, "daily_basic", trade_date="20240113")
+    assert df.empty and list(df.columns) == ["ts_code", "trade_date"]
+
+
+def test_api_error_is_not_retried() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"code": 40203, "msg": "抱歉，您没有访问该接口的权限", "data": None})
+
+    with pytest.raises(RuntimeError, match="没有访问该接口的权限") as info:
+        query(make_api(handler), "stk_factor_pro", ts_code="000001.SZ")
+    assert classify_error(info.value) is None
+
+
+def test_quota_message_is_retryable() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        msg = "抱歉，您每分钟最多访问该接口200次"
+        return httpx.Response(200, json={"code": 40203, "msg": msg, "data": None})
+
+    with pytest.raises(RuntimeError) as info:
+        query(make_api(handler), "daily_basic", trade_date="20240115")
+    assert classify_error(info.value) == "quota"
+
+
+def test_http_429_is_quota_error() -> None:
+    with pytest.raises(RuntimeError) as info:
+        query(make_api(lambda request: httpx.Response(429)), "daily_basic", trade_date="20240115")
+    assert classify_error(info.value) == "quota"
+
+
+@pytest.mark.parametrize("status", [500, 502, 503])
+def test_http_5xx_is_transient(status: int) -> None:
+    with pytest.raises(ConnectionError) as info:
+        query(make_api(lambda request: httpx.Response(status)), "daily_basic", trade_date="20240115")
+    assert classify_error(info.value) == "transient"
+
+
+def test_http_4xx_is_not_retried() -> None:
+    with pytest.raises(RuntimeError, match="HTTP 404") as info:
+        query(make_api(lambda request: httpx.Response(404)), "daily_basic", trade_date="20240115")
+    assert classify_error(info.value) is None
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (httpx.ConnectTimeout("connect timed out"), TimeoutError),
+        (httpx.ReadTimeout("read timed out"), TimeoutError),
+        (httpx.ConnectError("connection refused"), ConnectionError),
+        (httpx.RemoteProtocolError("server disconnected"), ConnectionError),
+    ],
+)
+def test_transport_errors(error: httpx.TransportError, expected: type) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise error
+
+    with pytest.raises(expected) as info:
+        query(make_api(handler), "daily_basic", trade_date="20240115")
+    assert classify_error(info.value) == "transient"
+
+
+def test_sync_facade_runs_on_background_loop() -> None:
+    api = SyncDataApi(make_api(lambda request: ok(["ts_code"], [["000001.SZ"]])))
+    try:
+        assert api.daily_basic(trade_date="20240115")["ts_code"].tolist() == ["000001.SZ"]
+        assert api.query("daily_basic", trade_date="20240116")["ts_code"].tolist() == ["000001.SZ"]
+    finally:
+        api.close()
@@ -0,0 +1,46 @@
+from typing import Any
+
+import pandas as pd
+import pytest
+
+from tushare_mcp_server import industry
+from tushare_mcp_server.industry import RANK_CACHE_DATES, IndustryRanks
+
+
+def fetch_basic(trade_date: str, fields: str) -> pd.DataFrame:
+    return pd.DataFrame({
+        "ts_code": ["000001.SZ", "600000.SH"], "trade_date": trade_date, "close": [10.0, 8.0],
+        "pe_ttm": [5.0, 6.0], "pb": [0.6, 0.5], "ps_ttm": [1.0, 2.0], "dv_ttm": [4.0, 5.0],
+        "total_mv": [2e6, 3e6],
+    })
+
+
+def fetch_members(is_new: str, fields: str) -> pd.DataFrame:
+    if is_new == "N":
+        return pd.DataFrame()
+    return pd.DataFrame({
+        "ts_code": ["000001.SZ", "600000.SH"], "name": ["平安银行", "浦发银行"],
+        "l1_code": "801780.SI", "l1_name": "银行", "l2_code": "801783.SI", "l2_name": "股份制银行Ⅱ",
+        "l3_code": "857831.SI", "l3_name": "股份制银行Ⅲ", "in_date": "20000101", "out_date": None,
+    })
+
+
+@pytest.fixture
+def ranks(monkeypatch: pytest.MonkeyPatch, tmp_path: Any) -> IndustryRanks:
+    monkeypatch.setattr(industry, "cn_today", lambda: "20260116")
+    monkeypatch.setattr(industry, "published", lambda api, day: True)
+    return IndustryRanks(fetch_basic, fetch_members, cache_dir=str(tmp_path))
+
+
+def test_date_locks_are_evicted_with_ranks(ranks: IndustryRanks) -> None:
+    days = [d.strftime("%Y%m%d") for d in pd.bdate_range("20250101", periods=RANK_CACHE_DATES * 3)]
+    for day in days:
+        df = ranks.ranks(day)
+        assert list(df["pb_l1_rank"]) == [100.0, 50.0]
+    assert list(ranks._ranks) == days[-RANK_CACHE_DATES:]
+    assert set(ranks._date_locks) <= set(ranks._ranks)
+
+    # 已淘汰的交易日从磁盘读回
+    ranks.ranks(days[0])
+    assert list(ranks._ranks)[-1] == days[0]
+    assert set(ranks._date_locks) <= set(ranks._ranks)
@@ -0,0 +1,226 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tushare_mcp_server import store as store_module
+from tushare_mcp_server.store import FactorStore, _missing_intervals, _qfq_base, _same_base
+from tushare_mcp_server.tech_ext import _rebase_qfq
+
+
+# 复权因子：20260108、20260119 两次除权除息
+ADJ_STEPS = [("00000000", 2.0), ("20260108", 2.345), ("20260119", 2.9)]
+
+
+def adj_factor(day: str) -> float:
+    return [factor for start, factor in ADJ_STEPS if start <= day][-1]
+
+
+def weekdays(start: str, end: str) -> List[str]:
+    return [d.strftime("%Y%m%d") for d in pd.bdate_range(start, end)]
+
+
+class ExDividendBackend:
+    """按 stk_factor_pro 的口径生成数据：前复权价 = 原始价 × 复权因子 / 最新复权因子，保留两位小数。
+
+    - today: 当前日期，最新复权因子取今天及之前最后一个交易日的因子
+    - publish_today: 今天的行是否已发布
+    """
+
+    def __init__(self, today: str, publish_today: bool = True) -> None:
+        self.today = today
+        self.publish_today = publish_today
+        self.calls: List[Dict[str, Any]] = []
+
+    def close(self, ts_code: str, day: str) -> float:
+        # 低价股：两位小数的舍入误差相对更大
+        return round(3.0 + (int(day) % 97) * 0.013 + int(ts_code[:6]) % 7 * 0.1, 2)
+
+    def __call__(
+        self,
+        ts_code: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        trade_date: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> pd.DataFrame:
+        self.calls.append({"ts_code": ts_code, "start_date": start_date, "end_date": end_date,
+                           "trade_date": trade_date})
+        last = self.today if self.publish_today else store_module._shift_day(self.today, -1)
+        days = [trade_date] if trade_date else weekdays(start_date, end_date)
+        days = [d for d in days if d <= last]
+        base = adj_factor(weekdays("20260101", last)[-1])
+        codes = ts_code.split(",") if ts_code else ["000001.SZ", "600000.SH"]
+        rows = []
+        for code in codes:
+            for day in days:
+                close = self.close(code, day)
+                rows.append({
+                    "ts_code": code,
+                    "trade_date": day,
+                    "close": close,
+                    "adj_factor": adj_factor(day),
+                    "close_qfq": round(close * adj_factor(day) / base, 2),
+                })
+        df = pd.DataFrame(rows, columns=["ts_code", "trade_date", "close", "adj_factor", "close_qfq"])
+        return df.sort_values("trade_date", ascending=False).reset_index(drop=True)
+
+
+@pytest.fixture
+def backend(monkeypatch: pytest.MonkeyPatch) -> ExDividendBackend:
+    backend = ExDividendBackend(today="20260116")
+    monkeypatch.setattr(store_module, "cn_today", lambda: backend.today)
+    return backend
+
+
+@pytest.fixture
+def factor_store(backend: ExDividendBackend, tmp_path: Any) -> FactorStore:
+    return FactorStore(backend, root=str(tmp_path))
+
+
+def expected_qfq(backend: ExDividendBackend, df: pd.DataFrame) -> List[float]:
+    base = adj_factor(backend.today)
+    return [round(backend.close(c, d) * adj_factor(d) / base, 2) for c, d in zip(df["ts_code"], df["trade_date"])]
+
+
+def spans(backend: ExDividendBackend) -> List[Any]:
+    return [(c["ts_code"], c["start_date"], c["end_date"]) for c in backend.calls]
+
+
+@pytest.mark.parametrize("covered, expected", [
+    ([], [("20260105", "20260116")]),
+    ([("20260108", "20260112")], [("20260105", "20260107"), ("20260113", "20260116")]),
+    ([("20260101", "20260106"), ("20260110", "20260131")], [("20260107", "20260109")]),
+    ([("20260101", "20260131")], []),
+])
+def test_missing_intervals(covered: List[Any], expected: List[Any]) -> None:
+    assert _missing_intervals(covered, "20260105", "20260116") == expected
+
+
+def test_only_gaps_are_fetched(factor_store: FactorStore, backend: ExDividendBackend) -> None:
+    factor_store.load("000001.SZ", "20260112", "20260114")
+    factor_store.load("000001.SZ", "20260105", "20260116")
+    assert spans(backend) == [
+        ("000001.SZ", "20260112", "20260114"),
+        ("000001.SZ", "20260105", "20260111"),
+        ("000001.SZ", "20260115", "20260116"),
+    ]
+    # 相邻的已覆盖区间合并为一段
+    assert factor_store.coverage("000001.SZ") == [("20260105", "20260116")]
+
+    backend.calls.clear()
+    df = factor_store.load("000001.SZ", "20260106", "20260115", columns=["close_qfq"])
+    assert backend.calls == []
+    assert list(df.columns) == ["close_qfq"]
+    assert len(df) == len(weekdays("20260106", "20260115"))
+
+
+def test_codes_with_the_same_gap_share_a_request(factor_store: FactorStore, backend: ExDividendBackend) -> None:
+    factor_store.load("000001.SZ", "20260112", "20260116")
+    backend.calls.clear()
+    df = factor_store.load_many(["600000.SH", "000001.SZ", "000002.SZ"], "20260112", "20260116")
+    assert spans(backend) == [("600000.SH,000002.SZ", "20260112", "20260116")]
+    # 按传入顺序返回
+    assert list(dict.fromkeys(df["ts_code"])) == ["600000.SH", "000001.SZ", "000002.SZ"]
+
+
+def test_unpublished_today_is_not_covered(factor_store: FactorStore, backend: ExDividendBackend) -> None:
+    backend.publish_today = False
+    df = factor_store.load("000001.SZ", "20260112", "20260116")
+    assert df["trade_date"].iloc[-1] == "20260115"
+    assert factor_store.coverage("000001.SZ") == [("20260112", "20260115")]
+
+    backend.publish_today = True
+    backend.calls.clear()
+    df = factor_store.load("000001.SZ", "20260112", "20260116")
+    assert spans(backend) == [("000001.SZ", "20260116", "20260116")]
+    assert df["trade_date"].iloc[-1] == "20260116"
+    assert factor_store.coverage("000001.SZ") == [("20260112", "20260116")]
+
+
+def test_new_adj_factor_refetches_covered_range(factor_store: FactorStore, backend: ExDividendBackend) -> None:
+    factor_store.load("000001.SZ", "20260112", "20260116")
+    backend.today = "20260120"
+    backend.calls.clear()
+    df = factor_store.load("000001.SZ", "20260112", "20260120")
+    assert spans(backend) == [("000001.SZ", "20260117", "20260120"), ("000001.SZ", "20260112", "20260120")]
+    assert list(df["close_qfq"]) == expected_qfq(backend, df)
+    assert factor_store.coverage("000001.SZ") == [("20260112", "20260120")]
+
+
+def test_ingest_marks_range_covered(factor_store: FactorStore, backend: ExDividendBackend) -> None:
+    df = backend(ts_code="000001.SZ", start_date="20260105", end_date="20260115")
+    # 430001.BJ 没有返回数据（如停牌），同样记为已覆盖
+    factor_store.ingest(["000001.SZ", "430001.BJ"], "20260105", "20260115", df)
+    backend.calls.clear()
+
+    loaded = factor_store.load("000001.SZ", "20260105", "20260115")
+    pd.testing.assert_frame_equal(loaded, df.sort_values("trade_date").reset_index(drop=True))
+    assert factor_store.load("430001.BJ", "20260105", "20260115").empty
+    assert backend.calls == []
+    assert factor_store.coverage("430001.BJ") == [("20260105", "20260115")]
+
+    # 今天的行缺失时今天不记为已覆盖
+    factor_store.ingest(["430001.BJ"], "20260116", "20260116", df.iloc[:0])
+    assert factor_store.coverage("430001.BJ") == [("20260105", "20260115")]
+
+
+def test_cross_sections_persist_once_published(
+    factor_store: FactorStore, backend: ExDividendBackend, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(store_module, "published", lambda api, day: day < backend.today)
+    df = factor_store.load_trade_dates(["20260116", "20260115"])
+    assert list(dict.fromkeys(df["trade_date"])) == ["20260115", "20260116"]
+
+    backend.calls.clear()
+    factor_store.load_trade_dates(["20260115", "20260116"])
+    # 已发布的截面从磁盘读取，尚未到发布时间的当日截面重新拉取
+    assert [c["trade_date"] for c in backend.calls] == ["20260116"]
+
+
+def test_rounded_qfq_prices_share_a_base(backend: ExDividendBackend) -> None:
+    # 同一次拉取的各行（含除权前的行）反推的基准范围都包含真实基准
+    df = backend(ts_code="000001.SZ", start_date="20260105", end_date="20260116")
+    lo, hi = _qfq_base(df)
+    assert lo <= adj_factor("20260116") <= hi
+    for i in range(len(df)):
+        assert _same_base((lo, hi), _qfq_base(df.iloc[[i]]))
+    assert not _same_base((lo, hi), (2.9 * 0.999, 2.9 * 1.001))
+
+
+def test_one_day_backfill_is_not_a_rebase(factor_store: FactorStore, backend: ExDividendBackend) -> None:
+    factor_store.load("000001.SZ", "20260108", "20260116")
+    backend.calls.clear()
+    # 20260107 在上一次除权之前，单行反推的基准有舍入误差，但基准没有变化
+    df = factor_store.load("000001.SZ", "20260107", "20260116")
+    assert [(c["start_date"], c["end_date"]) for c in backend.calls] == [("20260107", "20260107")]
+    assert list(df["close_qfq"]) == expected_qfq(backend, df)
+
+
+def test_backfill_after_ex_dividend_refetches(factor_store: FactorStore, backend: ExDividendBackend) -> None:
+    factor_store.load("000001.SZ", "20260112", "20260116")
+    # 之后发生除权除息：只向前回补的缺口里没有新的复权因子，需比较前复权基准
+    backend.today = "20260121"
+    backend.calls.clear()
+    df = factor_store.load("000001.SZ", "20260109", "20260116")
+    assert [(c["start_date"], c["end_date"]) for c in backend.calls] == [
+        ("20260109", "20260111"), ("20260109", "20260116"),
+    ]
+    assert list(df["close_qfq"]) == expected_qfq(backend, df)
+
+
+def test_rebase_qfq_ignores_rounding() -> None:
+    backend = ExDividendBackend(today="20260116")
+    # 不同日期拉取的截面：基准相同的行不因舍入误差被缩放
+    df = pd.concat(
+        [backend(trade_date=d) for d in weekdays("20260105", "20260116")], ignore_index=True
+    ).sort_values(["ts_code", "trade_date"], kind="stable").reset_index(drop=True)
+    assert _rebase_qfq(df) is df
+
+    # 最后一个截面在除权除息之后拉取：之前的行统一到新基准
+    backend.today = "20260119"
+    latest = backend(trade_date="20260119")
+    df = pd.concat([df, latest], ignore_index=True).sort_values(["ts_code", "trade_date"], kind="stable")
+    rebased = _rebase_qfq(df.reset_index(drop=True))
+    np.testing.assert_allclose(rebased["close_qfq"], expected_qfq(backend, rebased), atol=0.02)
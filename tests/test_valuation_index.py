@@ -0,0 +1,160 @@
+from typing import Any, List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tushare_mcp_server import stats, valuation_index
+from tushare_mcp_server.valuation_index import TickerIndex, ValuationIndex, sorted_percentile
+
+
+QS = [0, 1, 10, 25, 30, 33.3, 50, 70, 75, 90, 99, 99.9, 100]
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 10, 255, 256, 257, 1250])
+def test_sorted_percentile_matches_numpy(n: int) -> None:
+    rng = np.random.default_rng(n)
+    values = np.sort(rng.lognormal(3, 1, n))
+    for q in QS:
+        assert sorted_percentile(values, q) == np.percentile(values, q)
+
+
+def test_sorted_percentile_with_ties_and_negatives() -> None:
+    values = np.sort(np.array([-5.0, -5.0, 0.0, 1.5, 1.5, 1.5, 2.0, 1e6]))
+    for q in QS:
+        assert sorted_percentile(values, q) == np.percentile(values, q)
+
+
+RANKED = {"pe": False, "pb": True}
+
+
+def valid(values: np.ndarray, allow_zero: bool) -> np.ndarray:
+    """暴力筛选：与 _valid 口径相同的有效历史值。"""
+    return values[~np.isnan(values) & ((values >= 0) if allow_zero else (values > 0))]
+
+
+def history(n: int, seed: int) -> np.ndarray:
+    """含 NaN、0、负值与大量重复值的估值序列。"""
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.normal(10, 8, n), 1)
+    values[rng.random(n) < 0.1] = np.nan
+    values[rng.random(n) < 0.05] = 0.0
+    return values
+
+
+def make_index(n: int, seed: int = 0) -> TickerIndex:
+    dates = np.arange(n, dtype="int64") + 20000101
+    return TickerIndex(
+        dates, {"pe": history(n, seed), "pb": history(n, seed + 1)}, RANKED, "20000101", str(dates[-1])
+    )
+
+
+# 包含空窗口、整块、跨块边界与只落在一个块内的窗口
+WINDOWS = [
+    (0, 0), (0, 1), (0, 255), (0, 256), (0, 257), (1, 256), (255, 257), (256, 512), (255, 513),
+    (300, 300), (300, 301), (100, 700), (511, 769), (0, 1000), (999, 1000), (768, 1000),
+]
+
+
+@pytest.mark.parametrize("lo, hi", WINDOWS)
+def test_ticker_index_matches_brute_force(lo: int, hi: int) -> None:
+    index = make_index(1000)
+    for name, allow_zero in RANKED.items():
+        expected = np.sort(valid(index.values[name][lo:hi], allow_zero))
+        assert index.count(name, lo, hi) == len(expected)
+        np.testing.assert_array_equal(index.sorted_values(name, lo, hi), expected)
+        for value in [-1.0, 0.0, 0.1, 10.0, float(np.median(expected)) if len(expected) else 5.0, 100.0]:
+            assert index.rank(name, value, lo, hi) == (len(expected), int(np.count_nonzero(expected <= value)))
+        if len(expected):
+            for q in (30, 70):
+                assert sorted_percentile(index.sorted_values(name, lo, hi), q) == np.percentile(expected, q)
+
+
+def test_window_by_date() -> None:
+    index = make_index(600)
+    assert index.window("20000101", "20000101") == (0, 0)
+    assert index.window("20000110", "20000400") == (9, 299)
+    assert index.row("20000110") == 9
+    assert index.row("19991231") is None
+
+
+def test_extend_resorts_last_block() -> None:
+    index = make_index(300)
+    first = {name: [b.copy() for b in blocks] for name, blocks in index.blocks.items()}
+    more = make_index(700, seed=5)
+    dates = np.arange(300, 700, dtype="int64") + 20000101
+    extended = index.extend(dates, {name: more.values[name][300:] for name in RANKED}, str(dates[-1]))
+
+    # 与一次建立的索引结果相同：原先不完整的最后一块（44 行）追加后重新排序
+    whole = TickerIndex(extended.dates, extended.values, RANKED, extended.start, extended.end)
+    for name, allow_zero in RANKED.items():
+        assert len(extended.blocks[name]) == 3
+        for got, expected in zip(extended.blocks[name], whole.blocks[name]):
+            np.testing.assert_array_equal(got, expected)
+        for lo, hi in [(0, 700), (200, 600), (256, 512), (299, 301)]:
+            expected = np.sort(valid(extended.values[name][lo:hi], allow_zero))
+            np.testing.assert_array_equal(extended.sorted_values(name, lo, hi), expected)
+        # 原索引不变
+        assert len(index.blocks[name]) == 2
+        for got, before in zip(index.blocks[name], first[name]):
+            np.testing.assert_array_equal(got, before)
+
+
+class HistoryStore:
+    """只实现 ValuationIndex 用到的 FactorStore 接口，记录每次读取的区间。"""
+
+    root = "history"
+
+    def __init__(self) -> None:
+        days = pd.bdate_range("20190101", "20211231").strftime("%Y%m%d")
+        self.frame = pd.concat([
+            pd.DataFrame({"ts_code": code, "trade_date": days, "pe": history(len(days), seed)})
+            for seed, code in enumerate(["000001.SZ", "600000.SH"])
+        ], ignore_index=True)
+        self.calls: List[Any] = []
+
+    def load_many(self, ts_codes: List[str], start_date: str, end_date: str, columns: List[str]) -> pd.DataFrame:
+        self.calls.append((ts_codes, start_date, end_date))
+        df = self.frame
+        df = df[df["ts_code"].isin(ts_codes) & (df["trade_date"] >= start_date) & (df["trade_date"] <= end_date)]
+        return df[[c for c in columns if c in df.columns]].reset_index(drop=True)
+
+
+@pytest.fixture
+def valuation(monkeypatch: pytest.MonkeyPatch) -> Any:
+    monkeypatch.setattr(valuation_index, "cn_today", lambda: "20300101")
+    stats.reset()
+    store = HistoryStore()
+    return store, ValuationIndex(store, ["pe"], {"pe": False})
+
+
+def test_load_updates_and_backfills(valuation: Any) -> None:
+    store, index = valuation
+    codes = ["000001.SZ", "600000.SH"]
+    first = index.load(codes, "20200101", "20201231")
+    assert store.calls == [(codes, "20200101", "20201231")]
+    assert stats.snapshot()["caches"]["valuation_index"] == {"hits": 0, "misses": 2, "hit_ratio": 0.0}
+
+    # 更晚的日期：只读取新增的行
+    store.calls.clear()
+    later = index.load(codes, "20200101", "20210630")
+    assert store.calls == [(codes, "20210101", "20210630")]
+    assert later["000001.SZ"].start == "20200101" and later["000001.SZ"].end == "20210630"
+    assert stats.snapshot()["caches"]["valuation_index"]["hits"] == 2
+
+    # 更早的开始日期：向前重建，覆盖原有区间
+    store.calls.clear()
+    earlier = index.load(codes, "20190101", "20201231")
+    assert store.calls == [(codes, "20190101", "20210630")]
+    assert stats.snapshot()["caches"]["valuation_index"]["misses"] == 4
+    for code in codes:
+        rebuilt = earlier[code]
+        assert rebuilt.start == "20190101" and rebuilt.end == "20210630"
+        rows = store.frame[
+            (store.frame["ts_code"] == code) & store.frame["trade_date"].between("20190101", "20210630")
+        ]
+        np.testing.assert_array_equal(rebuilt.dates, rows["trade_date"].astype("int64"))
+        lo, hi = rebuilt.window("20190101", "20210101")
+        expected = np.sort(valid(rows["pe"].to_numpy()[lo:hi], False))
+        np.testing.assert_array_equal(rebuilt.sorted_values("pe", lo, hi), expected)
+        assert first[code].start == "20200101"